@@ -1,5 +1,6 @@
 from flask import Flask, request, jsonify
 from classify_intent import classify_intent
+from catalog import catalog
 from flask_cors import CORS
 import logging
 
@@ -40,7 +41,16 @@ def nlp_handler():
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "healthy", "service": "custom-nlp"}), 200
+    return jsonify({
+        "status": "healthy",
+        "service": "custom-nlp",
+        "catalog": {"memory": catalog.memory_usage(), "stats": catalog.stats}
+    }), 200
 
 if __name__ == '__main__':
+    # Load the catalog (or create its indexes) before the first message
+    try:
+        catalog.get()
+    except Exception as e:
+        logger.error(f"Catalog warm-up failed: {str(e)}")
     app.run(debug=True, port=5006, host='0.0.0.0')
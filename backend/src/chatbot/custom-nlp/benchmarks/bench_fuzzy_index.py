@@ -0,0 +1,81 @@
+"""
+Latency and accuracy of FuzzyIndex title lookups vs scoring every title
+
+Messages ask for the price of a catalog title, with 0-2 typos, as
+get_price/check_availability receive them. The brute-force baseline scores
+every title with one rapidfuzz process.cdist call (already faster than the
+old per-package Python loop). "agree" is the share of messages where the
+index finds a match with the same score as the baseline's best.
+
+Usage: python benchmarks/bench_fuzzy_index.py [--sizes 1000 10000 100000] [--queries 300]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from rapidfuzz import fuzz, process
+from fuzzy_index import FuzzyIndex
+from synthetic_catalog import synthetic_packages
+
+TEMPLATES = ["what is the price of {}", "how much does the {} cost", "slots for {} please", "{}"]
+
+def typo(text, rng, count):
+    chars = list(text)
+    for _ in range(count):
+        i = rng.randrange(len(chars))
+        if rng.random() < 0.5:
+            del chars[i]
+        else:
+            chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    return "".join(chars)
+
+def brute_force(strings, message, score_cutoff):
+    scores = process.cdist([message], strings, scorer=fuzz.partial_ratio, dtype=np.float32)[0]
+    best = int(np.argmax(scores))
+    return (best, float(scores[best])) if scores[best] > score_cutoff else None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--cutoff', type=float, default=80)
+    args = parser.parse_args()
+
+    print(f"{'titles':>8} {'build s':>8} {'index p50 ms':>13} {'index p99 ms':>13} "
+          f"{'brute p50 ms':>13} {'agree':>7} {'matched':>8}")
+    for size in args.sizes:
+        titles = [p["title"] for p in synthetic_packages(size)]
+        start = time.perf_counter()
+        index = FuzzyIndex(titles)
+        build_s = time.perf_counter() - start
+
+        rng = random.Random(7)
+        messages = [rng.choice(TEMPLATES).format(typo(rng.choice(titles).lower(), rng, rng.randint(0, 2)))
+                    for _ in range(args.queries)]
+
+        # Each method runs over all messages in its own pass
+        index_ms, found = [], []
+        for message in messages:
+            start = time.perf_counter()
+            found.append(index.best(message, args.cutoff))
+            index_ms.append((time.perf_counter() - start) * 1000)
+
+        brute_ms, expected = [], []
+        for message in messages:
+            start = time.perf_counter()
+            expected.append(brute_force(index.strings, message, args.cutoff))
+            brute_ms.append((time.perf_counter() - start) * 1000)
+
+        matched = sum(match is not None for match in expected)
+        agree = sum((a and a[1]) == (b and b[1]) for a, b in zip(found, expected))
+
+        print(f"{size:>8} {build_s:>8.2f} {np.percentile(index_ms, 50):>13.3f} {np.percentile(index_ms, 99):>13.3f} "
+              f"{np.percentile(brute_ms, 50):>13.3f} {agree / len(messages):>7.3f} {matched / len(messages):>8.3f}")
+
+if __name__ == '__main__':
+    main()
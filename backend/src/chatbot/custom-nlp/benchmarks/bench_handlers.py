@@ -0,0 +1,80 @@
+"""
+Chat handler throughput against an in-memory mongomock stand-in
+
+Seeds a mongomock database with a synthetic travelpackages collection
+through data_access.set_client, then replays catalog messages (package
+search, price filters, price/availability lookups, comparisons and
+recommendations) through the task handlers. Reports the catalog load
+time, messages/sec per handler and, for reference, the cost of the
+projected full-collection read each of those messages used to make.
+
+Usage: python benchmarks/bench_handlers.py [--sizes 1000 10000] [--rounds 5]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import mongomock
+import data_access
+from catalog import PACKAGE_PROJECTION, PACKAGES_COLLECTION, CatalogSnapshot
+import catalog as catalog_module
+from synthetic_catalog import synthetic_packages
+
+MESSAGES = {
+    "task1_packages": [
+        "Show me all packages", "Packages under 40000", "cheap trips below 50000",
+        "Expensive packages above 100000", "packages between 30000 and 80000", "show packages to goa",
+        "tell me the cost of royal goa tour 12", "how many slots are available for misty bali escape 7",
+    ],
+    "task5_compare": ["goa vs kerala", "paris and bali"],
+    "task6_recommend": ["budget trips", "luxury stays", "suggest something"],
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    from task_handlers import task1_packages, task5_compare, task6_recommend
+    handlers = {"task1_packages": task1_packages.handle, "task5_compare": task5_compare.handle,
+                "task6_recommend": task6_recommend.handle}
+
+    print(f"{'packages':>9} {'load ms':>9} {'handler':>16} {'msgs/s':>9} {'ms/msg':>8} {'scan ms/msg':>12}")
+    for size in args.sizes:
+        client = mongomock.MongoClient()
+        client[data_access.MONGO_DB][PACKAGES_COLLECTION].insert_many(synthetic_packages(size))
+        data_access.set_client(client)
+
+        # A fresh snapshot per catalog; polling only (mongomock has no change streams)
+        catalog_module.catalog = snapshot = CatalogSnapshot(use_change_stream=False, poll_seconds=3600)
+        for module in (task1_packages, task5_compare, task6_recommend):
+            module.catalog = snapshot
+        start = time.perf_counter()
+        snapshot.get()
+        load_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            data_access.find(PACKAGES_COLLECTION, {}, PACKAGE_PROJECTION)
+        scan_ms = (time.perf_counter() - start) / args.rounds * 1000
+
+        for name, messages in MESSAGES.items():
+            handle = handlers[name]
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                for message in messages:
+                    handle(message.lower())
+            elapsed = time.perf_counter() - start
+            count = args.rounds * len(messages)
+            print(f"{size:>9} {load_ms:>9.1f} {name:>16} {count / elapsed:>9.0f} {elapsed / count * 1000:>8.2f} "
+                  f"{scan_ms:>12.1f}")
+        snapshot.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Messages/sec of the unified intent classifier vs the two-stage TF-IDF path
+
+The two-stage path is what classify_intent used to run per message: the
+task vectorizer + cosine_similarity, then the routed handler's own
+predict_intent (task1/task2/task3). The unified classifier gets (task,
+sub-intent, score) from one vectorization and one matmul, per message
+(classify) or for a whole batch (classify_batch). "agree" is the share of
+messages where task, sub-intent and threshold decision all match.
+
+Usage: python benchmarks/bench_intent_classifier.py [--messages 5000] [--batch-size 256]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+logging.disable(logging.INFO)
+import classify_intent as ci
+from task_handlers import task1_packages, task2_bookings, task3_faqs
+
+SUB_INTENT_MODELS = {"task1": task1_packages, "task2": task2_bookings, "task3": task3_faqs}
+FILLERS = ["please", "can you", "i want to", "tell me", "goa", "kerala", "paris", "under 40000",
+           "between 20000 and 50000", "thanks", "asap", "for my family", "next month"]
+
+def synthetic_messages(count, seed=7):
+    """Handler examples and task keywords recombined with filler words"""
+    rng = random.Random(seed)
+    phrases = [example for module in SUB_INTENT_MODELS.values() for example in module.examples]
+    phrases += [keyword for keywords in ci.TASK_KEYWORDS.values() for keyword in keywords]
+    messages = []
+    for _ in range(count):
+        parts = rng.sample(phrases, rng.randint(1, 2)) + rng.sample(FILLERS, rng.randint(0, 3))
+        rng.shuffle(parts)
+        messages.append(" ".join(parts).lower())
+    return messages
+
+def two_stage(message):
+    similarities = cosine_similarity(ci.vectorizer.transform([message]), ci.task_vectors).flatten()
+    best = int(np.argmax(similarities))
+    task = list(ci.TASK_KEYWORDS)[best]
+    sub_intent = SUB_INTENT_MODELS[task].predict_intent(message) if task in SUB_INTENT_MODELS else None
+    return task, sub_intent, float(similarities[best])
+
+def decision(result):
+    task, sub_intent, score = result
+    return (task, sub_intent) if score > ci.SIMILARITY_THRESHOLD else None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=256)
+    args = parser.parse_args()
+
+    messages = synthetic_messages(args.messages)
+    classifier = ci.intent_classifier
+
+    timings = {}
+    start = time.perf_counter()
+    expected = [two_stage(message) for message in messages]
+    timings["two-stage"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single = [classifier.classify(message) for message in messages]
+    timings["classify"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = []
+    for i in range(0, len(messages), args.batch_size):
+        batched.extend(classifier.classify_batch(messages[i:i + args.batch_size]))
+    timings[f"classify_batch({args.batch_size})"] = time.perf_counter() - start
+
+    print(f"{'path':>20} {'msgs/s':>10} {'us/msg':>8} {'agree':>7} {'max score diff':>15}")
+    for name, results in (("two-stage", expected), ("classify", single),
+                          (f"classify_batch({args.batch_size})", batched)):
+        elapsed = timings[name]
+        agree = sum(decision(a) == decision(b) for a, b in zip(results, expected)) / len(messages)
+        score_diff = max(abs(a[2] - b[2]) for a, b in zip(results, expected))
+        print(f"{name:>20} {len(messages) / elapsed:>10.0f} {elapsed / len(messages) * 1e6:>8.1f} "
+              f"{agree:>7.3f} {score_diff:>15.2e}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Query plans of the old catalog queries vs the indexed DatabaseCatalog ones
+
+Needs a real MongoDB (the planner is what is measured; mongomock has
+none). Fills a temporary collection with synthetic packages, explains and
+times the queries the handlers used to send (unbounded filters, a whole
+collection read sorted in Python, a case-insensitive destination $regex)
+without indexes, then runs ensure_indexes and does the same for the
+sorted, limited and hinted queries DatabaseCatalog sends. Reports the
+plan stages, keys/documents examined, documents returned and wall time.
+
+Usage: MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_query_plans.py [--sizes 10000 100000] [--rounds 5]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pymongo import MongoClient
+import data_access
+from catalog import (DESTINATION_INDEX, MAX_RESULTS, PACKAGE_PROJECTION, PRICE_INDEX, ensure_indexes)
+from synthetic_catalog import synthetic_packages
+
+COLLECTION = "bench_travelpackages"
+
+# name -> (old query, new query); a query is (filter, sort, limit, hint)
+QUERIES = {
+    "under 40000": (
+        ({"price": {"$lte": 40000}}, None, 0, None),
+        ({"price": {"$lte": 40000}}, [("price", 1)], MAX_RESULTS, PRICE_INDEX),
+    ),
+    "40000-80000": (
+        ({"price": {"$gte": 40000, "$lte": 80000}}, None, 0, None),
+        ({"price": {"$gte": 40000, "$lte": 80000}}, [("price", 1)], MAX_RESULTS, PRICE_INDEX),
+    ),
+    "most expensive": (
+        ({}, None, 0, None),
+        ({}, [("price", -1)], 5, PRICE_INDEX),
+    ),
+    "destination goa": (
+        ({"destination": {"$regex": "goa", "$options": "i"}}, None, 0, None),
+        ({"destinationLower": {"$in": ["goa"]}}, [("price", 1)], MAX_RESULTS, DESTINATION_INDEX),
+    ),
+}
+
+def plan_stages(plan):
+    """Stage names of a winning plan, outermost first"""
+    plan = plan.get("queryPlan", plan)
+    stages = [plan["stage"]]
+    children = plan.get("inputStages") or ([plan["inputStage"]] if "inputStage" in plan else [])
+    for child in children:
+        stages += plan_stages(child)
+    return stages
+
+def cursor_for(collection, query):
+    query_filter, sort, limit, hint = query
+    cursor = collection.find(query_filter, PACKAGE_PROJECTION)
+    if hint:
+        cursor = cursor.hint(hint)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor
+
+def measure(collection, query, rounds):
+    explain = cursor_for(collection, query).explain()
+    stats = explain["executionStats"]
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        list(cursor_for(collection, query))
+        times.append((time.perf_counter() - start) * 1000)
+    stages = plan_stages(explain["queryPlanner"]["winningPlan"])
+    return {
+        "plan": ">".join(dict.fromkeys(s for s in stages if s in ("IXSCAN", "COLLSCAN", "SORT", "SORT_MERGE",
+                                                                   "LIMIT", "FETCH"))),
+        "keys": stats["totalKeysExamined"],
+        "docs": stats["totalDocsExamined"],
+        "returned": stats["nReturned"],
+        "ms": statistics.median(times),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--uri', default=data_access.MONGO_URI or "mongodb://localhost:27017")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.uri.startswith(data_access.MOCK_URI_PREFIX):
+        sys.exit("bench_query_plans needs a real MongoDB: mongomock has no query planner")
+    logging.disable(logging.INFO)
+    client = MongoClient(args.uri)
+    data_access.set_client(client)
+    collection = data_access.get_collection(COLLECTION)
+
+    print(f"{'packages':>9} {'query':>16} {'version':>7} {'plan':>28} {'keys':>8} {'docs':>8} {'returned':>8} "
+          f"{'ms':>8}")
+    try:
+        for size in args.sizes:
+            collection.drop()
+            # Documents as they were before destinationLower existed; ensure_indexes backfills it
+            collection.insert_many(synthetic_packages(size))
+            old = {name: measure(collection, queries[0], args.rounds) for name, queries in QUERIES.items()}
+            start = time.perf_counter()
+            ensure_indexes(COLLECTION)
+            index_s = time.perf_counter() - start
+            new = {name: measure(collection, queries[1], args.rounds) for name, queries in QUERIES.items()}
+
+            for name in QUERIES:
+                for version, result in (("old", old[name]), ("new", new[name])):
+                    print(f"{size:>9} {name:>16} {version:>7} {result['plan']:>28} {result['keys']:>8} "
+                          f"{result['docs']:>8} {result['returned']:>8} {result['ms']:>8.2f}")
+            print(f"{size:>9} ensure_indexes (build + backfill): {index_s:.2f} s")
+    finally:
+        collection.drop()
+
+if __name__ == '__main__':
+    main()
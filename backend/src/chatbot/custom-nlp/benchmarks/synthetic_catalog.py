@@ -0,0 +1,42 @@
+"""
+Synthetic travel package catalogs for chatbot benchmarks
+
+Titles combine an adjective, a destination and a trip kind, as in the real
+catalog, with a numeric suffix so they stay unique at any size.
+"""
+import random
+
+DESTINATIONS = [
+    "Goa", "Kerala", "Rajasthan", "Paris", "Bali", "Switzerland", "Leh Ladakh", "Dubai", "Andaman",
+    "Varanasi", "Kashmir", "Greece", "Odisha", "Amazon", "Europe", "Manali", "Sikkim", "Maldives",
+]
+ADJECTIVES = ["Sunny", "Royal", "Misty", "Grand", "Serene", "Wild", "Golden", "Hidden", "Classic", "Coastal"]
+KINDS = ["Escape", "Tour", "Getaway", "Retreat", "Expedition", "Holiday", "Adventure", "Cruise"]
+
+def synthetic_packages(num_packages, num_destinations=None, seed=42):
+    """
+    Generate travel package documents shaped like the travelpackages collection
+
+    Parameters:
+    - num_destinations: Distinct destinations; beyond len(DESTINATIONS)
+      numbered regions ("Goa Region 7") are added
+
+    Returns:
+    - list of package dicts (no _id)
+    """
+    rng = random.Random(seed)
+    num_destinations = num_destinations or len(DESTINATIONS)
+    destinations = [DESTINATIONS[i % len(DESTINATIONS)] + (f" Region {i // len(DESTINATIONS)}" if i >= len(DESTINATIONS) else "")
+                    for i in range(num_destinations)]
+    packages = []
+    for i in range(num_packages):
+        destination = rng.choice(destinations)
+        packages.append({
+            "title": f"{rng.choice(ADJECTIVES)} {destination} {rng.choice(KINDS)} {i}",
+            "description": f"A {rng.randint(3, 12)} day trip to {destination}.",
+            "price": rng.choice([25000, 40000, 50000, 75000, 100000, 150000, rng.randint(10000, 250000)]),
+            "duration": f"{rng.randint(3, 12)} days",
+            "destination": destination,
+            "availability": rng.randint(0, 20),
+        })
+    return packages
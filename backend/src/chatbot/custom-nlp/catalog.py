@@ -0,0 +1,451 @@
+from bisect import bisect_left, bisect_right
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+import logging
+import os
+import random
+import threading
+import time
+import data_access
+from fuzzy_index import FuzzyIndex
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PACKAGES_COLLECTION = "travelpackages"
+# Full loads read the whole collection: allow more than a single query's timeout
+LOAD_TIMEOUT_MS = int(os.getenv("CATALOG_LOAD_TIMEOUT_MS", "60000"))
+
+# Fields the chat handlers read
+PACKAGE_PROJECTION = {"title": 1, "destination": 1, "price": 1, "duration": 1, "availability": 1}
+# Most packages a single reply lists
+MAX_RESULTS = int(os.getenv("CHATBOT_MAX_RESULTS", "10"))
+
+# Indexes behind DatabaseCatalog's queries (also declared on the mongoose schema)
+PRICE_INDEX = "price_1"
+DESTINATION_INDEX = "destinationLower_1_price_1"
+INDEXES = {
+    PRICE_INDEX: [("price", 1)],
+    DESTINATION_INDEX: [("destinationLower", 1), ("price", 1)],
+}
+
+# Cheap server-side fingerprint of the collection: changes on inserts, deletes,
+# price edits and every booking (which updates availability)
+VERSION_PIPELINE = [{"$group": {
+    "_id": None,
+    "count": {"$sum": 1},
+    "max_id": {"$max": "$_id"},
+    "price": {"$sum": "$price"},
+    "availability": {"$sum": "$availability"},
+}}]
+
+class CatalogIndex:
+    """
+    Immutable in-memory view of the travel packages
+
+    Packages keep the collection's natural order (as find() returned them),
+    plus price-sorted arrays for range and top-N queries, a lower-cased
+    destination -> packages index (cheapest first) and fuzzy indexes over
+    titles and destinations. A refresh builds a new CatalogIndex and swaps
+    it in, so readers never see a partial one.
+    """
+
+    def __init__(self, packages):
+        self.packages = packages
+        self.positions = {id(p): i for i, p in enumerate(packages)}
+
+        self.by_price = sorted(packages, key=lambda p: p.get("price", 0))
+        self.prices = [p.get("price", 0) for p in self.by_price]
+        self.by_price_desc = sorted(packages, key=lambda p: p.get("price", 0), reverse=True)
+
+        self.by_destination = {}
+        for p in self.by_price:
+            self.by_destination.setdefault(str(p.get("destination", "")).lower(), []).append(p)
+        self.destinations = sorted({p["destination"] for p in packages if p.get("destination")})
+        self.titles = [str(p.get("title", "")).lower() for p in packages]
+        self.title_index = FuzzyIndex(self.titles)
+        self.destination_index = FuzzyIndex(self.destinations)
+
+    def list_packages(self, limit=None):
+        """Packages in natural order"""
+        return self.packages[:limit]
+
+    def sample(self, n):
+        """Up to n packages picked at random"""
+        return random.sample(self.packages, min(len(self.packages), n))
+
+    def price_range(self, lower=None, upper=None, include_lower=True, include_upper=True, limit=None):
+        """Packages with lower <= price <= upper (either bound optional), cheapest first"""
+        start = 0
+        if lower is not None:
+            start = (bisect_left if include_lower else bisect_right)(self.prices, lower)
+        end = len(self.prices)
+        if upper is not None:
+            end = (bisect_right if include_upper else bisect_left)(self.prices, upper)
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.by_price[start:end] if start < end else []
+
+    def most_expensive(self, n=5):
+        return self.by_price_desc[:n]
+
+    def matching_destinations(self, text, limit=None):
+        """Packages whose destination contains text (case-insensitive), cheapest first"""
+        text = text.lower()
+        groups = [packages for destination, packages in self.by_destination.items() if text in destination]
+        if len(groups) == 1:
+            return groups[0][:limit]
+        packages = sorted((p for packages in groups for p in packages),
+                          key=lambda p: (p.get("price", 0), self.positions[id(p)]))
+        return packages[:limit]
+
+    def find_destination(self, message, score_cutoff=70):
+        """Destination best matching the message (case-insensitive partial_ratio), or None"""
+        match = self.destination_index.best(message, score_cutoff)
+        return self.destinations[match[0]] if match else None
+
+    def find_package(self, message, score_cutoff=80, by_destination=False):
+        """
+        Package whose title best matches the message
+
+        Parameters:
+        - message: User message
+        - score_cutoff: Minimum partial_ratio (exclusive)
+        - by_destination: Also accept the cheapest package of a destination
+          matching at least as well as the best title
+
+        Returns:
+        - Package dict, or None
+        """
+        title_match = self.title_index.best(message, score_cutoff)
+        if by_destination:
+            destination_match = self.destination_index.best(message, score_cutoff)
+            if destination_match and (not title_match or destination_match[1] > title_match[1]):
+                return self.first_matching_destination(self.destinations[destination_match[0]])
+        return self.packages[title_match[0]] if title_match else None
+
+    def first_matching_destination(self, text):
+        """Cheapest package whose destination contains text, or None"""
+        matches = self.matching_destinations(text, limit=1)
+        return matches[0] if matches else None
+
+class CatalogSnapshot:
+    """
+    Travel packages loaded once and kept current in the background
+
+    A MongoDB change stream applies inserts, updates and deletes as they
+    happen; the first stream starts at the cluster time of the initial
+    load, so startup reads the collection once. Servers without change
+    streams (standalone mongod) are polled instead: every poll_seconds a
+    one-document aggregation fingerprints the collection and the catalog is
+    reloaded when it changed, or at the latest after max_age_seconds (to
+    pick up title or duration edits). Handlers read the current
+    CatalogIndex without touching MongoDB.
+    """
+
+    def __init__(self, collection_name=PACKAGES_COLLECTION, poll_seconds=5.0, max_age_seconds=300.0,
+                 use_change_stream=True):
+        self.collection_name = collection_name
+        self.poll_seconds = poll_seconds
+        self.max_age_seconds = max_age_seconds
+        self.use_change_stream = use_change_stream
+        self._index = None
+        self._documents = {}
+        self._version = None
+        self._loaded_at = 0.0
+        # Cluster time the first load started at, where the first change stream picks up
+        self._resume_at = None
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._stop = threading.Event()
+        self.stats = {
+            "loads": 0,
+            "changes_applied": 0,
+            "version_checks": 0,
+            "last_load_ms": 0.0,
+            "mode": None,
+        }
+
+    def get(self):
+        """Current CatalogIndex, loading it (and starting the refresher) on first use"""
+        index = self._index
+        if index is not None:
+            return index
+        with self._lock:
+            if self._index is None:
+                if self.use_change_stream:
+                    self._resume_at = self._operation_time()
+                self.reload()
+                self._start_refresher()
+            return self._index
+
+    def reload(self):
+        """Read the whole collection and swap in a new index"""
+        start = time.perf_counter()
+        version = self._fetch_version()
+        documents = {doc["_id"]: doc for doc in data_access.find(self.collection_name, {}, PACKAGE_PROJECTION,
+                                                                 timeout_ms=LOAD_TIMEOUT_MS)}
+        self._publish(documents)
+        self._version = version
+        self._loaded_at = time.time()
+        self.stats["loads"] += 1
+        self.stats["last_load_ms"] = (time.perf_counter() - start) * 1000
+        logger.info(f"Loaded {len(documents)} travel packages in {self.stats['last_load_ms']:.1f} ms")
+
+    def _publish(self, documents):
+        self._documents = documents
+        self._index = CatalogIndex(list(documents.values()))
+
+    @staticmethod
+    def _operation_time():
+        try:
+            return data_access.operation_time()
+        except PyMongoError as e:
+            logger.info(f"No cluster time for the catalog change stream ({e})")
+            return None
+
+    def _fetch_version(self):
+        result = data_access.aggregate(self.collection_name, VERSION_PIPELINE)
+        return tuple(sorted(result[0].items())) if result else ()
+
+    def _start_refresher(self):
+        if self._refresher is None:
+            self._refresher = threading.Thread(target=self._refresh_loop, daemon=True, name="catalog-refresh")
+            self._refresher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _refresh_loop(self):
+        if self.use_change_stream:
+            try:
+                # A stream ends when the collection is dropped or renamed; open a new one
+                while not self._stop.is_set():
+                    self._watch()
+                return
+            except Exception as e:
+                logger.info(f"Catalog change stream unavailable ({e}); polling every {self.poll_seconds}s")
+        self._poll()
+
+    def _watch(self):
+        # Only the first stream continues from the initial load; a reopened one reloads
+        resume_at, self._resume_at = self._resume_at, None
+        start = {"start_at_operation_time": resume_at} if resume_at is not None else {}
+        with data_access.watch(self.collection_name, full_document="updateLookup", max_await_time_ms=1000,
+                               **start) as stream:
+            self.stats["mode"] = "change_stream"
+            if resume_at is None:
+                # Changes made between the last load and the stream opening
+                self.reload()
+            while stream.alive and not self._stop.is_set():
+                changes = []
+                change = stream.try_next()
+                while change is not None:
+                    changes.append(change)
+                    change = stream.try_next()
+                if changes:
+                    self._apply_changes(changes)
+
+    def _apply_changes(self, changes):
+        """Apply a batch of change events and rebuild the index once"""
+        documents = dict(self._documents)
+        for change in changes:
+            key = change.get("documentKey", {}).get("_id")
+            document = change.get("fullDocument")
+            if change.get("operationType") == "delete" or (key is not None and document is None):
+                documents.pop(key, None)
+            elif document is not None:
+                documents[document["_id"]] = {field: document[field] for field in ("_id", *PACKAGE_PROJECTION)
+                                              if field in document}
+        self._publish(documents)
+        self.stats["changes_applied"] += len(changes)
+
+    def _poll(self):
+        # VERSION_PIPELINE only sees inserts, deletes, price and availability changes:
+        # title and destination edits stay stale until the max_age_seconds reload
+        # (CATALOG_MAX_AGE_SECONDS)
+        self.stats["mode"] = "polling"
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.stats["version_checks"] += 1
+                if (self._fetch_version() != self._version
+                        or time.time() - self._loaded_at >= self.max_age_seconds):
+                    self.reload()
+            except PyMongoError as e:
+                logger.error(f"Catalog refresh failed: {e}")
+
+    def memory_usage(self):
+        index = self._index
+        return {"packages": len(index.packages) if index else 0,
+                "destinations": len(index.destinations) if index else 0}
+
+def ensure_indexes(collection_name=PACKAGES_COLLECTION):
+    """
+    Create the price and destination indexes and backfill destinationLower
+
+    Creating an existing index is a no-op, and only packages without a
+    destinationLower (written before the field existed) are updated, so
+    this is cheap to run on every start.
+
+    Returns:
+    - Number of packages backfilled
+    """
+    for name, keys in INDEXES.items():
+        data_access.create_index(collection_name, keys, name)
+    missing = data_access.find(collection_name, {"destinationLower": None}, {"destination": 1},
+                               timeout_ms=LOAD_TIMEOUT_MS)
+    updates = [UpdateOne({"_id": doc["_id"]},
+                         {"$set": {"destinationLower": str(doc.get("destination", "")).lower()}})
+               for doc in missing]
+    backfilled = data_access.bulk_write(collection_name, updates)
+    if backfilled:
+        logger.info(f"Backfilled destinationLower on {backfilled} travel packages")
+    return backfilled
+
+class DatabaseCatalog:
+    """
+    Travel packages queried from MongoDB on every read
+
+    Same read API as CatalogIndex, for catalogs too large to keep in memory.
+    Filters, sorts and limits run server-side on the price and
+    (destinationLower, price) indexes, so a query reads only the index
+    range and the packages it returns. Destination names and titles (for
+    fuzzy matching) are cached and re-read after max_age_seconds; prices
+    and availability are always current.
+    """
+
+    def __init__(self, collection_name=PACKAGES_COLLECTION, max_age_seconds=300.0):
+        self.collection_name = collection_name
+        self.max_age_seconds = max_age_seconds
+        self._ready = False
+        self._names = None
+        self._lock = threading.Lock()
+        self.stats = {
+            "queries": 0,
+            "name_loads": 0,
+            "last_name_load_ms": 0.0,
+            "mode": "database",
+        }
+
+    def get(self):
+        """This catalog, creating its indexes on first use"""
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    ensure_indexes(self.collection_name)
+                    self._ready = True
+        return self
+
+    def stop(self):
+        pass
+
+    def _find(self, query, sort=None, limit=None, hint=None):
+        self.stats["queries"] += 1
+        return data_access.find(self.collection_name, query, PACKAGE_PROJECTION, sort=sort, limit=limit or 0,
+                                hint=hint)
+
+    def _load_names(self):
+        start = time.perf_counter()
+        groups = data_access.aggregate(self.collection_name, [
+            {"$group": {"_id": "$destinationLower", "destination": {"$first": "$destination"}}}
+        ], timeout_ms=LOAD_TIMEOUT_MS)
+        destinations = sorted(group["destination"] for group in groups if group.get("destination"))
+        titles = data_access.find(self.collection_name, {}, {"title": 1}, timeout_ms=LOAD_TIMEOUT_MS)
+        self._names = {
+            "loaded_at": time.time(),
+            "destinations": destinations,
+            "lower_destinations": [d.lower() for d in destinations],
+            "destination_index": FuzzyIndex(destinations),
+            "title_ids": [doc["_id"] for doc in titles],
+            "title_index": FuzzyIndex([str(doc.get("title", "")) for doc in titles]),
+        }
+        self.stats["name_loads"] += 1
+        self.stats["last_name_load_ms"] = (time.perf_counter() - start) * 1000
+
+    def names(self):
+        """Cached destination names and title index, re-read once older than max_age_seconds"""
+        names = self._names
+        if names is None or time.time() - names["loaded_at"] >= self.max_age_seconds:
+            with self._lock:
+                if self._names is names:
+                    self._load_names()
+            names = self._names
+        return names
+
+    def list_packages(self, limit=None):
+        """Packages in natural order"""
+        return self._find({}, limit=limit)
+
+    def sample(self, n):
+        """Up to n packages picked at random"""
+        self.stats["queries"] += 1
+        return data_access.aggregate(self.collection_name, [{"$sample": {"size": n}},
+                                                            {"$project": PACKAGE_PROJECTION}])
+
+    def price_range(self, lower=None, upper=None, include_lower=True, include_upper=True, limit=None):
+        """Packages with lower <= price <= upper (either bound optional), cheapest first"""
+        bounds = {}
+        if lower is not None:
+            bounds["$gte" if include_lower else "$gt"] = lower
+        if upper is not None:
+            bounds["$lte" if include_upper else "$lt"] = upper
+        return self._find({"price": bounds} if bounds else {}, [("price", 1)], limit, PRICE_INDEX)
+
+    def most_expensive(self, n=5):
+        return self._find({}, [("price", -1)], n, PRICE_INDEX)
+
+    def matching_destinations(self, text, limit=None):
+        """Packages whose destination contains text (case-insensitive), cheapest first"""
+        text = text.lower()
+        lowered = [d for d in self.names()["lower_destinations"] if text in d]
+        if not lowered:
+            return []
+        # Equality on each destination: index ranges merged in price order, no in-memory sort
+        return self._find({"destinationLower": {"$in": lowered}}, [("price", 1)], limit, DESTINATION_INDEX)
+
+    def find_destination(self, message, score_cutoff=70):
+        """Destination best matching the message (case-insensitive partial_ratio), or None"""
+        names = self.names()
+        match = names["destination_index"].best(message, score_cutoff)
+        return names["destinations"][match[0]] if match else None
+
+    def find_package(self, message, score_cutoff=80, by_destination=False):
+        """Package whose title best matches the message; see CatalogIndex.find_package"""
+        names = self.names()
+        title_match = names["title_index"].best(message, score_cutoff)
+        if by_destination:
+            destination_match = names["destination_index"].best(message, score_cutoff)
+            if destination_match and (not title_match or destination_match[1] > title_match[1]):
+                return self.first_matching_destination(names["destinations"][destination_match[0]])
+        if not title_match:
+            return None
+        self.stats["queries"] += 1
+        return data_access.find_one(self.collection_name, {"_id": names["title_ids"][title_match[0]]},
+                                    PACKAGE_PROJECTION)
+
+    def first_matching_destination(self, text):
+        """Cheapest package whose destination contains text, or None"""
+        matches = self.matching_destinations(text, limit=1)
+        return matches[0] if matches else None
+
+    def memory_usage(self):
+        names = self._names
+        return {"titles": len(names["title_ids"]) if names else 0,
+                "destinations": len(names["destinations"]) if names else 0}
+
+# Shared by every task handler; nothing connects until the first read.
+# CATALOG_MODE=database queries MongoDB per read instead of keeping a snapshot
+CATALOG_MODE = os.getenv("CATALOG_MODE", "snapshot").lower()
+if CATALOG_MODE == "database":
+    catalog = DatabaseCatalog(
+        PACKAGES_COLLECTION,
+        max_age_seconds=float(os.getenv("CATALOG_MAX_AGE_SECONDS", "300"))
+    )
+else:
+    catalog = CatalogSnapshot(
+        PACKAGES_COLLECTION,
+        poll_seconds=float(os.getenv("CATALOG_POLL_SECONDS", "5")),
+        max_age_seconds=float(os.getenv("CATALOG_MAX_AGE_SECONDS", "300")),
+        use_change_stream=os.getenv("CATALOG_CHANGE_STREAM", "true").lower() in ("1", "true", "yes")
+    )
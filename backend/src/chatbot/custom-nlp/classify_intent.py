@@ -8,8 +8,7 @@ from task_handlers import task5_compare
 from task_handlers import task6_recommend
 from task_handlers import task7_cancel
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
+from intent_classifier import UnifiedIntentClassifier
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -82,6 +81,23 @@ except Exception as e:
     vectorizer = None
     task_vectors = None
 
+# Task and the handlers' sub-intents in a single pass
+try:
+    intent_classifier = UnifiedIntentClassifier(
+        (vectorizer, task_vectors, list(TASK_KEYWORDS)),
+        {
+            "task1": (task1_packages.vectorizer, task1_packages.X, task1_packages.labels),
+            "task2": (task2_bookings.vectorizer, task2_bookings.X, task2_bookings.labels),
+            "task3": (task3_faqs.vectorizer, task3_faqs.X, task3_faqs.labels),
+        }
+    )
+except Exception as e:
+    logger.error(f"Error initializing intent classifier: {e}")
+    intent_classifier = None
+
+# Minimum task similarity for a confident match
+SIMILARITY_THRESHOLD = 0.15
+
 # Session context for multi-step conversations
 session_context = {}
 
@@ -104,25 +120,17 @@ def classify_intent(user_message, user_id="default"):
         return task4_feedback.capture_rating(user_message)
     
     # Fallback if vectorizer failed to initialize
-    if vectorizer is None or task_vectors is None:
+    if intent_classifier is None:
         return handle_fallback_classification(msg, user_id)
     
     try:
-        # Transform user message to vector
-        user_vector = vectorizer.transform([msg])
-        
-        # Compute cosine similarity with all task vectors
-        similarities = cosine_similarity(user_vector, task_vectors).flatten()
-        best_match_index = np.argmax(similarities)
-        best_similarity = similarities[best_match_index]
-        
-        logger.info(f"Similarity scores: {dict(zip(TASK_KEYWORDS.keys(), similarities))}")
-        logger.info(f"Best match: task{best_match_index + 1} with similarity {best_similarity}")
+        # One vectorization scores every task and sub-intent
+        best_task, sub_intent, best_similarity = intent_classifier.classify(msg)
+        logger.info(f"Best match: {best_task} ({sub_intent}) with similarity {best_similarity}")
         
         # Use a threshold to determine if we have a confident match
-        if best_similarity > 0.15:  # Adjusted threshold
-            best_task = list(TASK_KEYWORDS.keys())[best_match_index]
-            return route_to_handler(best_task, msg, user_id)
+        if best_similarity > SIMILARITY_THRESHOLD:
+            return route_to_handler(best_task, msg, user_id, intent=sub_intent)
         else:
             # Try rule-based fallback for very low similarity
             fallback_task = rule_based_classification(msg)
@@ -157,9 +165,11 @@ def rule_based_classification(msg):
     
     return None
 
-def route_to_handler(task, msg, user_id):
+def route_to_handler(task, msg, user_id, intent=None):
     """
     Route to appropriate task handler
+
+    intent is the handler's sub-intent when the classifier already has it
     """
     try:
         logger.info(f"Routing to {task} handler")
@@ -173,11 +183,11 @@ def route_to_handler(task, msg, user_id):
         
         # Call appropriate handler
         if task in TASK_HANDLERS:
+            kwargs = {"intent": intent} if intent else {}
             # Some handlers need user_id, others don't
             if task in ["task2", "task4", "task6", "task7"]:
-                return TASK_HANDLERS[task](msg, user_id=user_id)
-            else:
-                return TASK_HANDLERS[task](msg)
+                kwargs["user_id"] = user_id
+            return TASK_HANDLERS[task](msg, **kwargs)
         else:
             logger.error(f"No handler found for {task}")
             return {"reply": "Sorry, I cannot process your request at the moment."}
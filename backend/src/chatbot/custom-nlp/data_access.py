@@ -0,0 +1,125 @@
+from pymongo import MongoClient
+import logging
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB", "test")
+MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primaryPreferred")
+SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+# Server-side limit (maxTimeMS) of a single query unless the caller passes its own
+QUERY_TIMEOUT_MS = int(os.getenv("MONGO_QUERY_TIMEOUT_MS", "2000"))
+
+# MONGO_URI=mongomock:// runs against an in-memory stand-in (needs the mongomock package)
+MOCK_URI_PREFIX = "mongomock://"
+
+_client = None
+_client_lock = threading.Lock()
+
+def _create_client(uri):
+    if uri and uri.startswith(MOCK_URI_PREFIX):
+        import mongomock
+        logger.info("Using in-memory mongomock database")
+        return mongomock.MongoClient()
+
+    logger.info(f"Connecting to MongoDB (pool size {MAX_POOL_SIZE}, read preference {READ_PREFERENCE})")
+    return MongoClient(
+        uri,
+        maxPoolSize=MAX_POOL_SIZE,
+        minPoolSize=MIN_POOL_SIZE,
+        readPreference=READ_PREFERENCE,
+        serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=SOCKET_TIMEOUT_MS,
+        appname="custom-nlp",
+    )
+
+def get_client():
+    """
+    The process-wide MongoClient, created on first use
+
+    Every handler shares its connection pool; importing a handler never
+    connects.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client(MONGO_URI)
+    return _client
+
+def set_client(client):
+    """Use an existing client (e.g. mongomock.MongoClient() in benchmarks) instead of connecting"""
+    global _client
+    with _client_lock:
+        _client = client
+
+def get_collection(name):
+    return get_client()[MONGO_DB][name]
+
+def find(collection_name, query, projection, sort=None, limit=0, hint=None, timeout_ms=None):
+    """
+    Documents matching a query, reading only the projected fields
+
+    Parameters:
+    - collection_name: Collection in MONGO_DB
+    - query: Filter document
+    - projection: Fields to return (required: reads never fetch whole documents)
+    - sort: Optional list of (field, direction)
+    - limit: Maximum number of documents (0 for no limit)
+    - hint: Optional index name the query must use
+    - timeout_ms: Server-side time limit; QUERY_TIMEOUT_MS if None
+
+    Returns:
+    - list of documents
+    """
+    if not projection:
+        raise ValueError("find() needs a projection")
+    cursor = get_collection(collection_name).find(query, projection,
+                                                  max_time_ms=timeout_ms or QUERY_TIMEOUT_MS)
+    if hint:
+        cursor = cursor.hint(hint)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    return list(cursor)
+
+def find_one(collection_name, query, projection, sort=None, hint=None, timeout_ms=None):
+    """First document matching a query (projected fields only), or None"""
+    documents = find(collection_name, query, projection, sort=sort, limit=1, hint=hint, timeout_ms=timeout_ms)
+    return documents[0] if documents else None
+
+def aggregate(collection_name, pipeline, timeout_ms=None):
+    """Run an aggregation pipeline and return its documents"""
+    return list(get_collection(collection_name).aggregate(pipeline, maxTimeMS=timeout_ms or QUERY_TIMEOUT_MS))
+
+def watch(collection_name, **kwargs):
+    """Open a change stream on a collection (raises where the server has none)"""
+    return get_collection(collection_name).watch(**kwargs)
+
+def operation_time():
+    """Cluster time of the server's latest operation, a change stream start point (None without one)"""
+    return get_client().admin.command("ping").get("operationTime")
+
+def create_index(collection_name, keys, name):
+    """Create an index unless it exists (idempotent) and return its name"""
+    return get_collection(collection_name).create_index(keys, name=name)
+
+def bulk_write(collection_name, requests):
+    """Send write operations (e.g. pymongo.UpdateOne) in unordered batches"""
+    if not requests:
+        return 0
+    result = get_collection(collection_name).bulk_write(requests, ordered=False)
+    return result.modified_count
@@ -0,0 +1,102 @@
+import numpy as np
+from rapidfuzz import fuzz, process
+
+# Character n-gram length of the inverted index
+NGRAM = 3
+# Lists this short are scored directly, without candidate generation
+DIRECT_SCORING_LIMIT = 256
+
+def ngrams(text, n=NGRAM):
+    """Distinct character n-grams of a lower-cased, space-normalized string"""
+    text = " ".join(text.lower().split())
+    if len(text) < n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+class FuzzyIndex:
+    """
+    Best partial_ratio match of a message among many strings
+
+    Builds a character trigram inverted index (CSR postings: gram ->
+    string positions). A query looks up the message's trigrams, rarest
+    first, up to max_postings postings, and ranks strings by the share of
+    their own trigrams found in the message (partial_ratio aligns the
+    shorter string, usually the title, inside the message). Only the top
+    `candidates` strings are then scored exactly with one batched
+    rapidfuzz process.cdist call, so a lookup costs about the same for
+    100 or 100k strings.
+    """
+
+    def __init__(self, strings, candidates=32, max_postings=20000, scorer=fuzz.partial_ratio):
+        self.strings = [" ".join(s.lower().split()) for s in strings]
+        self.candidates = candidates
+        self.max_postings = max_postings
+        self.scorer = scorer
+
+        gram_ids = {}
+        pair_grams, pair_strings = [], []
+        sizes = np.zeros(len(self.strings), dtype=np.float32)
+        for position, string in enumerate(self.strings):
+            grams = ngrams(string)
+            sizes[position] = len(grams)
+            for gram in grams:
+                pair_grams.append(gram_ids.setdefault(gram, len(gram_ids)))
+                pair_strings.append(position)
+
+        pair_grams = np.asarray(pair_grams, dtype=np.int32)
+        order = np.argsort(pair_grams, kind='stable')
+        self.gram_ids = gram_ids
+        self.postings = np.asarray(pair_strings, dtype=np.int32)[order]
+        self.indptr = np.zeros(len(gram_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pair_grams, minlength=len(gram_ids)), out=self.indptr[1:])
+        self.sizes = np.maximum(sizes, 1.0)
+
+    def __len__(self):
+        return len(self.strings)
+
+    def _candidates(self, message):
+        """Positions of the strings sharing the most trigrams with the message"""
+        grams = [self.gram_ids[gram] for gram in ngrams(message) if gram in self.gram_ids]
+        if not grams:
+            return np.zeros(0, dtype=np.int64)
+
+        # Rarest trigrams first: they discriminate most and keep the merge short
+        grams = np.asarray(grams, dtype=np.int64)
+        lengths = self.indptr[grams + 1] - self.indptr[grams]
+        order = np.argsort(lengths, kind='stable')
+        cutoff = max(1, int(np.searchsorted(np.cumsum(lengths[order]), self.max_postings, side='right')))
+        lists = [self.postings[self.indptr[gram]:self.indptr[gram + 1]] for gram in grams[order[:cutoff]]]
+
+        positions, shared = np.unique(np.concatenate(lists), return_counts=True)
+        coverage = shared / self.sizes[positions]
+        if len(positions) > self.candidates:
+            top = np.argpartition(-coverage, self.candidates - 1)[:self.candidates]
+            positions = positions[top]
+        return np.sort(positions)
+
+    def best(self, message, score_cutoff=0.0):
+        """
+        Best-scoring string for a message
+
+        Parameters:
+        - message: User message
+        - score_cutoff: Minimum score (exclusive) for a match
+
+        Returns:
+        - (position, score), or None if no string scores above score_cutoff;
+          ties go to the lowest position
+        """
+        message = " ".join(message.lower().split())
+        if len(self.strings) <= DIRECT_SCORING_LIMIT:
+            positions = np.arange(len(self.strings))
+        else:
+            positions = self._candidates(message)
+        if not len(positions):
+            return None
+
+        scores = process.cdist([message], [self.strings[p] for p in positions], scorer=self.scorer,
+                               dtype=np.float32)[0]
+        best = int(np.argmax(scores))
+        if scores[best] <= score_cutoff:
+            return None
+        return int(positions[best]), float(scores[best])
@@ -0,0 +1,131 @@
+import re
+import numpy as np
+from scipy import sparse
+
+class UnifiedIntentClassifier:
+    """
+    Task and sub-intent of a message from one vectorization and one matmul
+
+    Built from already fitted TF-IDF models: the task model (message ->
+    task) and each task handler's sub-intent model (message -> intent).
+    Their vocabularies are merged into one feature space: unigrams come from
+    the raw tokens, bigrams from the tokens left after stop-word removal, as
+    each TfidfVectorizer produces them. Every model's idf weights and
+    l2-normalized example rows are folded into a single dense matrix, so one
+    sparse count matrix times that matrix yields every model's dot products
+    at once, plus the squared norm of the message's task vector.
+
+    Cosine similarity divides a model's dot products by the norm of the
+    message vector, which never changes an argmax. Only the task scores need
+    it (they are compared against a threshold); sub-intents are the argmax
+    of their raw dot products. Results match running each model's own
+    transform + cosine_similarity.
+    """
+
+    def __init__(self, task_model, sub_models):
+        """
+        Parameters:
+        - task_model: (TfidfVectorizer, normalized task matrix, task names)
+        - sub_models: dict task -> (TfidfVectorizer, normalized example matrix, labels)
+        """
+        models = [task_model, *sub_models.values()]
+        for vectorizer, _, _ in models:
+            self._check(vectorizer)
+
+        bigram_stop_words = {frozenset(v.get_stop_words() or ()) for v, _, _ in models if v.ngram_range == (1, 2)}
+        if len(bigram_stop_words) > 1:
+            raise ValueError("Bigram models must share their stop words")
+        self.bigram_stop_words = bigram_stop_words.pop() if bigram_stop_words else None
+        self.token_pattern = re.compile(task_model[0].token_pattern)
+
+        self.vocabulary = {}
+        columns = []
+        for vectorizer, _, _ in models:
+            terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+            columns.append(np.array([self.vocabulary.setdefault(t, len(self.vocabulary)) for t in terms]))
+
+        self.tasks = list(task_model[2])
+        self.sub_labels = {task: list(labels) for task, (_, _, labels) in sub_models.items()}
+        widths = [len(labels) for _, _, labels in models]
+        offsets = np.concatenate(([0], np.cumsum(widths)))
+        self.sub_columns = {task: (offsets[i + 1], offsets[i + 2]) for i, task in enumerate(sub_models)}
+        self.norm_column = offsets[-1]
+
+        # Rows: term counts, then squared term counts; columns: every model's
+        # examples, then the task vector's squared norm
+        size = len(self.vocabulary)
+        self.weights = np.zeros((2 * size, self.norm_column + 1))
+        for (vectorizer, matrix, _), model_columns, offset in zip(models, columns, offsets):
+            rows = sparse.csr_matrix(matrix).T.tocoo()
+            self.weights[model_columns[rows.row], offset + rows.col] = vectorizer.idf_[rows.row] * rows.data
+        task_idf = task_model[0].idf_
+        self.weights[size + columns[0], self.norm_column] = task_idf ** 2
+
+    @staticmethod
+    def _check(vectorizer):
+        if (vectorizer.analyzer != "word" or not vectorizer.lowercase or vectorizer.preprocessor
+                or vectorizer.tokenizer or vectorizer.strip_accents or vectorizer.binary
+                or vectorizer.sublinear_tf or not vectorizer.use_idf or vectorizer.norm != "l2"
+                or vectorizer.ngram_range not in ((1, 1), (1, 2))):
+            raise ValueError(f"Unsupported vectorizer settings: {vectorizer}")
+
+    def _terms(self, message):
+        tokens = self.token_pattern.findall(message.lower())
+        yield from tokens
+        if self.bigram_stop_words is not None:
+            kept = [t for t in tokens if t not in self.bigram_stop_words]
+            for i in range(len(kept) - 1):
+                yield f"{kept[i]} {kept[i + 1]}"
+
+    def vectorize(self, messages):
+        """CSR matrix of [term counts | squared term counts], one row per message"""
+        size = len(self.vocabulary)
+        indptr, indices, data = [0], [], []
+        for message in messages:
+            counts = {}
+            for term in self._terms(message):
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    counts[column] = counts.get(column, 0) + 1
+            indices.extend(counts)
+            indices.extend(column + size for column in counts)
+            values = list(counts.values())
+            data.extend(values)
+            data.extend(v * v for v in values)
+            indptr.append(len(indices))
+        return sparse.csr_matrix((np.asarray(data, dtype=np.float64), indices, indptr),
+                                 shape=(len(messages), 2 * size))
+
+    def classify_batch(self, messages):
+        """
+        Classify many messages at once
+
+        Parameters:
+        - messages: List of messages
+
+        Returns:
+        - list of (task, sub_intent, score): the best task, its handler's
+          sub-intent (None for tasks without one) and the task's cosine
+          similarity
+        """
+        if not messages:
+            return []
+        scores = self.vectorize(messages) @ self.weights
+        norms = np.sqrt(scores[:, self.norm_column])
+        task_scores = scores[:, :len(self.tasks)]
+        best_tasks = task_scores.argmax(axis=1)
+
+        results = []
+        for row, best in enumerate(best_tasks):
+            task = self.tasks[best]
+            score = task_scores[row, best] / norms[row] if norms[row] else 0.0
+            sub_intent = None
+            if task in self.sub_columns:
+                start, end = self.sub_columns[task]
+                sub_intent = self.sub_labels[task][int(scores[row, start:end].argmax())]
+            results.append((task, sub_intent, float(score)))
+        return results
+
+    def classify(self, message):
+        """(task, sub_intent, score) of a single message; see classify_batch"""
+        return self.classify_batch([message])[0]
@@ -1,18 +1,7 @@
-from bson import ObjectId
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-from pymongo import MongoClient
-import os
 import re
-from dotenv import load_dotenv
-from rapidfuzz import fuzz, process
-
-load_dotenv()
-
-# MongoDB connection
-client = MongoClient(os.getenv("MONGO_URI"))
-db = client["test"]
-collection = db["travelpackages"]
+from catalog import MAX_RESULTS, catalog
 
 # Training examples and labels
 examples = [
@@ -67,18 +56,16 @@ def extract_price_limits(msg):
     return None
 
 def extract_destination(msg):
-    destinations = collection.distinct("destination")
-    match = process.extractOne(msg, destinations, scorer=fuzz.partial_ratio)
-    if match and match[1] > 70:
-        return match[0]
-    return None
+    return catalog.get().find_destination(msg, score_cutoff=70)
 
-def handle(user_message):
+def handle(user_message, intent=None):
     msg = user_message.lower()
-    intent = predict_intent(user_message)
+    intent = intent or predict_intent(user_message)
+    # Every read below is served by the shared catalog (snapshot or indexed queries)
+    packages_index = catalog.get()
 
     if intent == "show_all":
-        packages = list(collection.find({}, {"title": 1, "destination": 1, "price": 1}).limit(10))
+        packages = packages_index.list_packages(10)
         if not packages:
             return {"reply": "No travel packages found."}
         reply = "Here are some available travel packages:\n\n"
@@ -94,27 +81,20 @@ def handle(user_message):
         price_limits = extract_price_limits(msg)
 
         if ("cheap" in msg or "low" in msg) and price_limits and "upper" in price_limits:
-            packages = list(collection.find({"price": {"$lte": price_limits["upper"]}}, {"title": 1, "destination": 1, "price": 1}))
+            packages = packages_index.price_range(upper=price_limits["upper"], limit=MAX_RESULTS)
             reply = f"Here are some cheap packages under ₹{price_limits['upper']}:\n\n"
 
         elif "cheap" in msg or "low" in msg:
-            packages = list(collection.find({"price": {"$lte": 50000}}, {"title": 1, "destination": 1, "price": 1}))
+            packages = packages_index.price_range(upper=50000, limit=MAX_RESULTS)
             reply = "Here are some budget-friendly packages (under ₹50,000):\n\n"
 
         elif "expensive" in msg or "luxury" in msg:
-            packages = list(collection.find({}, {"title": 1, "destination": 1, "price": 1}))
-            packages = sorted(packages, key=lambda x: x["price"], reverse=True)[:5]
+            packages = packages_index.most_expensive(5)
             reply = "Here are some premium travel packages:\n\n"
 
         elif price_limits:
-            query = {}
-            if "lower" in price_limits and "upper" in price_limits:
-                query["price"] = {"$gte": price_limits["lower"], "$lte": price_limits["upper"]}
-            elif "lower" in price_limits:
-                query["price"] = {"$gte": price_limits["lower"]}
-            elif "upper" in price_limits:
-                query["price"] = {"$lte": price_limits["upper"]}
-            packages = list(collection.find(query))
+            packages = packages_index.price_range(price_limits.get("lower"), price_limits.get("upper"),
+                                                   limit=MAX_RESULTS)
             reply = "Packages matching your price filter:\n\n"
 
         else:
@@ -134,7 +114,7 @@ def handle(user_message):
     elif intent == "destination_search":
         destination = extract_destination(msg)
         if destination:
-            packages = list(collection.find({"destination": {"$regex": destination, "$options": "i"}}))
+            packages = packages_index.matching_destinations(destination, limit=MAX_RESULTS)
             if not packages:
                 return {"reply": f"No packages found for {destination}."}
             reply = f"Packages for {destination}:\n\n"
@@ -148,20 +128,18 @@ def handle(user_message):
             return {"reply": "Please mention a valid destination (e.g., Goa, Kerala)."}
 
     elif intent == "get_price":
-        all_packages = list(collection.find({}, {"title": 1, "price": 1}))
-        for p in all_packages:
-            if fuzz.partial_ratio(p["title"].lower(), msg) > 80:
-                return {"reply": f"The price of '{p['title']}' is ₹{p['price']}."}
+        p = packages_index.find_package(msg, score_cutoff=80)
+        if p:
+            return {"reply": f"The price of '{p['title']}' is ₹{p['price']}."}
         return {"reply": "Please mention a valid package name to get the price."}
 
     elif intent == "check_availability":
-        all_packages = list(collection.find({}, {"title": 1, "destination": 1, "availability": 1}))
-        for p in all_packages:
-            if fuzz.partial_ratio(p["title"].lower(), msg) > 80 or fuzz.partial_ratio(p["destination"].lower(), msg) > 80:
-                if p.get("availability", 0) > 0:
-                    return {"reply": f"{p['availability']} slots are available for '{p['title']}'."}
-                else:
-                    return {"reply": f"'{p['title']}' is currently fully booked."}
+        p = packages_index.find_package(msg, score_cutoff=80, by_destination=True)
+        if p:
+            if p.get("availability", 0) > 0:
+                return {"reply": f"{p['availability']} slots are available for '{p['title']}'."}
+            else:
+                return {"reply": f"'{p['title']}' is currently fully booked."}
         return {"reply": "Couldn't find a package to check availability. Try mentioning the package name or destination."}
 
     else:
@@ -68,9 +68,9 @@ def fetch_user_bookings(user_id):
     except Exception as e:
         return []
 
-def handle(user_message, user_id):
+def handle(user_message, user_id, intent=None):
     msg = user_message.lower()
-    intent = predict_intent(user_message)
+    intent = intent or predict_intent(user_message)
 
     if not user_id:
         return {"reply": "User ID is missing. Please log in again."}
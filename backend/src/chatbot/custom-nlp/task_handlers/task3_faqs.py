@@ -50,8 +50,8 @@ def predict_intent(message):
     best_match = sim.argmax()
     return labels[best_match]
 
-def handle(user_message):
-    intent = predict_intent(user_message.lower())
+def handle(user_message, intent=None):
+    intent = intent or predict_intent(user_message.lower())
     answer = FAQ_DATA.get(intent, "I'm sorry, I don't have an answer to that right now.")
     
     # Beautiful styling for chatbot
@@ -1,14 +1,5 @@
-from pymongo import MongoClient
-import os
 import re
-from dotenv import load_dotenv
-
-load_dotenv()
-
-MONGO_URI = os.getenv("MONGO_URI")
-client = MongoClient(MONGO_URI)
-db = client["test"]
-collection = db["travelpackages"]
+from catalog import catalog
 
 def extract_destinations(message):
     """Try to extract two destinations from the user's message."""
@@ -24,8 +15,9 @@ def handle(user_message):
         return {"reply": "⚡ Please specify two destinations or packages to compare (e.g., 'Compare Goa and Kerala')."}
     
     # Search for matching travel packages
-    pkg1 = collection.find_one({"destination": {"$regex": dest1, "$options": "i"}})
-    pkg2 = collection.find_one({"destination": {"$regex": dest2, "$options": "i"}})
+    packages_index = catalog.get()
+    pkg1 = packages_index.first_matching_destination(dest1)
+    pkg2 = packages_index.first_matching_destination(dest2)
 
     if not pkg1 or not pkg2:
         return {"reply": f"❌ Could not find travel packages for both '{dest1}' and '{dest2}'. Please check the destination names."}
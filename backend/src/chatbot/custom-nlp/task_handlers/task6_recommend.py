@@ -1,28 +1,17 @@
-from pymongo import MongoClient
-import os
-import re
-from dotenv import load_dotenv
-import random
+from catalog import MAX_RESULTS, catalog
 
-load_dotenv()
-
-MONGO_URI = os.getenv("MONGO_URI")
-client = MongoClient(MONGO_URI)
-db = client["test"]
-collection = db["travelpackages"]
-
-def handle(user_message):
+def handle(user_message, user_id=None):
     msg = user_message.lower()
+    packages_index = catalog.get()
 
     if "budget" in msg or "cheap" in msg or "affordable" in msg:
-        packages = list(collection.find({"price": {"$lt": 50000}}))
+        packages = packages_index.price_range(upper=50000, include_upper=False, limit=MAX_RESULTS)
         title = "💸 Budget-Friendly Packages:"
     elif "luxury" in msg or "expensive" in msg or "premium" in msg:
-        packages = list(collection.find({"price": {"$gt": 100000}}))
+        packages = packages_index.price_range(lower=100000, include_lower=False, limit=MAX_RESULTS)
         title = "💎 Luxury Packages:"
     else:
-        packages = list(collection.find())
-        packages = random.sample(packages, min(len(packages), 5))  # Pick random 5 packages
+        packages = packages_index.sample(5)  # Pick random 5 packages
         title = "✨ Recommended Trips for You:"
 
     if not packages:
@@ -2,6 +2,7 @@ const express = require('express');
 const { ApolloServer } = require('apollo-server-express');
 const mongoose = require('mongoose');
 const jwt = require('jsonwebtoken');
+const crypto = require('crypto');
 const helmet = require('helmet');
 const cors = require('cors');
 const depthLimit = require('graphql-depth-limit');
@@ -35,6 +36,17 @@ const getUser = (token) => {
   return null; 
 };
 
+// Internal services (the recommender) authenticate with a shared secret header
+const isServiceRequest = (req) => {
+  const expected = process.env.RECOMMENDER_SERVICE_TOKEN;
+  const provided = req.headers['x-service-token'];
+  if (!expected || !provided) {
+    return false;
+  }
+  const a = Buffer.from(String(provided));
+  const b = Buffer.from(expected);
+  return a.length === b.length && crypto.timingSafeEqual(a, b);
+};
 
 // Apollo Server setup
 const server = new ApolloServer({
@@ -48,10 +60,10 @@ const server = new ApolloServer({
     try {
       const token = req.headers.authorization;
       const user = getUser(token);
-      return { models, user };
+      return { models, user, service: isServiceRequest(req) };
     } catch (err) {
       console.error('Context creation error:', err.message);
-      return { models, user: null };
+      return { models, user: null, service: isServiceRequest(req) };
     }
   }
   
@@ -6,7 +6,28 @@ const TravelPackageSchema = new mongoose.Schema({
     price: { type: Number, required: true },
     duration: { type: String, required: true },
     destination: { type: String, required: true },
+    // Lower-cased destination, so the chatbot's destination lookups can use an index
+    destinationLower: { type: String },
     availability: { type: Number,default:0,required: true },
 });
 
+TravelPackageSchema.index({ price: 1 });
+TravelPackageSchema.index({ destinationLower: 1, price: 1 });
+
+TravelPackageSchema.pre('validate', function (next) {
+    if (this.destination) {
+        this.destinationLower = this.destination.toLowerCase();
+    }
+    next();
+});
+
+TravelPackageSchema.pre('findOneAndUpdate', function (next) {
+    const update = this.getUpdate() || {};
+    const destination = update.destination ?? (update.$set && update.$set.destination);
+    if (typeof destination === 'string') {
+        this.set('destinationLower', destination.toLowerCase());
+    }
+    next();
+});
+
 module.exports = mongoose.model('TravelPackage', TravelPackageSchema);
@@ -0,0 +1,18 @@
+const axios = require('axios');
+
+const RECOMMENDER_URL = process.env.RECOMMENDER_URL || 'http://localhost:5000';
+
+// Tell the recommender the catalog changed so it drops responses built from the old one.
+// Best effort: the recommender may be down, and its cache entries expire on their own.
+const notifyCatalogChanged = () => {
+  const token = process.env.RECOMMENDER_SERVICE_TOKEN;
+  if (!token) {
+    return;
+  }
+  axios.post(`${RECOMMENDER_URL}/catalog/refresh`, {}, {
+    headers: { 'X-Service-Token': token },
+    timeout: 2000,
+  }).catch((err) => console.error('Recommender catalog refresh failed:', err.message));
+};
+
+module.exports = { notifyCatalogChanged };
@@ -2,6 +2,7 @@ const bcrypt = require('bcrypt');
 const jwt = require('jsonwebtoken');
 const stripe = require('stripe')(process.env.STRIPE_SECRET_KEY);
 const { AuthenticationError, UserInputError } = require('apollo-server-express');
+const { notifyCatalogChanged } = require('../recommenderClient');
 
 module.exports = {
   // Existing authentication mutations
@@ -370,6 +371,7 @@ module.exports = {
     });
 
     await newPackage.save();
+    notifyCatalogChanged();
     return newPackage;
   },
 
@@ -383,6 +385,7 @@ module.exports = {
         throw new Error('Travel package not found or already deleted');
       }
 
+      notifyCatalogChanged();
       return deletePackage;
     } catch (error) {
       console.error('Error deleting package:', error);
@@ -414,6 +417,7 @@ module.exports = {
         throw new Error('Travel package not found');
       }
 
+      notifyCatalogChanged();
       return updatedPackage;
     } catch (err) {
       console.error('Error updating package:', err);
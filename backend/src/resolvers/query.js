@@ -31,6 +31,32 @@ module.exports = {
     return Array.from(uniqueUsersMap.values());
   },
 
+  // Flat user -> package interaction stream for the recommender, paged by booking id
+  // Every user's bookings: admins and internal services only
+  getPackageInteractions: async (_, { after, limit = 5000 }, { models, user, service }) => {
+    if (!service && (!user || user.role !== 'admin')) {
+      throw new Error('You are not authorized to view package interactions');
+    }
+
+    try {
+      const filter = after ? { _id: { $gt: after } } : {};
+      const bookings = await models.Booking.find(filter, { user: 1, package: 1, status: 1, date: 1 })
+        .sort({ _id: 1 })
+        .limit(Math.min(limit, 10000))
+        .lean();
+      return bookings.map(booking => ({
+        id: booking._id.toString(),
+        userId: booking.user.toString(),
+        packageId: booking.package.toString(),
+        status: booking.status,
+        date: booking.date,
+      }));
+    } catch (err) {
+      console.error('Error fetching package interactions:', err);
+      throw new Error('Unable to fetch package interactions');
+    }
+  },
+
   // Fetch booking history for a specific user
   getBookingHistory: async (_, { userId }, { models, user }) => {
     if (!user) {
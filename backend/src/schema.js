@@ -70,6 +70,14 @@ module.exports = gql`
         packageStats: [PackageStats!]!
     }
 
+    type PackageInteraction {
+        id: ID!
+        userId: ID!
+        packageId: ID!
+        status: String!
+        date: String!
+    }
+
     type CancelBookingResult {
         booking: Booking!
         refund: String
@@ -79,6 +87,7 @@ module.exports = gql`
     type Query {
         getPackages: [TravelPackage!]
         getUsersByPackage(packageId: ID!): [User!]
+        getPackageInteractions(after: ID, limit: Int): [PackageInteraction!]
         getUsersWithBookingCounts: [UserWithBookingCount!]
         getBookingHistory(userId: ID!): [Booking!]
         getPaymentStatus(paymentIntentId: String!): PaymentStatus
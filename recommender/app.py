@@ -1,9 +1,26 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
-from model.cf import collaborative_filtering_full
+from gql import gql
+import hmac
+import json
+import os
+import re
+import threading
+from functools import wraps
+import time
+from graphql_client import PooledGraphQLClient
+from pipeline import PipelineExecutor, Stage, StageTimeout
+from result_cache import RecommendationCache
+from model.cf import collaborative_filtering_full, fallback_package_ids
 from model.cbf import content_based_filtering
+from model.hybrid import combine_recommendations, hybrid_recommendations_batch, users_booked_packages
+from model.interactions import InteractionStore, is_active_booking
+from model.item_index import ItemNeighbourIndex
+from model.factorization import FactorModel
+from model.snapshot import RecommendationSnapshot, booking_fingerprint
+from model.text_index import CatalogTextIndex
+from model.trending import TrendingPopularity
+from model.weighting import ConfidenceWeights
 
 app = Flask(__name__)
 CORS(app, resources={
@@ -14,6 +31,428 @@ CORS(app, resources={
     }
 })
 
+INTERACTIONS_PAGE_SIZE = 5000
+
+# Shared, connection-pooled GraphQL client; the schema is fetched once
+graphql_client = PooledGraphQLClient()
+
+all_users_query = gql("""
+query {
+    getUsersWithBookingCounts {
+        id
+        username
+        email
+        bookingCount
+    }
+}
+""")
+
+all_packages_query = gql("""
+query {
+    getPackages {
+        id
+        title
+        description
+        price
+        duration
+        destination
+        availability
+    }
+}
+""")
+
+user_booking_query = gql("""
+query ($userId: ID!) {
+    getBookingHistory(userId: $userId) {
+        id
+        user {
+            id
+            username
+            email
+        }
+        package {
+            id
+            title
+            description
+            price
+            duration
+            destination
+            availability
+        }
+        date
+        status
+    }
+}
+""")
+
+package_interactions_query = gql("""
+query ($after: ID, $limit: Int) {
+    getPackageInteractions(after: $after, limit: $limit) {
+        id
+        userId
+        packageId
+        status
+        date
+    }
+}
+""")
+
+def fetch_package_interactions(client, page_size=INTERACTIONS_PAGE_SIZE):
+    """
+    Fetch every user -> package booking interaction in a few paged calls
+
+    Parameters:
+    - client: GraphQL client for the backend
+    - page_size: Number of interactions requested per call
+
+    Returns:
+    - list of interaction dicts (id, userId, packageId, status, date)
+    """
+    interactions = []
+    after = None
+
+    while True:
+        result = client.execute(package_interactions_query,
+                                variable_values={"after": after, "limit": page_size})
+        page = result.get("getPackageInteractions") or []
+        interactions.extend(page)
+
+        if len(page) < page_size:
+            break
+        after = page[-1]['id']
+
+    return interactions
+
+# Confidence weights (status, recency) stored as interaction values; binary interactions if disabled
+WEIGHTED_INTERACTIONS = os.getenv("RECOMMENDER_WEIGHTED_INTERACTIONS", "false").lower() in ("1", "true", "yes")
+interaction_weighting = ConfidenceWeights(
+    half_life_days=float(os.getenv("RECOMMENDER_WEIGHT_HALF_LIFE_DAYS", "180")),
+    reference_time=time.time()
+) if WEIGHTED_INTERACTIONS else None
+
+# Process-resident interaction store, loaded once in the background and kept current by deltas
+interaction_store = None
+interaction_store_lock = threading.Lock()
+# A failed load is retried after a backoff doubling from the minimum to the maximum
+STORE_RETRY_MIN_SECONDS = float(os.getenv("RECOMMENDER_STORE_RETRY_MIN_SECONDS", "5"))
+STORE_RETRY_MAX_SECONDS = float(os.getenv("RECOMMENDER_STORE_RETRY_MAX_SECONDS", "300"))
+interaction_store_loader = {"loading": False, "failures": 0, "retry_at": 0.0}
+
+# Time-decayed booking counters for the cold-start fallback, fed with the store load and booking events
+trending_popularity = TrendingPopularity(
+    half_life_days=float(os.getenv("RECOMMENDER_TRENDING_HALF_LIFE_DAYS", "7")),
+    capacity=int(os.getenv("RECOMMENDER_TRENDING_TOP_K", "50"))
+)
+
+# Top-K item-item neighbour table, built in the background from the store
+item_index = ItemNeighbourIndex()
+
+def build_item_index_in_background(store):
+    def build():
+        with store.lock:
+            matrix, version = store.matrix, store.version
+        item_index.build(matrix, version)
+
+    threading.Thread(target=build, daemon=True, name="item-index-build").start()
+
+# TF-IDF vectors of the catalog, fitted once and refreshed as packages change
+catalog_text_index = CatalogTextIndex()
+
+# Nightly top-N snapshot written by precompute.py, memory-mapped and reopened when replaced
+SNAPSHOT_PATH = os.getenv("RECOMMENDER_SNAPSHOT_PATH",
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), "model", "recommendations.snap"))
+recommendation_snapshot = RecommendationSnapshot(SNAPSHOT_PATH)
+
+# Threads running the /recommend stage DAG, and per-stage timeouts in seconds
+pipeline_executor = PipelineExecutor(
+    max_workers=int(os.getenv("RECOMMENDER_PIPELINE_WORKERS", "16")),
+    # Timed-out runs of one stage that may keep holding workers before new runs are shed
+    max_abandoned=int(os.getenv("RECOMMENDER_PIPELINE_MAX_ABANDONED", "4")),
+    # Seconds a stage may wait for a free worker before it is shed
+    max_queue_seconds=float(os.getenv("RECOMMENDER_PIPELINE_MAX_QUEUE_SECONDS", "2"))
+)
+STAGE_TIMEOUTS = {
+    "fetch": float(os.getenv("RECOMMENDER_FETCH_TIMEOUT", "10")),
+    "users": float(os.getenv("RECOMMENDER_USERS_TIMEOUT", "2")),
+    "interactions": float(os.getenv("RECOMMENDER_INTERACTIONS_TIMEOUT", "30")),
+    "cf": float(os.getenv("RECOMMENDER_CF_TIMEOUT", "2")),
+    "cbf": float(os.getenv("RECOMMENDER_CBF_TIMEOUT", "2")),
+}
+
+# Upper bound on user_ids accepted by /recommend/batch
+BATCH_MAX_USERS = int(os.getenv("RECOMMENDER_BATCH_MAX_USERS", "10000"))
+
+# Final responses per user, reused until the user's bookings or the models change
+recommendation_cache = RecommendationCache(
+    max_entries=int(os.getenv("RECOMMENDER_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("RECOMMENDER_CACHE_TTL", "300"))
+)
+
+def catalog_version():
+    """
+    Version of the catalog that cached responses were built from
+
+    Factor model refits are deliberately left out: keying on them would
+    drop every cached response on each background refit, so the cache TTL
+    absorbs them instead.
+    """
+    return catalog_text_index.version
+
+def bookings_fingerprint(user_bookings):
+    """Fingerprint of a user's booking history; a booking or a status change (cancel) changes it"""
+    return booking_fingerprint([f"{booking['package']['id']}:{booking.get('status')}" for booking in user_bookings
+                                if booking.get('package') and booking['package'].get('id')])
+
+# Matrix factorization model, persisted so restarts can serve before refitting
+FACTORS_PATH = os.getenv("RECOMMENDER_FACTORS_PATH",
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), "model", "factors.npz"))
+FACTOR_REFIT_UPDATES = int(os.getenv("RECOMMENDER_FACTOR_REFIT_UPDATES", "500"))
+factor_model = FactorModel()
+factor_refit_lock = threading.Lock()
+
+def refit_factor_model_in_background(store):
+    """Fit a new factor model from the store and swap it in when done"""
+    if not factor_refit_lock.acquire(blocking=False):
+        return  # A refit is already running
+
+    def refit():
+        global factor_model
+        try:
+            with store.lock:
+                matrix, version = store.matrix, store.version
+                package_ids, user_ids = list(store.package_ids), list(store.user_ids)
+            model = FactorModel().fit(matrix, package_ids, user_ids, version=version)
+            factor_model = model
+            model.save(FACTORS_PATH)
+        except Exception as e:
+            print(f"Factor model refit failed: {str(e)}")
+        finally:
+            factor_refit_lock.release()
+
+    threading.Thread(target=refit, daemon=True, name="factor-refit").start()
+
+def load_factor_model():
+    global factor_model
+    if os.path.exists(FACTORS_PATH):
+        try:
+            factor_model = FactorModel.load(FACTORS_PATH)
+            # Store versions restart at 0 in every process
+            factor_model.version = -1
+            print(f"Loaded factor model from {FACTORS_PATH}")
+        except Exception as e:
+            print(f"Could not load factor model: {str(e)}")
+
+def load_interaction_store():
+    """Load the interaction store from the backend; runs on the loader thread"""
+    global interaction_store
+    try:
+        # The service client: getPackageInteractions is not open to user tokens
+        packages_result = graphql_client.execute(gql("query { getPackages { id } }"))
+        package_ids = [pkg['id'] for pkg in packages_result.get("getPackages") or []]
+        interactions = fetch_package_interactions(graphql_client)
+        store = InteractionStore.from_interactions(interactions, package_ids, weighting=interaction_weighting)
+        trending_popularity.add_interactions(interactions)
+        interaction_store = store
+        build_item_index_in_background(store)
+
+        # Serve the persisted factors until a fresh fit replaces them
+        load_factor_model()
+        refit_factor_model_in_background(store)
+        interaction_store_loader["failures"] = 0
+    except Exception as e:
+        failures = interaction_store_loader["failures"] = interaction_store_loader["failures"] + 1
+        backoff = min(STORE_RETRY_MAX_SECONDS, STORE_RETRY_MIN_SECONDS * 2 ** (failures - 1))
+        interaction_store_loader["retry_at"] = time.monotonic() + backoff
+        print(f"Could not load interaction store: {str(e)}; retrying in {backoff:.0f} s")
+    finally:
+        interaction_store_loader["loading"] = False
+
+def get_interaction_store():
+    """
+    Return the shared interaction store without blocking
+
+    Starts the background load on first use (and after a failed load's
+    backoff has passed).
+
+    Returns:
+    - InteractionStore, or None while it is loading or unavailable
+    """
+    if interaction_store is not None:
+        return interaction_store
+
+    with interaction_store_lock:
+        if (interaction_store is None and not interaction_store_loader["loading"]
+                and time.monotonic() >= interaction_store_loader["retry_at"]):
+            interaction_store_loader["loading"] = True
+            threading.Thread(target=load_interaction_store, daemon=True, name="interaction-store-load").start()
+    return interaction_store
+
+# Shared secret internal callers (the backend) send as X-Service-Token; internal endpoints are closed without it
+SERVICE_TOKEN = os.getenv("RECOMMENDER_SERVICE_TOKEN")
+# Backend user and package IDs are MongoDB ObjectIds
+OBJECT_ID_PATTERN = re.compile(r'^[0-9a-f]{24}$')
+
+def require_service_token(view):
+    """Reject requests without the shared service token"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not SERVICE_TOKEN:
+            return jsonify({"success": False, "error": "Service token is not configured"}), 403
+        provided = request.headers.get('X-Service-Token') or ''
+        if not hmac.compare_digest(provided.encode(), SERVICE_TOKEN.encode()):
+            return jsonify({"success": False, "error": "Invalid service token"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/interactions/events', methods=['POST'])
+@require_service_token
+def interaction_events():
+    """
+    Apply 'booking added/cancelled' deltas to the interaction store
+
+    Events naming a package outside the catalog, a malformed user ID, or a
+    cancellation of a booking the store does not hold are rejected. A
+    cancellation only leaves trending popularity when it carries the
+    cancelled booking's date.
+    """
+    data = request.get_json(silent=True) or {}
+    events = data.get('events', [data])
+    if not isinstance(events, list):
+        return jsonify({"success": False, "error": "events must be a list"}), 400
+
+    if interaction_store is None:
+        return jsonify({
+            "success": False,
+            "error": "Interaction store is not loaded"
+        }), 503
+
+    applied = 0
+    rejected = 0
+    for event in events:
+        user_id = event.get('user_id') if isinstance(event, dict) else None
+        package_id = event.get('package_id') if isinstance(event, dict) else None
+        if (not isinstance(user_id, str) or not OBJECT_ID_PATTERN.match(user_id)
+                or not isinstance(package_id, str) or package_id not in interaction_store.package_index
+                or event.get('type') not in ('booked', 'cancelled')):
+            rejected += 1
+            continue
+
+        # A booking or cancellation changes that user's recommendations
+        recommendation_cache.invalidate_user(user_id)
+
+        if event.get('type') == 'booked':
+            weight = 1.0
+            if interaction_weighting is not None:
+                weight = interaction_weighting.weight(event.get('rating'), event.get('status'), event.get('date'))
+            interaction_store.add_booking(user_id, package_id, weight)
+            trending_popularity.add_booking(package_id, event.get('date'))
+            applied += 1
+        elif event.get('type') == 'cancelled':
+            if interaction_store.cancel_booking(user_id, package_id):
+                # The booking's own date removes the amount it added; undated ones are skipped
+                trending_popularity.cancel_booking(package_id, event.get('date'))
+                applied += 1
+            else:
+                rejected += 1
+
+    return jsonify({
+        "success": True,
+        "applied": applied,
+        "rejected": rejected,
+        "version": interaction_store.version
+    }), 200
+
+@app.route('/catalog/refresh', methods=['POST'])
+@require_service_token
+def catalog_refresh():
+    """Bump the catalog version: refit the text index and drop cached responses"""
+    catalog_text_index.invalidate()
+    return jsonify({"success": True, "catalog_version": catalog_text_index.version}), 200
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        "success": True,
+        "entries": len(recommendation_cache),
+        "max_entries": recommendation_cache.max_entries,
+        "ttl_seconds": recommendation_cache.ttl_seconds,
+        "stats": recommendation_cache.stats,
+        "snapshot": {
+            "ready": recommendation_snapshot.ready,
+            "created_at": recommendation_snapshot.created_at,
+            "memory": recommendation_snapshot.memory_usage(),
+            "stats": recommendation_snapshot.stats
+        }
+    }), 200
+
+@app.route('/trending', methods=['GET'])
+def trending():
+    """
+    Trending package IDs with their decayed booking scores
+
+    Query parameters: k (default 10), and optionally destination or theme to
+    rank one group's packages. Also returns the trending destinations and
+    themes.
+    """
+    try:
+        k = max(1, min(int(request.args.get('k', 10)), 100))
+    except ValueError:
+        return jsonify({"success": False, "error": "k must be an integer"}), 400
+
+    group = None
+    if request.args.get('destination'):
+        group = f"destination:{request.args['destination'].strip().lower()}"
+    elif request.args.get('theme'):
+        group = f"theme:{request.args['theme'].strip().lower()}"
+
+    now = time.time()
+    return jsonify({
+        "success": True,
+        "group": group,
+        "packages": [{"id": pkg_id, "score": trending_popularity.score(pkg_id, now)}
+                     for pkg_id in trending_popularity.top(k, group=group)],
+        "destinations": [{"destination": key.split(':', 1)[1], "score": trending_popularity.score(key, now)}
+                         for key in trending_popularity.top_groups(k, kind="destination")],
+        "themes": [{"theme": key.split(':', 1)[1], "score": trending_popularity.score(key, now)}
+                   for key in trending_popularity.top_groups(k, kind="theme")]
+    }), 200
+
+@app.route('/interactions/stats', methods=['GET'])
+def interaction_stats():
+    if interaction_store is None:
+        return jsonify({"success": False, "error": "Interaction store is not loaded"}), 503
+
+    return jsonify({
+        "success": True,
+        "users": interaction_store.num_users,
+        "packages": interaction_store.num_packages,
+        "version": interaction_store.version,
+        "memory": interaction_store.memory_usage(),
+        "stats": interaction_store.stats,
+        "factor_model": {
+            "ready": factor_model.ready,
+            "version": factor_model.version,
+            "stats": factor_model.stats
+        },
+        "item_index": {
+            "ready": item_index.ready,
+            "version": item_index.version,
+            "memory": item_index.memory_usage(),
+            "stats": item_index.stats
+        },
+        "text_index": {
+            "ready": catalog_text_index.ready,
+            "version": catalog_text_index.version,
+            "memory": catalog_text_index.memory_usage(),
+            "stats": catalog_text_index.stats
+        },
+        "trending": {
+            "half_life_days": (trending_popularity.half_life_seconds or 0) / 86400,
+            "memory": trending_popularity.memory_usage(),
+            "stats": trending_popularity.stats
+        }
+    }), 200
+
 @app.route('/recommend', methods=['POST'])
 def recommend():
     if request.method == 'OPTIONS':
@@ -43,230 +482,165 @@ def recommend():
             'error': 'Missing user_id or auth_token'
         }), 400
 
-    # Setup GraphQL client
-    transport = RequestsHTTPTransport(
-        url='http://localhost:4000/api',
-        headers={
-            "Authorization": f"Bearer {auth_token}",
-            "Content-Type": "application/json"
-        },
-        verify=True,
-        retries=3,
-    )
-    client = Client(transport=transport, fetch_schema_from_transport=True)
+    # Reuse the pooled GraphQL client with this caller's auth token
+    client = graphql_client.for_token(auth_token)
 
     try:
+        # 1. The booking history keys the result cache, so it is fetched first
+        booked, bookings_report = pipeline_executor.run([
+            Stage("bookings", lambda: client.execute(user_booking_query, variable_values={"userId": user_id})
+                  .get("getBookingHistory", []), timeout=STAGE_TIMEOUTS["fetch"]),
+        ])
+        user_bookings = booked["bookings"]
+        print(f"Found {len(user_bookings)} bookings for user {user_id}")
+        # Cancelled bookings stay in the history but are not interactions, as in the store
+        active_bookings = [booking for booking in user_bookings if is_active_booking(booking)]
+
+        # Repeat requests are served from the result cache while the bookings and catalog are unchanged
+        fingerprint = bookings_fingerprint(user_bookings)
+        # Read before scoring: a catalog change mid-request must not be cached as current
+        version = catalog_version()
+        cached_response = recommendation_cache.get(user_id, version, fingerprint, auth_token)
+        if cached_response is not None:
+            print(f"Serving cached recommendations for user {user_id}")
+            return jsonify(cached_response), 200
+
         print("=== FETCHING ALL DATA FOR COLLABORATIVE FILTERING ===")
         
-        # 1. Get all users with their booking counts
-        all_users_query = gql("""
-        query {
-            getUsersWithBookingCounts {
-                id
-                username
-                email
-                bookingCount
-            }
-        }
-        """)
-        
-        print("Fetching all users...")
-        users_result = client.execute(all_users_query)
-        all_users = users_result.get("getUsersWithBookingCounts", [])
-        print(f"Found {len(all_users)} users in system")
-
-        # 2. Get all available packages
-        all_packages_query = gql("""
-        query {
-            getPackages {
-                id
-                title
-                description
-                price
-                duration
-                destination
-                availability
-            }
-        }
-        """)
-        
-        print("Fetching all packages...")
-        packages_result = client.execute(all_packages_query)
-        all_packages = packages_result.get("getPackages", [])
+        # 2-3. Fetch users and packages concurrently
+        print("Fetching users and packages...")
+        fetched, fetch_report = pipeline_executor.run([
+            # The user count is informational; a slow query must not hold up recommendations
+            Stage("users", lambda: client.execute(all_users_query).get("getUsersWithBookingCounts", []),
+                  timeout=STAGE_TIMEOUTS["users"], fallback=None),
+            Stage("packages", lambda: client.execute(all_packages_query).get("getPackages", []),
+                  timeout=STAGE_TIMEOUTS["fetch"]),
+        ])
+        fetch_report = {**bookings_report, **fetch_report}
+
+        all_users = fetched["users"]
+        total_users = len(all_users) if all_users is not None else None
+        print(f"Found {total_users} users in system")
+
+        all_packages = fetched["packages"]
         print(f"Found {len(all_packages)} packages in system")
 
-        # 3. Get current user's booking history
-        user_booking_query = gql("""
-        query ($userId: ID!) {
-            getBookingHistory(userId: $userId) {
-                id
-                user {
-                    id
-                    username
-                    email
-                }
-                package {
-                    id
-                    title
-                    description
-                    price
-                    duration
-                    destination
-                    availability
-                }
-                date
-                status
-            }
-        }
-        """)
-        
-        print(f"Fetching booking history for user {user_id}...")
-        user_bookings_result = client.execute(user_booking_query, variable_values={"userId": user_id})
-        user_bookings = user_bookings_result.get("getBookingHistory", [])
-        print(f"Found {len(user_bookings)} bookings for user")
-
-        # 4. Build comprehensive booking data for all users
-        print("Building comprehensive user-package matrix...")
-        all_users_bookings = {}
-        
-        # Add current user's bookings
-        all_users_bookings[user_id] = user_bookings
-        
-        # 5. CORRECTED: Build package-user matrix using getUsersByPackage
-        print("Building package-user relationships...")
-        package_user_matrix = {}
-        
-        # For each package, get users who booked it using the correct query
-        for package in all_packages:
-            package_id = package['id']
-            try:
-                # Use the correct GraphQL query that exists in your schema
-                package_users_query = gql("""
-                query ($packageId: ID!) {
-                    getUsersByPackage(packageId: $packageId) {
-                        id
-                        username
-                        email
-                    }
-                }
-                """)
-                
-                users_for_package_result = client.execute(package_users_query, 
-                                                        variable_values={"packageId": package_id})
-                users_for_package = users_for_package_result.get("getUsersByPackage", [])
-                
-                # Extract user IDs who booked this package
-                user_ids_for_package = [user['id'] for user in users_for_package if user.get('id')]
-                
-                package_user_matrix[package_id] = user_ids_for_package
-                print(f"Package {package.get('title', package_id)}: {len(user_ids_for_package)} users")
-                
-            except Exception as e:
-                print(f"Could not fetch users for package {package_id}: {str(e)}")
-                package_user_matrix[package_id] = []
-
-        # 6. Build more comprehensive user-package data from package-user matrix
-        print("Building user-package relationships from package data...")
-        
-        # Reconstruct user bookings from package-user relationships
-        for package_id, user_ids in package_user_matrix.items():
-            package_obj = next((pkg for pkg in all_packages if pkg['id'] == package_id), None)
-            
-            if not package_obj:
-                continue
-                
-            for uid in user_ids:
-                if uid not in all_users_bookings:
-                    all_users_bookings[uid] = []
-                
-                # Create a mock booking object for collaborative filtering
-                # Check if this booking already exists
-                existing_booking = any(
-                    booking.get('package', {}).get('id') == package_id 
-                    for booking in all_users_bookings[uid]
-                )
-                
-                if not existing_booking:
-                    mock_booking = {
-                        'id': f"mock_{uid}_{package_id}",
-                        'package': package_obj,
-                        'user': {'id': uid},
-                        'status': 'completed'  # Assume completed for CF purposes
+        # Serve from the offline snapshot unless the user is cold or booked since it was written
+        if recommendation_snapshot.refresh():
+            booked_ids = {booking['package']['id'] for booking in active_bookings
+                          if booking.get('package') and booking['package'].get('id')}
+            snapshot_recommendations = recommendation_snapshot.lookup(user_id, booked_ids)
+            if snapshot_recommendations is not None:
+                package_map = {pkg["id"]: pkg for pkg in all_packages}
+                final_recommendations = [package_map[pkg_id] for pkg_id, score in snapshot_recommendations
+                                         if pkg_id in package_map and pkg_id not in booked_ids][:6]
+                if final_recommendations:
+                    print(f"Serving {len(final_recommendations)} snapshot recommendations for user {user_id}")
+                    response = {
+                        "success": True,
+                        "user_id": user_id,
+                        "recommendations": final_recommendations,
+                        "debug_info": {
+                            "source": "snapshot",
+                            "total_users": total_users,
+                            "total_packages": len(all_packages),
+                            "user_bookings_count": len(user_bookings),
+                            "final_count": len(final_recommendations),
+                            "stages": fetch_report
+                        }
                     }
-                    all_users_bookings[uid].append(mock_booking)
+                    if all_users is not None:
+                        recommendation_cache.put(user_id, version, fingerprint, auth_token, response)
+                    return jsonify(response), 200
 
-        print(f"Built comprehensive booking data for {len(all_users_bookings)} users")
-        
-        # 7. Run Collaborative Filtering
-        print("\n=== RUNNING COLLABORATIVE FILTERING ===")
-        try:
+        def load_interactions():
+            # 4. Use the process-resident interaction store for all other users
+            store = get_interaction_store()
+            if store is None:
+                print("Interaction store is not loaded yet; skipping collaborative filtering")
+                return None
+
+            store.add_packages(pkg['id'] for pkg in all_packages)
+            store.sync_user(user_id, user_bookings)
+            trending_popularity.set_packages(all_packages)
+
+            if store.version - factor_model.version >= FACTOR_REFIT_UPDATES:
+                refit_factor_model_in_background(store)
+            print(f"Using interaction store: {store.num_users} users, version {store.version}")
+            return store
+
+        def run_collaborative_filtering(interactions):
+            # 7. Run Collaborative Filtering
+            print("\n=== RUNNING COLLABORATIVE FILTERING ===")
+            if interactions is None:
+                return []
+
+            # The item index and factor model are fitted on the shared store only
+            from_store = isinstance(interactions, InteractionStore)
             cf_recommendations = collaborative_filtering_full(
                 user_id=user_id,
-                user_bookings=user_bookings,
-                all_users_bookings=all_users_bookings,
-                package_user_matrix=package_user_matrix,
-                all_packages=all_packages
+                user_bookings=active_bookings,
+                all_packages=all_packages,
+                interactions=interactions,
+                item_index=item_index if from_store else None,
+                factor_model=factor_model if from_store else None,
+                popularity=trending_popularity if from_store else None
             )
             print(f"Collaborative Filtering generated {len(cf_recommendations)} recommendations")
-        except Exception as e:
-            print(f"Collaborative filtering failed: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            cf_recommendations = []
+            return cf_recommendations
 
-        # 8. Run Content-Based Filtering
-        print("\n=== RUNNING CONTENT-BASED FILTERING ===")
-        try:
+        def run_content_based_filtering():
+            # 8. Run Content-Based Filtering
+            print("\n=== RUNNING CONTENT-BASED FILTERING ===")
             # Extract user's packages for CBF
             user_packages = []
             for booking in user_bookings:
                 if booking.get('package'):
                     user_packages.append(booking['package'])
             
-            cbf_recommendations = content_based_filtering(user_packages, all_packages)
+            cbf_recommendations = content_based_filtering(user_packages, all_packages,
+                                                          text_index=catalog_text_index)
             print(f"Content-Based Filtering generated {len(cbf_recommendations)} recommendations")
-        except Exception as e:
-            print(f"Content-based filtering failed: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            cbf_recommendations = []
+            return cbf_recommendations
+
+        # CBF needs neither the interaction data nor CF, so it runs alongside both;
+        # a stage that fails or runs late contributes no recommendations
+        scored, score_report = pipeline_executor.run([
+            Stage("interactions", load_interactions, timeout=STAGE_TIMEOUTS["interactions"],
+                  fallback=None),
+            Stage("cf", run_collaborative_filtering, deps=["interactions"], timeout=STAGE_TIMEOUTS["cf"],
+                  fallback=[]),
+            Stage("cbf", run_content_based_filtering, timeout=STAGE_TIMEOUTS["cbf"], fallback=[]),
+        ])
+        stage_report = {**fetch_report, **score_report}
+        degraded = [name for name, stage in stage_report.items() if stage["status"] != "ok"]
+        if scored["interactions"] is None and "interactions" not in degraded:
+            degraded.append("interactions")
+        print(f"Pipeline stages: {stage_report}")
+
+        cf_recommendations = scored["cf"]
+        cbf_recommendations = scored["cbf"]
+        interactions = scored["interactions"] or interaction_store
 
         # 9. Combine recommendations
         print("\n=== COMBINING RECOMMENDATIONS ===")
         
-        # Combine and deduplicate
-        combined_ids = list(set(cf_recommendations + cbf_recommendations))
-        print(f"Combined unique recommendations: {len(combined_ids)}")
-
         # Get user's already booked package IDs
         user_booked_ids = set()
-        for booking in user_bookings:
+        for booking in active_bookings:
             if booking.get('package') and booking['package'].get('id'):
                 user_booked_ids.add(booking['package']['id'])
 
-        # Filter out already booked packages
-        filtered_recommendations = [pkg_id for pkg_id in combined_ids if pkg_id not in user_booked_ids]
+        # 10. Deduplicate, drop booked packages and fall back to popularity if empty
+        combined_ids = list(dict.fromkeys(cf_recommendations + cbf_recommendations))
+        print(f"Combined unique recommendations: {len(combined_ids)}")
+        filtered_recommendations = combine_recommendations(
+            cf_recommendations, cbf_recommendations, user_booked_ids,
+            lambda: fallback_package_ids(interactions, trending_popularity if interaction_store is not None else None,
+                                         k=4, exclude=user_booked_ids)
+        )
         print(f"After filtering out booked packages: {len(filtered_recommendations)}")
 
-        # 10. Fallback if no recommendations
-        if not filtered_recommendations:
-            print("No recommendations generated, using popularity fallback...")
-            
-            # Use packages with most bookings as fallback
-            package_popularity = {}
-            for pkg_id, users in package_user_matrix.items():
-                package_popularity[pkg_id] = len(users)
-            
-            # Sort by popularity and exclude user's booked packages
-            popular_packages = sorted(package_popularity.items(), key=lambda x: x[1], reverse=True)
-            for pkg_id, popularity in popular_packages:
-                if pkg_id not in user_booked_ids:
-                    filtered_recommendations.append(pkg_id)
-                    if len(filtered_recommendations) >= 4:
-                        break
-            
-            print(f"Popularity fallback generated {len(filtered_recommendations)} recommendations")
-
         # 11. Get full package details
         package_map = {pkg["id"]: pkg for pkg in all_packages}
         final_recommendations = []
@@ -280,26 +654,39 @@ def recommend():
         for pkg in final_recommendations:
             print(f"  - {pkg.get('title', 'Unknown')} (ID: {pkg.get('id')})")
 
-        return jsonify({
+        response = {
             "success": True,
             "user_id": user_id,
             "recommendations": final_recommendations,
             "debug_info": {
-                "total_users": len(all_users),
+                "source": "online",
+                "total_users": total_users,
                 "total_packages": len(all_packages),
                 "user_bookings_count": len(user_bookings),
                 "cf_recommendations": len(cf_recommendations),
                 "cbf_recommendations": len(cbf_recommendations),
                 "combined_before_filter": len(combined_ids),
-                "final_count": len(final_recommendations)
+                "final_count": len(final_recommendations),
+                "stages": stage_report,
+                "degraded_stages": degraded
             }
-        }), 200
+        }
+        # Degraded responses are not cached so the next request gets a full answer
+        if not degraded:
+            recommendation_cache.put(user_id, version, fingerprint, auth_token, response)
+        return jsonify(response), 200
 
     except Exception as e:
         print(f"Error: {str(e)}")
         import traceback
         traceback.print_exc()
         
+        if isinstance(e, StageTimeout):
+            return jsonify({
+                "success": False,
+                "error": f"Backend did not respond in time: {str(e)}"
+            }), 504
+
         # Check if it's an authentication/authorization error
         error_msg = str(e).lower()
         if 'signed in' in error_msg or 'authorized' in error_msg or 'authentication' in error_msg:
@@ -313,5 +700,84 @@ def recommend():
             "error": f"Internal Server Error: {str(e)}"
         }), 500
 
+@app.route('/recommend/batch', methods=['POST'])
+@require_service_token
+def recommend_batch():
+    """
+    Recommendations for many users in one pass, streamed back as NDJSON
+
+    Internal services only (X-Service-Token): the booking histories come from
+    the interaction store, which was loaded with the service token.
+    Expects {"user_ids": [...], "auth_token": "..."}. The catalog is fetched
+    once and every user is scored from the interaction store in blocks, so
+    booking histories come from the store rather than per-user queries.
+    Each output line is {"user_id", "recommendations", "cf_recommendations",
+    "cbf_recommendations"}.
+    """
+    content_type = request.headers.get('Content-Type')
+    if content_type not in ['application/json', 'application/json; charset=utf-8']:
+        return jsonify({
+            "success": False,
+            "error": f"Unsupported Media Type: {content_type}. Content-Type must be application/json."
+        }), 415
+
+    data = request.get_json(silent=True) or {}
+    user_ids = data.get('user_ids')
+    auth_token = data.get('auth_token')
+
+    if not isinstance(user_ids, list) or not user_ids or not auth_token:
+        return jsonify({
+            'success': False,
+            'error': 'Missing user_ids list or auth_token'
+        }), 400
+    if len(user_ids) > BATCH_MAX_USERS:
+        return jsonify({
+            'success': False,
+            'error': f'At most {BATCH_MAX_USERS} user_ids per batch'
+        }), 400
+
+    client = graphql_client.for_token(auth_token)
+    try:
+        packages_result = client.execute(all_packages_query)
+    except Exception as e:
+        error_msg = str(e).lower()
+        if 'signed in' in error_msg or 'authorized' in error_msg or 'authentication' in error_msg:
+            return jsonify({
+                "success": False,
+                "error": "Authentication/Authorization error. Please check your auth token."
+            }), 401
+        return jsonify({"success": False, "error": f"Internal Server Error: {str(e)}"}), 500
+
+    all_packages = packages_result.get("getPackages", [])
+    store = get_interaction_store()
+    if store is None:
+        return jsonify({"success": False, "error": "Interaction store is not loaded"}), 503
+
+    store.add_packages(pkg['id'] for pkg in all_packages)
+    package_map = {pkg["id"]: pkg for pkg in all_packages}
+
+    # Each user's booked packages, one entry per booking as in their history
+    users_packages = users_booked_packages(store, user_ids, package_map)
+    trending_popularity.set_packages(all_packages)
+    with store.lock:
+        popular_ids = fallback_package_ids(store, trending_popularity, k=store.num_packages)
+    print(f"Batch recommendations for {len(user_ids)} users")
+
+    def generate():
+        for uid, recommendations, cf_count, cbf_count in hybrid_recommendations_batch(
+                user_ids, users_packages, store, all_packages, popular_ids,
+                item_index=item_index, factor_model=factor_model, text_index=catalog_text_index):
+            yield json.dumps({
+                "user_id": uid,
+                "recommendations": [package_map[pkg_id] for pkg_id in recommendations[:6]
+                                    if pkg_id in package_map],
+                "cf_recommendations": cf_count,
+                "cbf_recommendations": cbf_count
+            }) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 if __name__ == '__main__':
+    # Start loading the interaction store in the background; requests reuse it
+    get_interaction_store()
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""
+Recall@10 and latency of the IVF index against exact inner product search
+
+Item vectors are drawn around latent clusters, like ALS item factors; queries
+are user-like vectors. The last --insert-fraction of items is added with
+incremental inserts after training, to check that recall holds without
+retraining.
+
+Usage: python benchmarks/bench_ann.py [--items 10000 100000] [--nprobe 1 4 8 16 32]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from model.ann import IVFIndex
+
+def clustered_vectors(num_items, factors, clusters, rng):
+    centres = rng.standard_normal((clusters, factors)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=num_items)
+    return centres[labels] + 0.5 * rng.standard_normal((num_items, factors)).astype(np.float32)
+
+def exact_top_k(vectors, query, k):
+    scores = vectors @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--items', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--factors', type=int, default=32)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--insert-fraction', type=float, default=0.1)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    rng = np.random.default_rng(7)
+
+    for num_items in args.items:
+        vectors = clustered_vectors(num_items, args.factors, max(10, num_items // 200), rng)
+        queries = clustered_vectors(args.queries, args.factors, 50, rng)
+        split = int(num_items * (1 - args.insert_fraction))
+
+        start = time.perf_counter()
+        index = IVFIndex().train(vectors[:split])
+        train_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        index.add(vectors[split:])
+        insert_us = (time.perf_counter() - start) * 1e6 / max(1, num_items - split)
+
+        start = time.perf_counter()
+        truth = [exact_top_k(vectors, query, 10) for query in queries]
+        exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        print(f"\n{num_items} items, {index.nlist} lists: train {train_ms:.0f} ms, "
+              f"insert {insert_us:.1f} us/item, exact search {exact_ms:.3f} ms/query")
+        print(f"{'nprobe':>7} {'recall@10':>10} {'ms/query':>9} {'speedup':>8}")
+
+        for nprobe in args.nprobe:
+            start = time.perf_counter()
+            found = [index.search(query, 10, nprobe=nprobe)[0] for query in queries]
+            ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+            recall = np.mean([len(np.intersect1d(f, t)) / 10 for f, t in zip(found, truth)])
+            print(f"{nprobe:>7} {recall:>10.3f} {ann_ms:>9.3f} {exact_ms / ann_ms:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Per-request interaction building: legacy scans vs indexed dicts vs compact container
+
+Rebuilds every user's interactions from a package -> users map, as
+/recommend's build_booking_maps used to on every request, with the
+original loop (a catalog scan per package and a history scan per
+booking), with ID-indexed dicts and per-user sets, and by interning the
+pairs into CompactInteractions. Production no longer rebuilds anything
+per request: CompactInteractions replaced the indexed reconstruction,
+and /recommend now reads only the interaction store, so this benchmark
+records the historical comparison. The two booking-dict builders must produce
+the same bookings and the container the same pairs; the time per
+interaction shows which ones stay linear as the catalog and user base
+grow. The legacy loop is skipped above --legacy-max-packages.
+
+Usage: python benchmarks/bench_booking_maps.py [--packages 1000 2500 5000 10000] [--users-per-package 10]
+"""
+import argparse
+import gc
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from model.interactions import CompactInteractions
+from synthetic import matrix_to_package_lists, synthetic_matrix
+
+def legacy_reconstruct(package_user_matrix, all_packages, all_users_bookings):
+    """The original step-6 loop from build_booking_maps"""
+    for package_id, user_ids in package_user_matrix.items():
+        package_obj = next((pkg for pkg in all_packages if pkg['id'] == package_id), None)
+
+        if not package_obj:
+            continue
+
+        for uid in user_ids:
+            if uid not in all_users_bookings:
+                all_users_bookings[uid] = []
+
+            existing_booking = any(
+                booking.get('package', {}).get('id') == package_id
+                for booking in all_users_bookings[uid]
+            )
+
+            if not existing_booking:
+                all_users_bookings[uid].append({
+                    'id': f"mock_{uid}_{package_id}",
+                    'package': package_obj,
+                    'user': {'id': uid},
+                    'status': 'completed'
+                })
+    return all_users_bookings
+
+def indexed_reconstruct(package_user_matrix, all_packages, all_users_bookings):
+    """The loop with an id -> package dict and per-user sets of booked package IDs"""
+    package_map = {pkg['id']: pkg for pkg in all_packages}
+    user_booked_ids = {
+        uid: {(booking.get('package') or {}).get('id') for booking in bookings}
+        for uid, bookings in all_users_bookings.items()
+    }
+
+    for package_id, user_ids in package_user_matrix.items():
+        package_obj = package_map.get(package_id)
+        if not package_obj:
+            continue
+
+        for uid in user_ids:
+            booked_ids = user_booked_ids.get(uid)
+            if booked_ids is None:
+                booked_ids = user_booked_ids[uid] = set()
+                all_users_bookings[uid] = []
+
+            if package_id not in booked_ids:
+                booked_ids.add(package_id)
+                all_users_bookings[uid].append({
+                    'id': f"mock_{uid}_{package_id}",
+                    'package': package_obj,
+                    'user': {'id': uid},
+                    'status': 'completed'
+                })
+    return all_users_bookings
+
+def compact_interactions(package_user_matrix, all_packages, all_users_bookings):
+    """Intern the same pairs into int32-indexed CSR, as CompactInteractions.from_pairs callers do"""
+    pairs = [(uid, booking['package']['id']) for uid, bookings in all_users_bookings.items()
+             for booking in bookings]
+    pairs.extend((uid, package_id) for package_id, user_ids in package_user_matrix.items() for uid in user_ids)
+    return CompactInteractions.from_pairs(pairs, user_ids=all_users_bookings,
+                                          package_ids=[pkg['id'] for pkg in all_packages])
+
+def booking_pairs(all_users_bookings):
+    return {(uid, booking['package']['id']) for uid, bookings in all_users_bookings.items() for booking in bookings}
+
+def compact_pairs(interactions):
+    coo = interactions.matrix.tocoo()
+    return {(interactions.user_ids[row], interactions.package_ids[col]) for row, col in zip(coo.row, coo.col)}
+
+def timed(func, package_user_matrix, all_packages, current_user, current_bookings):
+    all_users_bookings = {current_user: list(current_bookings)}
+    # As timeit does: cyclic GC passes over the growing heap would hide the loop's own cost
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        result = func(package_user_matrix, all_packages, all_users_bookings)
+        return time.perf_counter() - start, result
+    finally:
+        gc.enable()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--packages', type=int, nargs='+', default=[1000, 2500, 5000, 10_000])
+    parser.add_argument('--users-per-package', type=int, default=10)
+    parser.add_argument('--bookings-per-user', type=int, default=5)
+    parser.add_argument('--legacy-max-packages', type=int, default=10_000)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    print(f"{'packages':>9} {'users':>8} {'pairs':>9} {'legacy us/pair':>15} {'indexed us/pair':>16} "
+          f"{'compact us/pair':>16}")
+
+    for num_packages in args.packages:
+        num_users = num_packages * args.users_per_package
+        matrix, user_ids, package_ids = synthetic_matrix(num_users, num_packages, args.bookings_per_user)
+        package_user_matrix = matrix_to_package_lists(matrix, user_ids, package_ids)
+        all_packages = [{'id': pid, 'title': f"Package {pid}"} for pid in package_ids]
+        pairs = matrix.nnz
+
+        # The requesting user's real bookings are already in the map
+        current_user = user_ids[0]
+        current_bookings = [{'id': f"booking_{col}", 'package': all_packages[col]}
+                            for col in matrix.indices[matrix.indptr[0]:matrix.indptr[1]]]
+
+        indexed_s, indexed = timed(indexed_reconstruct, package_user_matrix, all_packages,
+                                   current_user, current_bookings)
+        compact_s, compact = timed(compact_interactions, package_user_matrix, all_packages,
+                                   current_user, current_bookings)
+        if compact_pairs(compact) != booking_pairs(indexed):
+            raise SystemExit(f"Compact interactions differ at {num_packages} packages")
+
+        legacy_col = f"{'-':>15}"
+        if num_packages <= args.legacy_max_packages:
+            legacy_s, legacy = timed(legacy_reconstruct, package_user_matrix, all_packages,
+                                     current_user, current_bookings)
+            if legacy != indexed:
+                raise SystemExit(f"Mismatch at {num_packages} packages")
+            legacy_col = f"{legacy_s * 1e6 / pairs:>15.2f}"
+
+        print(f"{num_packages:>9} {num_users:>8} {pairs:>9} {legacy_col} "
+              f"{indexed_s * 1e6 / pairs:>16.2f} {compact_s * 1e6 / pairs:>16.2f}")
+
+if __name__ == '__main__':
+    main()
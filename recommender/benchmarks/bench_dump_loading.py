@@ -0,0 +1,129 @@
+"""
+Load time and peak memory of json.load vs streaming vs columnar mmap loading of a booking dump
+
+A synthetic dump shaped like enhanced_cf_data.json (pretty-printed, one
+embedded user and package per booking) is written once per size. The
+json.load baseline parses the whole file into dicts before building the
+interaction matrix, as precompute.py used to; streaming decodes one
+booking at a time into typed columns; mmap opens the columnar copy
+written by BookingColumns.save(). Time is measured in a plain run, peak
+memory in a second run under tracemalloc.
+
+Usage: python benchmarks/bench_dump_loading.py [--bookings 10000 100000] [--packages 2000]
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from model.dump import BookingColumns, iter_bookings
+from model.interactions import CompactInteractions
+
+def write_dump(path, num_bookings, num_packages, seed=42):
+    """Pretty-printed JSON array of bookings with Zipf-like package popularity"""
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, num_packages + 1) ** 0.8
+    popularity /= popularity.sum()
+    users = rng.integers(0, max(1, num_bookings // 20), size=num_bookings)
+    packages = rng.choice(num_packages, size=num_bookings, p=popularity)
+    days = rng.integers(0, 365, size=num_bookings)
+
+    with open(path, 'w') as f:
+        f.write('[\n')
+        for i in range(num_bookings):
+            booking = {
+                'id': f"booking_{i}",
+                'user': {'id': f"user_{users[i]}", 'username': f"user{users[i]}"},
+                'package': {
+                    'id': f"pkg_{packages[i]}",
+                    'title': f"Package {packages[i]}",
+                    'description': f"A {packages[i] % 7 + 2} day trip with guided tours and local food",
+                    'price': float(100 + packages[i] % 900),
+                    'duration': f"{packages[i] % 7 + 2} days",
+                    'destination': f"Destination {packages[i] % 50}",
+                    'availability': int(packages[i] % 30),
+                },
+                'rating': int(days[i] % 5 + 1),
+                'review': "Great trip",
+                'date': str(np.datetime64('2024-01-01') + int(days[i])),
+                'status': "COMPLETED",
+            }
+            f.write(json.dumps(booking, indent=2))
+            f.write(',\n' if i < num_bookings - 1 else '\n')
+        f.write(']\n')
+
+def load_json(path):
+    """Whole-file json.load, then interning (the previous precompute.py path)"""
+    with open(path) as f:
+        bookings = json.load(f)
+    interactions, packages = [], {}
+    for booking in bookings:
+        if booking.get('user') and booking.get('package'):
+            interactions.append({'userId': booking['user']['id'], 'packageId': booking['package']['id'],
+                                 'status': booking.get('status')})
+            packages[booking['package']['id']] = booking['package']
+    return CompactInteractions.from_interactions(interactions, list(packages)), list(packages.values())
+
+def load_streaming(path):
+    columns = BookingColumns.from_bookings(iter_bookings(path))
+    return columns.interactions(), columns.packages
+
+def load_columnar(directory):
+    columns = BookingColumns.load(directory)
+    return columns.interactions(), columns.packages
+
+def measure(load, path):
+    """(peak bytes, seconds, interactions) of one load"""
+    gc.collect()
+    start = time.perf_counter()
+    interactions, _ = load(path)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    load(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed, interactions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--bookings', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--packages', type=int, default=2000)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    workdir = tempfile.mkdtemp(prefix='bench-dump-')
+    try:
+        print(f"{'bookings':>9} {'file MB':>8} {'loader':>10} {'seconds':>8} {'peak MB':>8} {'speedup':>8}")
+        for num_bookings in args.bookings:
+            path = os.path.join(workdir, f"dump_{num_bookings}.json")
+            write_dump(path, num_bookings, args.packages)
+            columnar = os.path.join(workdir, f"columns_{num_bookings}")
+            BookingColumns.from_bookings(iter_bookings(path)).save(columnar)
+            size_mb = os.path.getsize(path) / 1e6
+
+            baseline_s, reference = None, None
+            for name, load, source in (("json.load", load_json, path), ("streaming", load_streaming, path),
+                                       ("mmap", load_columnar, columnar)):
+                peak, elapsed, interactions = measure(load, source)
+                if reference is None:
+                    baseline_s, reference = elapsed, interactions
+                elif (interactions.counts != reference.counts).nnz:
+                    raise AssertionError(f"{name} interactions differ from json.load")
+                print(f"{num_bookings:>9} {size_mb:>8.1f} {name:>10} {elapsed:>8.3f} {peak / 1e6:>8.1f} "
+                      f"{baseline_s / elapsed:>7.1f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
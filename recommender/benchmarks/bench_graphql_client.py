@@ -0,0 +1,72 @@
+"""
+Requests/sec of the recommender's GraphQL fetch stage, before and after pooling
+
+Before: a new RequestsHTTPTransport + Client with schema introspection per
+request, three sequential queries. After: the shared PooledGraphQLClient,
+sequential and with the concurrent async transport.
+
+Usage: python benchmarks/bench_graphql_client.py [--requests 200] [--latency-ms 5]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from gql import Client
+from gql.transport.requests import RequestsHTTPTransport
+from graphql_client import PooledGraphQLClient
+from stub_graphql_server import start_stub_server
+import app
+
+USER_ID = "user_3"
+QUERIES = [
+    (app.all_users_query, None),
+    (app.all_packages_query, None),
+    (app.user_booking_query, {"userId": USER_ID}),
+]
+
+def fetch_per_request_client(url):
+    transport = RequestsHTTPTransport(
+        url=url,
+        headers={"Authorization": "Bearer token", "Content-Type": "application/json"},
+        verify=True,
+        retries=3,
+    )
+    client = Client(transport=transport, fetch_schema_from_transport=True)
+    return [client.execute(document, variable_values=variables) for document, variables in QUERIES]
+
+def run(label, fetch, requests):
+    fetch()  # warm-up
+    start = time.perf_counter()
+    for _ in range(requests):
+        fetch()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {requests / elapsed:8.1f} req/s  ({elapsed * 1000 / requests:.2f} ms/request)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=5.0,
+                        help='artificial server latency per GraphQL call')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    server, url = start_stub_server(latency_ms=args.latency_ms)
+    print(f"Stub GraphQL server at {url}, {args.latency_ms} ms latency, {args.requests} requests\n")
+
+    pooled_sync = PooledGraphQLClient(url=url, use_async=False)
+    pooled_async = PooledGraphQLClient(url=url, use_async=True)
+
+    run("per-request Client (before)", lambda: fetch_per_request_client(url), args.requests)
+    run("pooled client, sequential", lambda: pooled_sync.execute_many(QUERIES, "token"), args.requests)
+    run("pooled client, async fan-out", lambda: pooled_async.execute_many(QUERIES, "token"), args.requests)
+
+    pooled_sync.close()
+    pooled_async.close()
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Memory of the per-request booking maps vs CompactInteractions, measured with tracemalloc
+
+The legacy representation is what the /recommend fallback used to build:
+a package -> users dict of lists plus, per user, a list of booking dicts
+(fabricated "mock_..." ids) referencing the catalog package objects. The
+compact one interns user and package IDs to int32 indices and keeps the
+booking counts as CSR. Both are built from the same interaction stream:
+enhanced_cf_data.json and synthetic streams at the given sizes.
+
+Usage: python benchmarks/bench_interaction_memory.py [--users 10000 100000] [--packages 10000]
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from model.interactions import CompactInteractions
+from synthetic import synthetic_matrix
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'enhanced_cf_data.json')
+
+def legacy_booking_maps(interactions, all_packages):
+    """package_user_matrix and mock-booking all_users_bookings, as built per request before"""
+    package_user_matrix = {package['id']: [] for package in all_packages}
+    seen_interactions = set()
+    for interaction in interactions:
+        package_id, uid = interaction['packageId'], interaction['userId']
+        if package_id not in package_user_matrix or (package_id, uid) in seen_interactions:
+            continue
+        seen_interactions.add((package_id, uid))
+        package_user_matrix[package_id].append(uid)
+
+    package_map = {pkg['id']: pkg for pkg in all_packages}
+    all_users_bookings = {}
+    for package_id, user_ids in package_user_matrix.items():
+        for uid in user_ids:
+            all_users_bookings.setdefault(uid, []).append({
+                'id': f"mock_{uid}_{package_id}",
+                'package': package_map[package_id],
+                'user': {'id': uid},
+                'status': 'completed'
+            })
+    return all_users_bookings, package_user_matrix
+
+def compact_interactions(interactions, all_packages):
+    catalog_ids = [package['id'] for package in all_packages]
+    catalog = set(catalog_ids)
+    return CompactInteractions.from_pairs(
+        ((i['userId'], i['packageId']) for i in interactions if i['packageId'] in catalog),
+        package_ids=catalog_ids
+    )
+
+def measure(build, *args):
+    """(retained bytes, peak bytes, seconds) of building a structure"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(*args)
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained, peak, elapsed
+
+def load_dataset():
+    with open(DATA_PATH) as f:
+        bookings = json.load(f)
+    interactions, packages = [], {}
+    for booking in bookings:
+        if booking.get('user') and booking.get('package'):
+            interactions.append({'userId': booking['user']['id'], 'packageId': booking['package']['id']})
+            packages[booking['package']['id']] = booking['package']
+    return interactions, list(packages.values())
+
+def synthetic_dataset(num_users, num_packages):
+    matrix, user_ids, package_ids = synthetic_matrix(num_users, num_packages)
+    interactions = [{'userId': user_ids[row], 'packageId': package_ids[col]}
+                    for row in range(matrix.shape[0])
+                    for col in matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]]
+    packages = [{'id': pid, 'title': f"Package {pid}", 'description': "", 'price': 100.0} for pid in package_ids]
+    return interactions, packages
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--users', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--packages', type=int, default=10_000)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    datasets = [("enhanced_cf_data.json", load_dataset)]
+    datasets.extend((f"synthetic {users} x {args.packages}", lambda users=users: synthetic_dataset(users, args.packages))
+                    for users in args.users)
+
+    print(f"{'dataset':>28} {'interactions':>13} {'legacy MB':>10} {'compact MB':>11} {'reduction':>10} "
+          f"{'legacy s':>9} {'compact s':>10}")
+    for name, load in datasets:
+        interactions, packages = load()
+        legacy_bytes, _, legacy_s = measure(legacy_booking_maps, interactions, packages)
+        compact_bytes, _, compact_s = measure(compact_interactions, interactions, packages)
+        print(f"{name:>28} {len(interactions):>13} {legacy_bytes / 1e6:>10.2f} {compact_bytes / 1e6:>11.2f} "
+              f"{legacy_bytes / compact_bytes:>9.1f}x {legacy_s:>9.2f} {compact_s:>10.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Offline accuracy and speed of every recommender model on a time-based train/test split
+
+Replays enhanced_cf_data.json (scale 1) and synthetic datasets of the same
+shape at larger scales (users and packages multiplied, ~20 bookings per
+user, one preferred destination per user). The latest --test-fraction of
+bookings is held out; for every model the report gives precision@k,
+recall@k, NDCG@k and catalog coverage over the users with held-out
+packages, plus fit time, per-user latency percentiles, throughput and
+peak traced memory. Slow models stop scoring after --budget seconds per
+dataset; the users column shows how many were scored.
+
+Usage: python benchmarks/bench_models.py [--scales 1 10 100 1000] [--k 10] [--eval-users 200] [--models user_cf cbf]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.evaluation import MODELS, EvaluationData, evaluate_model
+from benchmarks.synthetic import synthetic_bookings
+from model.dump import BookingColumns
+from model.weighting import ConfidenceWeights
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'enhanced_cf_data.json')
+
+def load_dataset(scale, base):
+    if scale == 1:
+        return "enhanced_cf_data.json", base
+    users = len(base.user_ids) * scale
+    packages = len(base.package_ids) * scale
+    bookings_per_user = max(1, round(len(base) / len(base.user_ids)))
+    return (f"synthetic {scale}x", synthetic_bookings(users, packages, bookings_per_user=bookings_per_user))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--test-fraction', type=float, default=0.2)
+    parser.add_argument('--eval-users', type=int, default=200,
+                        help="Users sampled per dataset for scoring (all if fewer)")
+    parser.add_argument('--memory-users', type=int, default=20)
+    parser.add_argument('--budget', type=float, default=20.0,
+                        help="Scoring seconds per model and dataset before stopping early")
+    parser.add_argument('--weighted', action='store_true',
+                        help="Also evaluate with rating/status/recency confidence weights")
+    parser.add_argument('--models', nargs='+', choices=[name for name, _, _ in MODELS],
+                        default=[name for name, _, _ in MODELS])
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    base = BookingColumns.from_file(DATA_PATH)
+
+    for scale in args.scales:
+        start = time.perf_counter()
+        name, columns = load_dataset(scale, base)
+        variants = [("", EvaluationData(columns, args.test_fraction))]
+        if args.weighted:
+            variants.append((" (weighted)", EvaluationData(columns, args.test_fraction, ConfidenceWeights())))
+        data = variants[0][1]
+        users = data.users
+        if len(users) > args.eval_users:
+            users = sorted(random.Random(42).sample(users, args.eval_users))
+        print(f"\n{name}: {len(columns.user_ids)} users, {len(columns.package_ids)} packages, "
+              f"{data.num_bookings} bookings; {len(data.users)} users with held-out packages, "
+              f"{len(users)} evaluated (prepared in {time.perf_counter() - start:.1f} s)")
+
+        print(f"{'model':>29} {'users':>6} {'P@' + str(args.k):>7} {'R@' + str(args.k):>7} {'NDCG':>7} "
+              f"{'cover':>7} {'fit s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'users/s':>9} {'peak MB':>8}")
+        for model_name, fit, recommend in MODELS:
+            if model_name not in args.models:
+                continue
+            for suffix, data in variants:
+                result = evaluate_model(data, fit, recommend, k=args.k, users=users,
+                                        memory_users=args.memory_users, budget_s=args.budget)
+                print(f"{model_name + suffix:>29} {result['users']:>6} {result['precision']:>7.3f} "
+                      f"{result['recall']:>7.3f} {result['ndcg']:>7.3f} {result['coverage']:>7.3f} "
+                      f"{result['fit_s']:>7.2f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+                      f"{result['p99_ms']:>8.2f} {result['users_per_s']:>9.0f} {result['peak_mb']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
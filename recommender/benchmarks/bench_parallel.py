@@ -0,0 +1,87 @@
+"""
+Throughput of sharded batch recommendations from 1 to N worker processes
+
+Fits the item index, factor model and catalog text index once, then scores
+every user in-process and with ShardedRecommender at each worker count.
+Workers map the fitted arrays from shared .npy files; the report compares
+that shared size with what pickling the models to every worker would cost.
+
+Usage: python benchmarks/bench_parallel.py [--users 50000] [--packages 500] [--workers 1 2 4]
+"""
+import argparse
+import logging
+import os
+import pickle
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.synthetic import synthetic_catalog, synthetic_matrix
+from model.factorization import FactorModel
+from model.interactions import InteractionStore
+from model.item_index import ItemNeighbourIndex
+from model.parallel import ShardedRecommender
+from model.text_index import CatalogTextIndex
+
+def build_store(num_users, num_packages):
+    matrix, user_ids, package_ids = synthetic_matrix(num_users, num_packages)
+    interactions = [{'userId': user_ids[row], 'packageId': package_ids[col]}
+                    for row in range(matrix.shape[0])
+                    for col in matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]]
+    return InteractionStore.from_interactions(interactions, package_ids), synthetic_catalog(package_ids)
+
+def default_workers():
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--users', type=int, default=50_000)
+    parser.add_argument('--packages', type=int, default=500)
+    parser.add_argument('--workers', type=int, nargs='+', default=default_workers())
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    store, catalog = build_store(args.users, args.packages)
+    user_ids = list(store.user_ids)
+
+    start = time.perf_counter()
+    item_index = ItemNeighbourIndex()
+    item_index.build(store.matrix, store.version)
+    factor_model = FactorModel().fit(store.matrix, list(store.package_ids), version=store.version)
+    text_index = CatalogTextIndex().fit(catalog)
+    print(f"{args.users} users x {args.packages} packages, models fitted in "
+          f"{time.perf_counter() - start:.1f} s, {os.cpu_count()} CPU(s)")
+
+    pickled = len(pickle.dumps((store.counts, store.matrix, item_index.neighbours, item_index.scores,
+                                factor_model.item_factors, text_index.snapshot.matrix,
+                                text_index.snapshot.features)))
+
+    baseline = None
+    print(f"{'mode':>12} {'workers':>8} {'seconds':>9} {'users/s':>10} {'speedup':>8}")
+    for workers in sorted(set([1] + args.workers)):
+        # One worker runs in-process, more shard chunks across a pool
+        with ShardedRecommender(store, catalog, item_index=item_index, factor_model=factor_model,
+                                text_index=text_index, workers=workers,
+                                chunk_size=args.chunk_size) as recommender:
+            shared = recommender.shared_bytes
+            start = time.perf_counter()
+            count = sum(1 for _ in recommender.recommend(user_ids))
+            elapsed = time.perf_counter() - start
+
+        baseline = baseline or elapsed
+        mode = 'in-process' if workers == 1 else 'shared-mmap'
+        print(f"{mode:>12} {workers:>8} {elapsed:>9.2f} {count / elapsed:>10.0f} {baseline / elapsed:>7.2f}x")
+
+    print(f"shared arrays: {shared / 1e6:.1f} MB mapped once; pickling them to N workers: "
+          f"N x {pickled / 1e6:.1f} MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Vectorized vs legacy user-based collaborative filtering
+
+Checks that the sparse engine returns the same top-10 packages and scores
+as the original per-user Jaccard loop, and times both at 10k, 100k and 1M
+users. The legacy loop is skipped above --legacy-max-users.
+
+Usage: python benchmarks/bench_user_cf.py [--sizes 10000 100000 1000000] [--targets 20]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from model.cf import top_k_indices, user_similarity_scores
+from synthetic import matrix_to_user_sets, synthetic_matrix
+
+def legacy_user_based(user_id, user_package_ids, user_package_matrix):
+    """The original set-based Jaccard loop, returning (package_id, score) pairs"""
+    target_user_packages = user_package_matrix.get(user_id, set())
+    user_similarities = {}
+
+    for other_user_id, other_user_packages in user_package_matrix.items():
+        if other_user_id == user_id or not other_user_packages:
+            continue
+        intersection = len(target_user_packages & other_user_packages)
+        union = len(target_user_packages | other_user_packages)
+        if union > 0:
+            similarity = intersection / union
+            if similarity > 0.05:
+                user_similarities[other_user_id] = similarity
+
+    package_scores = defaultdict(float)
+    for other_user_id, similarity in user_similarities.items():
+        for pkg_id in user_package_matrix[other_user_id]:
+            if pkg_id not in user_package_ids:
+                package_scores[pkg_id] += similarity
+
+    return sorted(package_scores.items(), key=lambda x: x[1], reverse=True)[:10]
+
+def vectorized_user_based(matrix, row, user_package_ids, package_index, package_ids):
+    scores = user_similarity_scores(matrix, row, user_package_ids, package_index)
+    return [(package_ids[idx], float(scores[idx])) for idx in top_k_indices(scores, 10)]
+
+def same_ranking(legacy, vectorized):
+    """Equal scores position by position, and equal ids above the last tied score"""
+    legacy_scores = np.round([score for _, score in legacy], 10)
+    vector_scores = np.round([score for _, score in vectorized], 10)
+    if not np.array_equal(legacy_scores, vector_scores):
+        return False
+    cutoff = legacy_scores[-1] if len(legacy_scores) else 0
+    return ({pid for pid, score in legacy if round(score, 10) > cutoff} ==
+            {pid for pid, score in vectorized if round(score, 10) > cutoff})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--packages', type=int, default=500)
+    parser.add_argument('--targets', type=int, default=20)
+    parser.add_argument('--legacy-max-users', type=int, default=100_000)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    print(f"{'users':>9} {'nnz':>10} {'legacy ms':>10} {'vector ms':>10} {'speedup':>8}  match")
+
+    for num_users in args.sizes:
+        matrix, user_ids, package_ids = synthetic_matrix(num_users, args.packages)
+        package_index = {pid: idx for idx, pid in enumerate(package_ids)}
+        targets = np.random.default_rng(0).choice(num_users, size=args.targets, replace=False)
+
+        run_legacy = num_users <= args.legacy_max_users
+        user_sets = matrix_to_user_sets(matrix, user_ids, package_ids) if run_legacy else None
+
+        legacy_time = vector_time = 0.0
+        matches = 0
+        for row in targets:
+            user_id = user_ids[row]
+            user_package_ids = {package_ids[col] for col in matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]}
+
+            start = time.perf_counter()
+            vectorized = vectorized_user_based(matrix, row, user_package_ids, package_index, package_ids)
+            vector_time += time.perf_counter() - start
+
+            if run_legacy:
+                start = time.perf_counter()
+                legacy = legacy_user_based(user_id, user_package_ids, user_sets)
+                legacy_time += time.perf_counter() - start
+                matches += same_ranking(legacy, vectorized)
+
+        vector_ms = vector_time * 1000 / len(targets)
+        if run_legacy:
+            legacy_ms = legacy_time * 1000 / len(targets)
+            print(f"{num_users:>9} {matrix.nnz:>10} {legacy_ms:>10.2f} {vector_ms:>10.2f} "
+                  f"{legacy_ms / vector_ms:>7.1f}x  {matches}/{len(targets)}")
+        else:
+            print(f"{num_users:>9} {matrix.nnz:>10} {'-':>10} {vector_ms:>10.2f} {'-':>8}  -")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""
+Offline evaluation of the recommender models on a time-based split
+
+Bookings before a date cutoff form the training interactions; each user's
+packages first booked after it are the held-out set the models should
+recommend. Used by bench_models.py.
+"""
+import gc
+import math
+import time
+import tracemalloc
+import numpy as np
+from scipy.sparse import csr_matrix
+import model.popularity as legacy_popularity
+from model.cbf import content_based_filtering
+from model.cf import (booked_package_weights, fallback_package_ids, item_based_collaborative_filtering,
+                      matrix_factorization_cf, popularity_based_recommendations, user_based_collaborative_filtering)
+from model.dump import NO_DATE
+from model.factorization import FactorModel
+from model.interactions import CompactInteractions, pair_weights
+from model.item_index import ItemNeighbourIndex
+from model.text_index import CatalogTextIndex
+from model.trending import TrendingPopularity
+
+class EvaluationData:
+    """
+    Train interactions and held-out packages of a time-based split
+
+    Parameters:
+    - columns: BookingColumns with booking dates
+    - test_fraction: Share of the dated bookings, latest first, held out
+    - weighting: Optional ConfidenceWeights for the train matrix values,
+      aged from the newest train booking
+    """
+
+    def __init__(self, columns, test_fraction=0.2, weighting=None):
+        dates = np.asarray(columns.dates)
+        rows, cols = np.asarray(columns.rows), np.asarray(columns.cols)
+        dated = dates != NO_DATE
+        self.cutoff = int(np.quantile(dates[dated], 1 - test_fraction)) if dated.any() else NO_DATE
+        train = ~dated | (dates < self.cutoff)
+
+        shape = (len(columns.user_ids), len(columns.package_ids))
+        counts = csr_matrix((np.ones(int(train.sum()), dtype=np.float32), (rows[train], cols[train])), shape=shape)
+        counts.sum_duplicates()
+        matrix = None
+        if weighting is not None:
+            statuses = np.asarray(list(columns.status_names), dtype=object)[np.asarray(columns.statuses)[train]]
+            weights = weighting.weights(np.asarray(columns.ratings)[train], statuses, dates[train])
+            matrix = csr_matrix((pair_weights(counts, rows[train], cols[train], weights), counts.indices,
+                                 counts.indptr), shape=shape)
+        self.train = CompactInteractions(counts, columns.user_ids, columns.package_ids, matrix=matrix)
+        self.train_rows, self.train_cols, self.train_dates = rows[train], cols[train], dates[train]
+        self.num_bookings = len(rows)
+
+        self.catalog = list(columns.packages)
+        self.package_map = {pkg['id']: pkg for pkg in self.catalog}
+        package_ids = columns.package_ids
+
+        # Held out: packages a user first books after the cutoff
+        held_out = {}
+        test = ~train
+        for row, col in zip(rows[test].tolist(), cols[test].tolist()):
+            held_out.setdefault(row, set()).add(col)
+
+        self.users = []
+        self.booked, self.relevant, self.package_weights = {}, {}, {}
+        indptr, indices = counts.indptr, counts.indices
+        for row in sorted(held_out):
+            booked_cols = indices[indptr[row]:indptr[row + 1]]
+            new_cols = held_out[row].difference(booked_cols.tolist())
+            if len(booked_cols) and new_cols:
+                uid = columns.user_ids[row]
+                self.users.append(uid)
+                self.booked[uid] = {package_ids[col] for col in booked_cols}
+                self.relevant[uid] = {package_ids[col] for col in new_cols}
+                self.package_weights[uid] = booked_package_weights(self.train, uid, self.booked[uid])
+
+def fit_item_index(data):
+    item_index = ItemNeighbourIndex()
+    item_index.build(data.train.matrix, data.train.version)
+    return item_index
+
+def fit_factor_model(method):
+    def fit(data):
+        return FactorModel(method=method).fit(data.train.matrix, data.train.package_ids,
+                                              version=data.train.version)
+    return fit
+
+def fit_text_index(data):
+    return CatalogTextIndex().fit(data.catalog)
+
+def fit_trending(half_life_days):
+    def fit(data):
+        popularity = TrendingPopularity(half_life_days=half_life_days)
+        package_ids = data.train.package_ids
+        # Undated bookings count as made at the cutoff
+        dates = np.where(data.train_dates == NO_DATE, data.cutoff, data.train_dates)
+        for col, date in zip(data.train_cols.tolist(), dates.tolist()):
+            popularity.add_booking(package_ids[col], date)
+        return popularity
+    return fit
+
+def legacy_bookings(data):
+    """Train bookings as the booking dicts model/popularity.py scans"""
+    user_ids, package_ids = data.train.user_ids, data.train.package_ids
+    users = [{'id': uid} for uid in user_ids]
+    packages = [{'id': pid} for pid in package_ids]
+    return [{'user': users[row], 'package': packages[col]}
+            for row, col in zip(data.train_rows.tolist(), data.train_cols.tolist())]
+
+# (name, fit(data) -> state or None, recommend(data, state, user_id, k) -> package IDs)
+MODELS = [
+    ("user_cf", None,
+     lambda data, state, uid, k: user_based_collaborative_filtering(
+         uid, data.booked[uid], None, data.catalog, interactions=data.train)),
+    ("item_cf", fit_item_index,
+     lambda data, state, uid, k: item_based_collaborative_filtering(
+         uid, data.booked[uid], None, data.catalog, item_index=state, interactions=data.train,
+         package_weights=data.package_weights[uid])),
+    ("item_cf_exact", None,
+     lambda data, state, uid, k: item_based_collaborative_filtering(
+         uid, data.booked[uid], None, data.catalog, interactions=data.train,
+         package_weights=data.package_weights[uid])),
+    ("mf_als", fit_factor_model('als'),
+     lambda data, state, uid, k: matrix_factorization_cf(
+         uid, data.booked[uid], None, data.catalog, factor_model=state,
+         package_weights=data.package_weights[uid])),
+    ("mf_svd", fit_factor_model('svd'),
+     lambda data, state, uid, k: matrix_factorization_cf(
+         uid, data.booked[uid], None, data.catalog, factor_model=state,
+         package_weights=data.package_weights[uid])),
+    ("cbf", fit_text_index,
+     lambda data, state, uid, k: content_based_filtering(
+         [data.package_map[pid] for pid in data.booked[uid]], data.catalog, text_index=state)),
+    ("popularity", None,
+     lambda data, state, uid, k: popularity_based_recommendations(
+         None, data.booked[uid], data.catalog, interactions=data.train)),
+    ("trending_7d", fit_trending(7.0),
+     lambda data, state, uid, k: fallback_package_ids(data.train, state, k=k, exclude=data.booked[uid])),
+    ("trending_30d", fit_trending(30.0),
+     lambda data, state, uid, k: fallback_package_ids(data.train, state, k=k, exclude=data.booked[uid])),
+    ("popularity_legacy", legacy_bookings,
+     lambda data, state, uid, k: legacy_popularity.popularity_based_recommendations(
+         uid, state, max_recommendations=k)),
+]
+
+def ranking_metrics(recommended, relevant, k):
+    """
+    Precision@k, recall@k and NDCG@k of one ranked list
+
+    Parameters:
+    - recommended: Ranked package IDs
+    - relevant: Set of held-out package IDs
+
+    Returns:
+    - (precision, recall, ndcg)
+    """
+    top = recommended[:k]
+    gains = [1.0 if pid in relevant else 0.0 for pid in top]
+    hits = sum(gains)
+    dcg = sum(gain / math.log2(rank + 2) for rank, gain in enumerate(gains))
+    ideal = sum(1.0 / math.log2(rank + 2) for rank in range(min(len(relevant), k)))
+    return hits / k, hits / len(relevant), dcg / ideal if ideal else 0.0
+
+def evaluate_model(data, fit, recommend, k=10, users=None, memory_users=50, budget_s=None):
+    """
+    Quality and speed of one model over the evaluation users
+
+    Fitting and scoring are timed in a plain pass; peak memory is taken in
+    a second pass under tracemalloc that fits the model again and scores
+    the first memory_users users.
+
+    Parameters:
+    - budget_s: Stop scoring once this many seconds were spent (slow models
+      on large datasets); metrics cover the users scored so far
+
+    Returns:
+    - Dict with users (scored), precision, recall, ndcg, coverage, fit_s,
+      p50/p95/p99 latency in ms, users_per_s and peak_mb
+    """
+    users = data.users if users is None else users
+    gc.collect()
+    start = time.perf_counter()
+    state = fit(data) if fit else None
+    fit_s = time.perf_counter() - start
+
+    latencies = []
+    totals = np.zeros(3)
+    recommended_ids = set()
+    spent = 0.0
+    for uid in users:
+        start = time.perf_counter()
+        recommended = recommend(data, state, uid, k)
+        latencies.append(time.perf_counter() - start)
+        totals += ranking_metrics(recommended, data.relevant[uid], k)
+        recommended_ids.update(recommended[:k])
+        spent += latencies[-1]
+        if budget_s is not None and spent > budget_s:
+            break
+    del state
+    users = users[:len(latencies)]
+
+    gc.collect()
+    tracemalloc.start()
+    state = fit(data) if fit else None
+    for uid in users[:memory_users]:
+        recommend(data, state, uid, k)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del state
+
+    count = max(1, len(users))
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000 if latencies else (0.0, 0.0, 0.0)
+    return {
+        "users": len(users),
+        "precision": totals[0] / count,
+        "recall": totals[1] / count,
+        "ndcg": totals[2] / count,
+        "coverage": len(recommended_ids) / max(1, len(data.catalog)),
+        "fit_s": fit_s,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "users_per_s": len(users) / spent if spent else 0.0,
+        "peak_mb": peak / 1e6,
+    }
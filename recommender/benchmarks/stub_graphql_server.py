@@ -0,0 +1,145 @@
+"""
+Local stub of the backend GraphQL API for recommender benchmarks
+
+Serves the queries the recommender uses from a booking dump shaped like
+enhanced_cf_data.json, with an optional artificial per-request latency.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from graphql import build_schema, graphql_sync
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'enhanced_cf_data.json')
+
+SCHEMA = build_schema("""
+    type TravelPackage {
+        id: ID!
+        title: String!
+        description: String!
+        price: Float!
+        duration: String!
+        destination: String!
+        availability: Int
+    }
+
+    type User {
+        id: ID!
+        username: String!
+        email: String!
+    }
+
+    type UserWithBookingCount {
+        id: ID!
+        username: String!
+        email: String!
+        bookingCount: Int!
+    }
+
+    type Booking {
+        id: ID!
+        user: User!
+        package: TravelPackage!
+        date: String!
+        status: String!
+    }
+
+    type PackageInteraction {
+        id: ID!
+        userId: ID!
+        packageId: ID!
+        status: String!
+        date: String!
+    }
+
+    type Query {
+        getPackages: [TravelPackage!]
+        getUsersWithBookingCounts: [UserWithBookingCount!]
+        getBookingHistory(userId: ID!): [Booking!]
+        getPackageInteractions(after: ID, limit: Int): [PackageInteraction!]
+    }
+""")
+
+def load_root(path=DATA_PATH):
+    """Build the root resolvers from a booking dump"""
+    with open(path) as f:
+        bookings = json.load(f)
+
+    packages = {}
+    users = {}
+    for booking in bookings:
+        packages[booking['package']['id']] = booking['package']
+        user = users.setdefault(booking['user']['id'], {
+            'id': booking['user']['id'],
+            'username': booking['user'].get('username', ''),
+            'email': f"{booking['user']['id']}@example.com",
+            'bookingCount': 0,
+        })
+        user['bookingCount'] += 1
+        booking['user'] = user
+
+    interactions = [{
+        'id': booking['id'],
+        'userId': booking['user']['id'],
+        'packageId': booking['package']['id'],
+        'status': booking['status'],
+        'date': booking['date'],
+    } for booking in sorted(bookings, key=lambda b: b['id'])]
+
+    def get_package_interactions(info, after=None, limit=5000):
+        start = 0
+        if after:
+            start = next((i + 1 for i, row in enumerate(interactions) if row['id'] == after), len(interactions))
+        return interactions[start:start + limit]
+
+    return {
+        'getPackages': lambda info: list(packages.values()),
+        'getUsersWithBookingCounts': lambda info: list(users.values()),
+        'getBookingHistory': lambda info, userId: [b for b in bookings if b['user']['id'] == userId],
+        'getPackageInteractions': get_package_interactions,
+    }
+
+def start_stub_server(latency_ms=0.0, path=DATA_PATH):
+    """
+    Start the stub server on a free local port in a daemon thread
+
+    Returns:
+    - (server, url)
+    """
+    root = load_root(path)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            super().setup()
+            # Keep-alive responses are written in two parts; avoid Nagle stalls
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+
+            result = graphql_sync(SCHEMA, payload['query'], root_value=root,
+                                  variable_values=payload.get('variables'))
+            body = {'data': result.data}
+            if result.errors:
+                body['errors'] = [{'message': str(error)} for error in result.errors]
+
+            encoded = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(encoded)))
+            self.end_headers()
+            self.wfile.write(encoded)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api"
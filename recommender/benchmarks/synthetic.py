@@ -0,0 +1,102 @@
+"""
+Synthetic interaction data for recommender benchmarks
+
+Bookings follow a Zipf-like package popularity so that a few packages are
+booked by many users, as in the real catalog.
+"""
+import numpy as np
+from scipy.sparse import csr_matrix
+from model.dump import BookingColumns
+
+def synthetic_matrix(num_users, num_packages=500, bookings_per_user=5, seed=42):
+    """
+    Generate a binary user x package CSR matrix
+
+    Returns:
+    - (matrix, user_ids, package_ids)
+    """
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, num_packages + 1) ** 0.8
+    popularity /= popularity.sum()
+
+    counts = rng.poisson(bookings_per_user - 1, size=num_users) + 1
+    rows = np.repeat(np.arange(num_users, dtype=np.int32), counts)
+    cols = rng.choice(num_packages, size=len(rows), p=popularity).astype(np.int32)
+
+    matrix = csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                        shape=(num_users, num_packages))
+    matrix.sum_duplicates()
+    matrix.data[:] = 1.0
+
+    user_ids = [f"user_{i}" for i in range(num_users)]
+    package_ids = [f"pkg_{i}" for i in range(num_packages)]
+    return matrix, user_ids, package_ids
+
+def matrix_to_user_sets(matrix, user_ids, package_ids):
+    """Dict mapping user_id -> set of package IDs"""
+    return {
+        user_ids[row]: {package_ids[col] for col in matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]}
+        for row in range(matrix.shape[0])
+    }
+
+def matrix_to_package_lists(matrix, user_ids, package_ids):
+    """Dict mapping package_id -> list of user IDs (package_user_matrix shape)"""
+    csc = matrix.tocsc()
+    return {
+        package_ids[col]: [user_ids[row] for row in csc.indices[csc.indptr[col]:csc.indptr[col + 1]]]
+        for col in range(matrix.shape[1])
+    }
+
+def synthetic_catalog(package_ids, seed=42):
+    """Catalog package dicts with varied text, destination, price and availability"""
+    rng = np.random.default_rng(seed)
+    words = ("beach mountain city heritage tour culture food hiking island safari wine river desert "
+             "temple trek cruise spa lake forest snow festival market village coast wildlife").split()
+    destinations = ["Bali", "Paris", "Goa", "Kyoto", "Lima", "Oslo", "Cairo", "Rome", "Cusco", "Hanoi"]
+    return [
+        {
+            'id': package_id,
+            'title': ' '.join(rng.choice(words, 3)).title(),
+            'description': ' '.join(rng.choice(words, 12)),
+            'destination': str(rng.choice(destinations)),
+            'duration': f"{int(rng.integers(2, 15))} days",
+            'price': float(rng.integers(100, 5000)),
+            'availability': int(rng.integers(0, 20)),
+        }
+        for package_id in package_ids
+    ]
+
+def synthetic_bookings(num_users, num_packages, bookings_per_user=20, affinity=0.7, days=330, seed=42):
+    """
+    Generate dated bookings shaped like enhanced_cf_data.json as BookingColumns
+
+    Every user prefers one destination: a share of affinity of their
+    bookings is drawn from packages there, the rest from the whole catalog,
+    both with Zipf-like popularity. Dates are spread uniformly over days,
+    so a time-based split leaves held-out bookings that CF and CBF can find.
+    """
+    rng = np.random.default_rng(seed)
+    package_ids = [f"pkg_{i}" for i in range(num_packages)]
+    catalog = synthetic_catalog(package_ids, seed)
+    popularity = 1.0 / rng.permutation(np.arange(1, num_packages + 1)) ** 0.8
+
+    destinations = np.array([pkg['destination'] for pkg in catalog])
+    groups = [np.flatnonzero(destinations == name) for name in np.unique(destinations)]
+    preferred = rng.integers(0, len(groups), size=num_users)
+
+    counts = rng.poisson(bookings_per_user - 1, size=num_users) + 1
+    rows = np.repeat(np.arange(num_users, dtype=np.int32), counts)
+    cols = rng.choice(num_packages, size=len(rows), p=popularity / popularity.sum()).astype(np.int32)
+    local = rng.random(len(rows)) < affinity
+    for group_id, group in enumerate(groups):
+        selected = local & (preferred[rows] == group_id)
+        weights = popularity[group] / popularity[group].sum()
+        cols[selected] = rng.choice(group, size=int(selected.sum()), p=weights)
+
+    start = int(np.datetime64('2024-06-01', 's').astype(np.int64))
+    dates = start + rng.integers(0, days, size=len(rows)) * 86400
+    return BookingColumns(
+        [f"user_{i}" for i in range(num_users)], package_ids, catalog, rows, cols,
+        rng.integers(1, 6, size=len(rows)).astype(np.float32), np.zeros(len(rows), dtype=np.int8),
+        ["COMPLETED"], dates.astype(np.int64)
+    )
@@ -0,0 +1,36 @@
+"""
+Convert a booking dump to the columnar format
+
+Streams a JSON array dump shaped like enhanced_cf_data.json one booking at
+a time and writes its interactions as .npy columns (plus the package
+table), which precompute.py and BookingColumns.load() memory-map in
+milliseconds.
+
+Usage: python convert_dump.py [--input enhanced_cf_data.json] [--output model/bookings]
+"""
+import argparse
+import logging
+import os
+import time
+from model.dump import BookingColumns, iter_bookings
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--input', default=os.path.join(BASE_DIR, "enhanced_cf_data.json"))
+    parser.add_argument('--output', default=os.path.join(BASE_DIR, "model", "bookings"))
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    columns = BookingColumns.from_bookings(iter_bookings(args.input))
+    columns.save(args.output)
+    print(f"Converted {len(columns)} bookings ({len(columns.user_ids)} users, {len(columns.package_ids)} packages) "
+          f"in {time.perf_counter() - start:.1f} s to {args.output}")
+
+if __name__ == '__main__':
+    main()
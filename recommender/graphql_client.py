@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import os
+import threading
+from gql import Client
+from gql.transport.requests import RequestsHTTPTransport
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from gql.transport.aiohttp import AIOHTTPTransport
+except ImportError:  # aiohttp is optional; concurrent queries fall back to sequential
+    AIOHTTPTransport = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+GRAPHQL_URL = os.getenv("GRAPHQL_ENDPOINT", "http://localhost:4000/api")
+GRAPHQL_POOL_SIZE = int(os.getenv("GRAPHQL_POOL_SIZE", "10"))
+GRAPHQL_ASYNC = os.getenv("GRAPHQL_ASYNC", "1") == "1"
+# Shared secret the backend accepts for service-only queries (e.g. getPackageInteractions)
+SERVICE_TOKEN = os.getenv("RECOMMENDER_SERVICE_TOKEN")
+
+class PooledGraphQLClient:
+    """
+    Shared GraphQL client for the recommender
+
+    Keeps one connection-pooled requests session open for the lifetime of the
+    process and fetches the schema once on first use. The caller's auth token
+    is injected as a per-call header, so one client serves every request;
+    the service token, if configured, goes with every query. Independent queries can run concurrently over an optional aiohttp session.
+    """
+
+    def __init__(self, url=GRAPHQL_URL, pool_size=GRAPHQL_POOL_SIZE, retries=3,
+                 fetch_schema=True, use_async=GRAPHQL_ASYNC, service_token=SERVICE_TOKEN):
+        self.url = url
+        self.pool_size = pool_size
+        self.retries = retries
+        self.headers = {"Content-Type": "application/json"}
+        if service_token:
+            self.headers["X-Service-Token"] = service_token
+
+        self._client = Client(
+            transport=RequestsHTTPTransport(url=url, headers=self.headers, verify=True),
+            fetch_schema_from_transport=fetch_schema
+        )
+        self._session = None
+        self._lock = threading.Lock()
+
+        self._use_async = use_async and AIOHTTPTransport is not None
+        self._loop = None
+        self._async_connect = None
+
+    def _get_session(self):
+        with self._lock:
+            if self._session is None:
+                # Connecting fetches the schema once; later executes validate locally
+                self._session = self._client.connect_sync()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=self.pool_size,
+                    max_retries=Retry(total=self.retries, backoff_factor=0.1, allowed_methods=None)
+                )
+                for prefix in "http://", "https://":
+                    self._client.transport.session.mount(prefix, adapter)
+                logger.info(f"Connected pooled GraphQL client to {self.url}")
+            return self._session
+
+    def _auth_headers(self, auth_token):
+        headers = dict(self.headers)
+        if auth_token:
+            headers["Authorization"] = f"Bearer {auth_token}"
+        return headers
+
+    def execute(self, document, variable_values=None, auth_token=None):
+        """Execute one query over the pooled session"""
+        session = self._get_session()
+        return session.execute(document, variable_values=variable_values,
+                               extra_args={"headers": self._auth_headers(auth_token)})
+
+    def execute_many(self, queries, auth_token=None):
+        """
+        Execute independent queries, concurrently when the async transport is available
+
+        Parameters:
+        - queries: List of (document, variable_values) tuples
+        - auth_token: Bearer token forwarded with every query
+
+        Returns:
+        - list of results in the same order as queries
+        """
+        if not self._use_async or len(queries) < 2:
+            return [self.execute(document, variables, auth_token) for document, variables in queries]
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._execute_async(queries, self._auth_headers(auth_token)),
+            self._get_loop()
+        )
+        return future.result()
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                # A dedicated loop thread keeps the aiohttp session alive between requests
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True,
+                                 name="graphql-async").start()
+            return self._loop
+
+    async def _execute_async(self, queries, headers):
+        if self._async_connect is None:
+            # Share the schema already fetched by the sync session
+            schema = self._get_session().client.schema
+            client = Client(
+                transport=AIOHTTPTransport(url=self.url, headers=self.headers),
+                schema=schema
+            )
+            # Concurrent first callers all await the same connection
+            self._async_connect = asyncio.ensure_future(client.connect_async(reconnecting=False))
+
+        session = await self._async_connect
+        return await asyncio.gather(*[
+            session.execute(document, variable_values=variables,
+                            extra_args={"headers": headers})
+            for document, variables in queries
+        ])
+
+    def close(self):
+        """Close the pooled sessions and stop the async loop"""
+        with self._lock:
+            if self._loop is not None:
+                if self._async_connect is not None:
+                    session = self._async_connect.result()
+                    asyncio.run_coroutine_threadsafe(session.client.close_async(), self._loop).result()
+                    self._async_connect = None
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+
+            if self._session is not None:
+                self._client.close_sync()
+                self._session = None
+
+    def for_token(self, auth_token):
+        """Return a view of this client bound to one caller's auth token"""
+        return AuthenticatedGraphQLClient(self, auth_token)
+
+class AuthenticatedGraphQLClient:
+    """Per-request view of PooledGraphQLClient with the caller's auth token bound"""
+
+    def __init__(self, pool, auth_token):
+        self.pool = pool
+        self.auth_token = auth_token
+
+    def execute(self, document, variable_values=None):
+        return self.pool.execute(document, variable_values, self.auth_token)
+
+    def execute_many(self, queries):
+        return self.pool.execute_many(queries, self.auth_token)
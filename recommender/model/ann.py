@@ -0,0 +1,141 @@
+import logging
+import threading
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class IVFIndex:
+    """
+    In-process inverted-file (IVF) index for maximum inner product search
+
+    Item vectors are clustered with k-means into nlist inverted lists. A query
+    scores the centroids, scans only the nprobe best lists and returns the
+    top-k items by exact inner product among those candidates. nprobe is the
+    recall/latency knob: nprobe == nlist is an exact search. New items are
+    inserted into their nearest list without retraining.
+    """
+
+    def __init__(self, nlist=None, nprobe=8, kmeans_iterations=15, seed=42):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+
+        self.centroids = None
+        self.vectors = None
+        self.count = 0
+        self._lists = []
+        self._list_arrays = []
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.centroids is not None
+
+    def train(self, vectors):
+        """Cluster vectors with k-means and index them"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        nlist = self.nlist or max(1, int(np.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+
+        rng = np.random.default_rng(self.seed)
+        centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            assignment = self._nearest_centroid(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            counts = np.bincount(assignment, minlength=nlist)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        with self._lock:
+            self.nlist = nlist
+            self.centroids = centroids
+            self.vectors = np.empty((0, vectors.shape[1]), dtype=np.float32)
+            self.count = 0
+            self._lists = [[] for _ in range(nlist)]
+            self._list_arrays = [None] * nlist
+        self.add(vectors)
+
+        logger.info(f"Trained IVF index: {len(vectors)} vectors, {nlist} lists")
+        return self
+
+    @staticmethod
+    def _nearest_centroid(vectors, centroids):
+        # argmin ||v - c||^2 == argmax (v.c - ||c||^2 / 2)
+        return np.argmax(vectors @ centroids.T - 0.5 * (centroids ** 2).sum(axis=1), axis=1)
+
+    def add(self, vectors):
+        """
+        Insert vectors into their nearest inverted lists
+
+        Returns:
+        - array of the ids assigned to the new vectors
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.centroids.shape[1])
+        assignment = self._nearest_centroid(vectors, self.centroids)
+
+        with self._lock:
+            ids = np.arange(self.count, self.count + len(vectors))
+            if self.count + len(vectors) > len(self.vectors):
+                # Grow storage geometrically so inserts stay amortized O(1)
+                capacity = max(self.count + len(vectors), 2 * len(self.vectors))
+                grown = np.empty((capacity, vectors.shape[1]), dtype=np.float32)
+                grown[:self.count] = self.vectors[:self.count]
+                self.vectors = grown
+            self.vectors[self.count:self.count + len(vectors)] = vectors
+            self.count += len(vectors)
+
+            for item_id, list_id in zip(ids.tolist(), assignment.tolist()):
+                self._lists[list_id].append(item_id)
+                self._list_arrays[list_id] = None
+        return ids
+
+    def _list_array(self, list_id):
+        array = self._list_arrays[list_id]
+        if array is None:
+            array = self._list_arrays[list_id] = np.asarray(self._lists[list_id], dtype=np.int64)
+        return array
+
+    def search(self, query, k=10, nprobe=None, exclude=()):
+        """
+        Approximate top-k items by inner product with query
+
+        Parameters:
+        - query: Query vector
+        - k: Number of results
+        - nprobe: Lists to scan (defaults to the index setting)
+        - exclude: Item ids that must not be returned
+
+        Returns:
+        - (ids, scores) arrays, best first
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        query = np.asarray(query, dtype=np.float32)
+
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        with self._lock:
+            candidates = np.concatenate([self._list_array(list_id) for list_id in probe])
+            vectors = self.vectors
+
+        if len(exclude):
+            candidates = candidates[~np.isin(candidates, np.asarray(list(exclude)))]
+        if not len(candidates):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = vectors[candidates] @ query
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return candidates[top], scores[top]
+
+    def memory_usage(self):
+        return {
+            "vectors": self.count,
+            "lists": self.nlist,
+            "bytes": int(self.vectors[:self.count].nbytes + self.centroids.nbytes +
+                         8 * self.count) if self.ready else 0,
+        }
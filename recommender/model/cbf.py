@@ -3,6 +3,7 @@ from sklearn.metrics.pairwise import cosine_similarity
 import logging
 import re
 import numpy as np
+from scipy.sparse import csr_matrix
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -38,30 +39,140 @@ def extract_keywords(text, min_length=3, max_words=15):
     
     return keywords[:max_words]
 
-def content_based_filtering(user_packages, all_packages):
+def package_text(pkg):
+    """Text of a catalog package as used for TF-IDF (title, description, destination, duration)"""
+    text_components = []
+    
+    if pkg.get('title'):
+        text_components.append(pkg['title'])
+    
+    if pkg.get('description'):
+        text_components.append(pkg['description'])
+    
+    if pkg.get('destination'):
+        text_components.append(pkg['destination'])
+    
+    if pkg.get('duration'):
+        text_components.append(str(pkg['duration']))
+    
+    return ' '.join(text_components)
+
+def package_features(packages, destination_vocabulary=None):
     """
-    Improved content-based filtering algorithm
+    Columnar scoring metadata for a list of packages
     
     Parameters:
-    - user_packages: List of packages the user has booked
-    - all_packages: List of all available packages
+    - packages: List of package dicts
+    - destination_vocabulary: Optional token -> column map to extend in place
     
     Returns:
-    - list of recommended package IDs
+    - dict with 'price' (float64, NaN when missing), 'available' (bool),
+      'destinations' (packages x tokens sparse indicator matrix) and
+      'destination_vocabulary'
     """
-    logger.info("Starting improved content-based filtering")
-    logger.info(f"User has booked {len(user_packages)} packages")
-    logger.info(f"Total packages in system: {len(all_packages)}")
+    vocabulary = {} if destination_vocabulary is None else destination_vocabulary
+    prices = np.full(len(packages), np.nan)
+    available = np.ones(len(packages), dtype=bool)
+    rows, cols = [], []
     
-    if not user_packages or not all_packages:
-        logger.warning("Insufficient data for content-based filtering")
-        return []
+    for i, pkg in enumerate(packages):
+        if pkg.get('price'):
+            try:
+                prices[i] = float(pkg['price'])
+            except (ValueError, TypeError):
+                pass
+        
+        available[i] = bool(pkg.get('availability', True))
+        
+        for token in set(clean_text(pkg.get('destination', '')).split()):
+            rows.append(i)
+            cols.append(vocabulary.setdefault(token, len(vocabulary)))
     
-    # Get IDs of packages user has already booked
-    user_booked_ids = {pkg.get('id') for pkg in user_packages if pkg.get('id')}
-    logger.info(f"User has booked package IDs: {user_booked_ids}")
+    destinations = csr_matrix(
+        (np.ones(len(rows), dtype=np.int8), (rows, cols)),
+        shape=(len(packages), len(vocabulary))
+    )
+    return {
+        'price': prices,
+        'available': available,
+        'destinations': destinations,
+        'destination_vocabulary': vocabulary,
+    }
+
+def score_packages(similarities, features, user_destinations, avg_user_price):
+    """
+    Apply the destination, price and availability adjustments to similarities
     
-    # Build user profile from booked packages
+    Parameters:
+    - similarities: Cosine similarity of each package to the user profile
+    - features: Output of package_features() for the same packages
+    - user_destinations: Set of destination tokens from the user's bookings
+    - avg_user_price: User's average booked price, or None
+    
+    Returns:
+    - float64 array of adjusted scores
+    """
+    scores = np.array(similarities, dtype=np.float64)
+    
+    # Boost score for destination similarity
+    vocabulary = features['destination_vocabulary']
+    user_cols = [vocabulary[token] for token in user_destinations if token in vocabulary]
+    if user_cols:
+        user_tokens = np.zeros(len(vocabulary), dtype=np.int32)
+        user_tokens[user_cols] = 1
+        matches = features['destinations'] @ user_tokens > 0
+        scores[matches] *= 1.2  # 20% boost for destination match
+    
+    # Boost score for price similarity (if we have price data)
+    if avg_user_price:
+        price_diff_ratio = np.abs(features['price'] - avg_user_price) / avg_user_price
+        # NaN (missing price) never compares <= 0.5
+        within = price_diff_ratio <= 0.5  # Within 50% of user's average
+        scores[within] *= 1.1 - (price_diff_ratio[within] * 0.2)  # Up to 10% boost
+    
+    # Penalize unavailable packages
+    scores[~features['available']] *= 0.7  # 30% penalty for unavailable packages
+    
+    return scores
+
+def _fit_similarities(user_profile, packages):
+    """Fit TF-IDF on the profile and packages for this call and return cosine similarities"""
+    corpus = [package_text(pkg) for pkg in packages]
+    logger.info(f"Created corpus with {len(corpus)} packages")
+    
+    vectorizer = TfidfVectorizer(
+        stop_words='english',
+        max_features=1000,  # Reduced for better performance
+        ngram_range=(1, 2),  # Include both unigrams and bigrams
+        min_df=1,
+        max_df=0.95,  # Ignore terms that appear in >95% of documents
+        sublinear_tf=True  # Use sublinear tf scaling
+    )
+    
+    # Fit on corpus and transform both user profile and corpus
+    all_texts = [user_profile] + corpus
+    tfidf_matrix = vectorizer.fit_transform(all_texts)
+    
+    logger.info(f"Created TF-IDF matrix with shape: {tfidf_matrix.shape}")
+    
+    # User profile is the first vector, packages are the rest
+    user_vector = tfidf_matrix[0:1]
+    package_vectors = tfidf_matrix[1:]
+    
+    # Calculate cosine similarities
+    return cosine_similarity(user_vector, package_vectors).flatten()
+
+def build_user_profile(user_packages):
+    """
+    Text profile and preferences of a user from their booked packages
+    
+    Parameters:
+    - user_packages: List of packages the user has booked (one per booking)
+    
+    Returns:
+    - (user_profile, user_destinations, avg_user_price); user_profile is
+      empty when no text features were found
+    """
     user_profile_text = []
     user_destinations = set()
     user_price_range = []
@@ -87,8 +198,7 @@ def content_based_filtering(user_packages, all_packages):
             text_components.append(str(pkg['duration']))
         
         # Combine all text for this package
-        package_text = ' '.join(text_components)
-        user_profile_text.append(package_text)
+        user_profile_text.append(' '.join(text_components))
         
         # Collect price information for price-based similarity
         if pkg.get('price'):
@@ -98,151 +208,163 @@ def content_based_filtering(user_packages, all_packages):
             except (ValueError, TypeError):
                 pass
     
-    if not user_profile_text:
-        logger.warning("No meaningful text features extracted from user packages")
-        return []
-    
-    # Create user profile
-    user_profile = ' '.join(user_profile_text)
-    logger.info(f"Built user profile with {len(user_profile)} characters")
-    
     # Calculate user's average price preference
     avg_user_price = np.mean(user_price_range) if user_price_range else None
+    return ' '.join(user_profile_text), user_destinations, avg_user_price
+
+def rank_packages(similarities, features, candidates, package_ids, user_destinations, avg_user_price, k=10):
+    """
+    Top content-based recommendations from profile similarities
     
-    # Create corpus for all packages
-    corpus = []
-    package_metadata = []
+    Parameters:
+    - similarities: Cosine similarity of each package to the user profile
+    - features: Output of package_features() for the same packages
+    - candidates: Bool mask of packages that may be recommended
+    - package_ids: Package ID of each position
+    - user_destinations: Set of destination tokens from the user's bookings
+    - avg_user_price: User's average booked price, or None
+    - k: Maximum number of recommendations
     
-    for pkg in all_packages:
-        # Skip packages the user has already booked
-        if pkg.get('id') in user_booked_ids:
-            continue
-            
-        text_components = []
-        
-        if pkg.get('title'):
-            text_components.append(pkg['title'])
-        
-        if pkg.get('description'):
-            text_components.append(pkg['description'])
-        
-        if pkg.get('destination'):
-            text_components.append(pkg['destination'])
-        
-        if pkg.get('duration'):
-            text_components.append(str(pkg['duration']))
-        
-        package_text = ' '.join(text_components)
-        corpus.append(package_text)
-        
-        # Store metadata for additional scoring
-        package_metadata.append({
-            'id': pkg.get('id'),
-            'price': pkg.get('price'),
-            'destination': clean_text(pkg.get('destination', '')),
-            'availability': pkg.get('availability', True)
-        })
-    
-    if not corpus:
-        logger.warning("No packages available for recommendation")
+    Returns:
+    - list of recommended package IDs
+    """
+    scores = score_packages(similarities, features, user_destinations, avg_user_price)
+    
+    # Skip booked packages and packages with no similarity
+    rows = np.flatnonzero(candidates & (similarities > 0))
+    
+    # Sort by score (highest first), ties keep catalog order
+    rows = rows[np.argsort(-scores[rows], kind='stable')]
+    
+    # Apply dynamic threshold
+    if not len(rows):
+        logger.info("No recommendations above threshold")
         return []
     
-    logger.info(f"Created corpus with {len(corpus)} packages")
+    max_score = scores[rows[0]]
+    # Dynamic threshold: at least 20% of max score, but minimum 0.05
+    threshold = max(0.05, max_score * 0.2)
     
-    # Create TF-IDF vectors
-    try:
-        vectorizer = TfidfVectorizer(
-            stop_words='english',
-            max_features=1000,  # Reduced for better performance
-            ngram_range=(1, 2),  # Include both unigrams and bigrams
-            min_df=1,
-            max_df=0.95,  # Ignore terms that appear in >95% of documents
-            sublinear_tf=True  # Use sublinear tf scaling
-        )
-        
-        # Fit on corpus and transform both user profile and corpus
-        all_texts = [user_profile] + corpus
-        tfidf_matrix = vectorizer.fit_transform(all_texts)
-        
-        logger.info(f"Created TF-IDF matrix with shape: {tfidf_matrix.shape}")
-        
-        # User profile is the first vector, packages are the rest
-        user_vector = tfidf_matrix[0:1]
-        package_vectors = tfidf_matrix[1:]
-        
-        # Calculate cosine similarities
-        similarities = cosine_similarity(user_vector, package_vectors).flatten()
+    # Filter by threshold and limit results
+    top_rows = rows[scores[rows] >= threshold][:k]
+    
+    recommended_ids = [package_ids[row] for row in top_rows]
+    
+    logger.info(f"Generated {len(recommended_ids)} content-based recommendations")
+    logger.info(f"Score range: {max_score:.4f} to {scores[rows[-1]]:.4f}")
+    logger.info(f"Applied threshold: {threshold:.4f}")
+    
+    # Log top recommendations for debugging
+    for i, row in enumerate(top_rows[:5]):
+        logger.info(f"Top {i+1}: ID={package_ids[row]}, Score={scores[row]:.4f}, Base={similarities[row]:.4f}")
+    
+    return recommended_ids
+
+def content_based_filtering_batch(users_packages, all_packages, text_index, block_size=512):
+    """
+    Content-based recommendations for many users over the shared catalog index
+    
+    Profiles are transformed together and scored against the catalog in one
+    sparse matrix-matrix product per block of users.
+    
+    Parameters:
+    - users_packages: List with, per user, the packages they have booked
+    - all_packages: List of all available packages
+    - text_index: CatalogTextIndex
+    - block_size: Users scored per matrix product
+    
+    Yields:
+    - list of recommended package IDs for each user, in input order
+    """
+    if not text_index.sync(all_packages):
+        for user_packages in users_packages:
+            yield content_based_filtering(user_packages, all_packages)
+        return
+    
+    snapshot = text_index.snapshot
+    for start in range(0, len(users_packages), block_size):
+        block = users_packages[start:start + block_size]
+        profiles = [build_user_profile(user_packages) for user_packages in block]
         
-        # Create recommendations with additional scoring
-        recommendations = []
+        # One transform and one matrix product for the whole block
+        vectors = snapshot.vectorizer.transform([profile for profile, _, _ in profiles])
+        similarities = (vectors @ snapshot.matrix.T).toarray()
         
-        for i, (similarity, metadata) in enumerate(zip(similarities, package_metadata)):
-            if similarity <= 0:  # Skip packages with no similarity
+        for user_packages, (profile, destinations, avg_price), row in zip(block, profiles, similarities):
+            if not profile:
+                yield []
                 continue
             
-            score = similarity
-            
-            # Boost score for destination similarity
-            if user_destinations and metadata['destination']:
-                dest_words = set(metadata['destination'].split())
-                if dest_words.intersection(user_destinations):
-                    score *= 1.2  # 20% boost for destination match
-                    logger.debug(f"Destination boost applied to package {metadata['id']}")
-            
-            # Boost score for price similarity (if we have price data)
-            if avg_user_price and metadata['price']:
-                try:
-                    pkg_price = float(metadata['price'])
-                    price_diff_ratio = abs(pkg_price - avg_user_price) / avg_user_price
-                    if price_diff_ratio <= 0.5:  # Within 50% of user's average
-                        price_boost = 1.1 - (price_diff_ratio * 0.2)  # Up to 10% boost
-                        score *= price_boost
-                        logger.debug(f"Price boost {price_boost:.2f} applied to package {metadata['id']}")
-                except (ValueError, TypeError):
-                    pass
-            
-            # Penalize unavailable packages
-            if not metadata.get('availability', True):
-                score *= 0.7  # 30% penalty for unavailable packages
+            candidates = np.ones(len(snapshot.package_ids), dtype=bool)
+            candidates[[snapshot.package_index[pkg['id']] for pkg in user_packages
+                        if pkg.get('id') in snapshot.package_index]] = False
+            try:
+                yield rank_packages(row, snapshot.features, candidates, snapshot.package_ids,
+                                    destinations, avg_price)
+            except Exception as e:
+                logger.error(f"Error in content-based filtering: {str(e)}")
+                yield []
+
+def content_based_filtering(user_packages, all_packages, text_index=None):
+    """
+    Improved content-based filtering algorithm
+    
+    Parameters:
+    - user_packages: List of packages the user has booked
+    - all_packages: List of all available packages
+    - text_index: Optional shared CatalogTextIndex; without it TF-IDF is
+      fitted per call
+    
+    Returns:
+    - list of recommended package IDs
+    """
+    logger.info("Starting improved content-based filtering")
+    logger.info(f"User has booked {len(user_packages)} packages")
+    logger.info(f"Total packages in system: {len(all_packages)}")
+    
+    if not user_packages or not all_packages:
+        logger.warning("Insufficient data for content-based filtering")
+        return []
+    
+    # Get IDs of packages user has already booked
+    user_booked_ids = {pkg.get('id') for pkg in user_packages if pkg.get('id')}
+    logger.info(f"User has booked package IDs: {user_booked_ids}")
+    
+    # Build user profile from booked packages
+    user_profile, user_destinations, avg_user_price = build_user_profile(user_packages)
+    if not user_profile:
+        logger.warning("No meaningful text features extracted from user packages")
+        return []
+    
+    logger.info(f"Built user profile with {len(user_profile)} characters")
+    
+    try:
+        if text_index is not None and text_index.sync(all_packages):
+            # Catalog vectors and metadata are precomputed; only the user profile is transformed
+            similarities, snapshot = text_index.similarities(user_profile)
+            package_ids = snapshot.package_ids
+            features = snapshot.features
+            candidates = np.ones(len(package_ids), dtype=bool)
+            candidates[[snapshot.package_index[pid] for pid in user_booked_ids
+                        if pid in snapshot.package_index]] = False
+            logger.info(f"Scored {len(package_ids)} packages against the catalog text index")
+        else:
+            packages = [pkg for pkg in all_packages if pkg.get('id') not in user_booked_ids]
+            if not packages:
+                logger.warning("No packages available for recommendation")
+                return []
             
-            recommendations.append({
-                'id': metadata['id'],
-                'score': score,
-                'base_similarity': similarity
-            })
+            similarities = _fit_similarities(user_profile, packages)
+            package_ids = [pkg.get('id') for pkg in packages]
+            features = package_features(packages)
+            candidates = np.ones(len(packages), dtype=bool)
         
-        # Sort by score (highest first) and get top recommendations
-        recommendations.sort(key=lambda x: x['score'], reverse=True)
-        
-        # Apply dynamic threshold
-        if recommendations:
-            max_score = recommendations[0]['score']
-            # Dynamic threshold: at least 20% of max score, but minimum 0.05
-            threshold = max(0.05, max_score * 0.2)
-            
-            # Filter by threshold and limit results
-            filtered_recommendations = [
-                rec for rec in recommendations 
-                if rec['score'] >= threshold
-            ][:10]  # Limit to top 10
-            
-            recommended_ids = [rec['id'] for rec in filtered_recommendations]
-            
-            logger.info(f"Generated {len(recommended_ids)} content-based recommendations")
-            logger.info(f"Score range: {recommendations[0]['score']:.4f} to {recommendations[-1]['score']:.4f}")
-            logger.info(f"Applied threshold: {threshold:.4f}")
-            
-            # Log top recommendations for debugging
-            for i, rec in enumerate(filtered_recommendations[:5]):
-                logger.info(f"Top {i+1}: ID={rec['id']}, Score={rec['score']:.4f}, Base={rec['base_similarity']:.4f}")
-            
-            return recommended_ids
-        else:
-            logger.info("No recommendations above threshold")
-            return []
+        # Create recommendations with additional scoring
+        return rank_packages(similarities, features, candidates, package_ids,
+                             user_destinations, avg_user_price)
             
     except Exception as e:
         logger.error(f"Error in content-based filtering: {str(e)}")
         import traceback
         traceback.print_exc()
-        return []
\ No newline at end of file
+        return []
@@ -1,14 +1,16 @@
-from collections import defaultdict
 import logging
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from scipy.sparse import csr_matrix
+from model.factorization import FactorModel
+from model.interactions import CompactInteractions, row_sizes
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def collaborative_filtering_full(user_id, user_bookings, all_users_bookings, package_user_matrix, all_packages):
+def collaborative_filtering_full(user_id, user_bookings, all_users_bookings=None, package_user_matrix=None,
+                                 all_packages=None, interactions=None, item_index=None, factor_model=None,
+                                 popularity=None):
     """
     Full implementation of collaborative filtering using all available data
     
@@ -18,13 +20,190 @@ def collaborative_filtering_full(user_id, user_bookings, all_users_bookings, pac
     - all_users_bookings: Dict mapping user_id -> list of their bookings
     - package_user_matrix: Dict mapping package_id -> list of user_ids who booked it
     - all_packages: List of all available packages
+    - interactions: Optional InteractionStore or CompactInteractions; replaces
+      all_users_bookings and package_user_matrix
+    - item_index: Optional ItemNeighbourIndex built from interactions
+    - factor_model: Optional FactorModel fitted on interactions
+    - popularity: Optional TrendingPopularity ranking the cold-start fallback
     
     Returns:
     - list of recommended package IDs
     """
+    if interactions is None:
+        # Legacy booking maps are interned once; every approach then reads the same matrix
+        interactions = CompactInteractions.from_bookings(
+            all_users_bookings, package_user_matrix, [pkg['id'] for pkg in all_packages or []]
+        )
+        item_index = None
+    
+    # Score on references taken under the store lock, without holding it
+    return _collaborative_filtering(user_id, user_bookings, all_packages or [], interactions.view(),
+                                    item_index, factor_model, popularity)
+
+def collaborative_filtering_batch(user_ids, interactions, all_packages=None, item_index=None, factor_model=None,
+                                  popular_ids=None, block_size=512, similarity='jaccard', min_similarity=0.05):
+    """
+    Collaborative filtering for many users in one pass over the shared matrices
+
+    Users are scored in blocks: user-based CF is a block x users and a
+    users x packages sparse product, item-based CF a product with the item
+    neighbour (or item-item Jaccard) matrix, and matrix factorization one
+    block x factors x packages product. Per-user results follow the same
+    combination and popularity fallback as collaborative_filtering_full,
+    using each user's bookings as held by the store.
+
+    Parameters:
+    - user_ids: IDs of the users to recommend packages for
+    - interactions: InteractionStore
+    - all_packages: Optional list of all available packages
+    - item_index: Optional ItemNeighbourIndex built from interactions
+    - factor_model: Optional FactorModel fitted on interactions
+    - popular_ids: Optional precomputed popularity order of package IDs
+    - block_size: Users scored per matrix product
+
+    Yields:
+    - (user_id, list of recommended package IDs), in input order
+    """
+    interactions = interactions.view()
+    matrix = interactions.matrix
+    package_ids = list(interactions.package_ids)
+    user_index = {uid: interactions.user_index.get(uid) for uid in user_ids}
+    # Popularity order computed once; each user skips their own bookings
+    if popular_ids is None:
+        popular_ids = popular_package_ids(interactions)
+    use_item_based = interactions.num_packages > 0
+    neighbours = _item_neighbour_matrix(item_index, interactions, matrix) if use_item_based else None
+    user_sizes, _ = interactions.sizes()
+
+    num_users, num_packages = matrix.shape
+    num_catalog = len(all_packages) if all_packages is not None else num_packages
+    use_user_based = num_users > 1
+    use_factors = num_users > 3 and num_catalog > 5
+
+    if use_factors and factor_model is None and matrix.nnz:
+        factor_model = FactorModel().fit(matrix, package_ids)
+    if factor_model is not None and factor_model.ready:
+        # Store column -> factor model column (-1 for packages the model has not seen)
+        model_cols = np.asarray([factor_model.package_index.get(pid, -1) for pid in package_ids],
+                                dtype=np.int64)
+    else:
+        use_factors = False
+
+    logger.info(f"Batch collaborative filtering for {len(user_ids)} users over "
+                f"{num_users}x{num_packages} matrix")
+
+    for start in range(0, len(user_ids), block_size):
+        block_ids = user_ids[start:start + block_size]
+        rows = np.asarray([user_index[uid] if user_index[uid] is not None else -1 for uid in block_ids])
+        present = rows >= 0
+
+        # Booked packages of each user in the block, as a block x packages matrix
+        targets = csr_matrix((len(block_ids), num_packages), dtype=np.float32)
+        if present.any():
+            selected = matrix[rows[present]]
+            placement = csr_matrix((np.ones(present.sum(), dtype=np.float32),
+                                    (np.flatnonzero(present), np.arange(present.sum()))),
+                                   shape=(len(block_ids), present.sum()))
+            targets = (placement @ selected).tocsr()
+        booked = targets.indptr
+
+        user_scores = item_scores = factor_recs = None
+        if use_user_based:
+            user_scores = _batch_user_scores(matrix, targets, rows, user_sizes, similarity, min_similarity)
+        if neighbours is not None:
+            item_scores = (targets @ neighbours).toarray()
+            _zero_booked(item_scores, targets)
+        if use_factors:
+            model_targets = targets.tocoo()
+            keep = model_cols[model_targets.col] >= 0
+            model_targets = csr_matrix(
+                (model_targets.data[keep], (model_targets.row[keep], model_cols[model_targets.col[keep]])),
+                shape=(len(block_ids), len(factor_model.package_ids))
+            )
+            factor_recs = factor_model.recommend_batch(model_targets, k=10)
+
+        for i, uid in enumerate(block_ids):
+            user_package_ids = {package_ids[col] for col in targets.indices[booked[i]:booked[i + 1]]}
+            recommendations = []
+            if user_package_ids:
+                if user_scores is not None:
+                    recommendations.extend(package_ids[idx] for idx in top_k_indices(user_scores[i], 10))
+                if item_scores is not None:
+                    recommendations.extend(package_ids[idx] for idx in top_k_indices(item_scores[i], 10))
+                if factor_recs is not None:
+                    recommendations.extend(pkg_id for pkg_id, score in factor_recs[i])
+
+            # Remove duplicates and filter out already booked packages
+            unique_recommendations = []
+            seen = set()
+            for pkg_id in recommendations:
+                if pkg_id not in seen and pkg_id not in user_package_ids:
+                    unique_recommendations.append(pkg_id)
+                    seen.add(pkg_id)
+
+            # If no recommendations, fall back to popularity
+            if not unique_recommendations:
+                unique_recommendations = [pid for pid in popular_ids if pid not in user_package_ids][:10]
+
+            yield uid, unique_recommendations[:10]
+
+def _batch_user_scores(matrix, targets, rows, user_sizes, similarity, min_similarity):
+    """Block version of user_similarity_scores: block x packages dense scores"""
+    # Overlap of every block user's bookings with every user, as a block x users sparse matrix
+    if similarity == 'cosine':
+        overlap = (targets @ matrix.T).tocsr()
+        target_sizes, other_sizes = _row_norms(targets), _row_norms(matrix)
+    else:
+        overlap = _min_overlap(matrix.tocsc(), targets)
+        target_sizes, other_sizes = row_sizes(targets), user_sizes
+    block_row = np.repeat(np.arange(targets.shape[0]), np.diff(overlap.indptr))
+    sims = _similarities(overlap.data, target_sizes[block_row], other_sizes[overlap.indices], similarity)
+    sims[sims <= min_similarity] = 0.0
+    sims[overlap.indices == rows[block_row]] = 0.0  # Not similar to themselves
+
+    keep = sims > 0
+    similar = csr_matrix((sims[keep], overlap.indices[keep],
+                          np.concatenate([[0], np.cumsum(np.bincount(block_row[keep],
+                                                                     minlength=targets.shape[0]))])),
+                         shape=overlap.shape)
+
+    # Similarity-weighted package scores in a second sparse product
+    scores = (similar @ matrix).toarray()
+    _zero_booked(scores, targets)
+    return scores
+
+def _item_neighbour_matrix(item_index, interactions, matrix):
+    """Packages x packages item similarity matrix for block item-based scoring"""
+    num_packages = matrix.shape[1]
+    if item_index is not None and item_index.sync(interactions):
+        # The index may already cover packages added after this matrix was taken
+        neighbours = item_index.neighbours[:num_packages]
+        scores = item_index.scores[:num_packages]
+        valid = (neighbours >= 0) & (neighbours < num_packages)
+        rows = np.repeat(np.arange(len(neighbours)), valid.sum(axis=1))
+        return csr_matrix((scores[valid].astype(np.float64), (rows, neighbours[valid])),
+                          shape=(num_packages, num_packages))
+
+    # No neighbour index: full item-item Jaccard from co-booking counts
+    csc = matrix.tocsc()
+    _, sizes = interactions.sizes()
+    cooccurrence = (csc.T @ matrix).tocoo()
+    keep = cooccurrence.row != cooccurrence.col
+    rows, cols = cooccurrence.row[keep], cooccurrence.col[keep]
+    intersection = cooccurrence.data[keep].astype(np.float64)
+    return csr_matrix((intersection / (sizes[rows] + sizes[cols] - intersection), (rows, cols)),
+                      shape=(num_packages, num_packages))
+
+def _zero_booked(scores, targets):
+    scores[np.repeat(np.arange(targets.shape[0]), np.diff(targets.indptr)), targets.indices] = 0.0
+
+def _collaborative_filtering(user_id, user_bookings, all_packages, interactions, item_index, factor_model,
+                             popularity=None):
+    num_users = interactions.num_users
+
     logger.info(f"=== STARTING FULL COLLABORATIVE FILTERING ===")
     logger.info(f"Target user: {user_id}")
-    logger.info(f"Available users: {len(all_users_bookings)}")
+    logger.info(f"Available users: {num_users}")
     logger.info(f"Available packages: {len(all_packages)}")
     
     # Extract current user's booked packages
@@ -34,37 +213,42 @@ def collaborative_filtering_full(user_id, user_bookings, all_users_bookings, pac
             user_package_ids.add(booking['package']['id'])
     
     logger.info(f"User has booked {len(user_package_ids)} packages")
+    # Confidence of each booked package, read once from the (possibly weighted) matrix
+    package_weights = booked_package_weights(interactions, user_id, user_package_ids)
     
     if len(user_package_ids) == 0:
         logger.info("User has no booking history - using popularity-based recommendations")
-        return popularity_based_recommendations(package_user_matrix, user_package_ids, all_packages)
+        return popularity_based_recommendations(None, user_package_ids, all_packages, interactions=interactions,
+                                                popularity=popularity)
     
     # Try different collaborative filtering approaches
     recommendations = []
     
     # Approach 1: User-based collaborative filtering using booking history
-    if all_users_bookings and len(all_users_bookings) > 1:
+    if num_users > 1:
         logger.info("Trying user-based collaborative filtering...")
         user_based_recs = user_based_collaborative_filtering(
-            user_id, user_package_ids, all_users_bookings, all_packages
+            user_id, user_package_ids, None, all_packages, interactions=interactions
         )
         recommendations.extend(user_based_recs)
         logger.info(f"User-based CF generated {len(user_based_recs)} recommendations")
     
     # Approach 2: Item-based collaborative filtering using package-user matrix
-    if package_user_matrix:
+    if interactions.num_packages:
         logger.info("Trying item-based collaborative filtering...")
         item_based_recs = item_based_collaborative_filtering(
-            user_id, user_package_ids, package_user_matrix, all_packages
+            user_id, user_package_ids, None, all_packages,
+            item_index=item_index, interactions=interactions, package_weights=package_weights
         )
         recommendations.extend(item_based_recs)
         logger.info(f"Item-based CF generated {len(item_based_recs)} recommendations")
     
     # Approach 3: Matrix factorization approach (if we have enough data)
-    if len(all_users_bookings) > 3 and len(all_packages) > 5:
+    if num_users > 3 and len(all_packages) > 5:
         logger.info("Trying matrix factorization approach...")
         matrix_recs = matrix_factorization_cf(
-            user_id, user_package_ids, all_users_bookings, all_packages
+            user_id, user_package_ids, None, all_packages,
+            interactions=interactions, factor_model=factor_model, package_weights=package_weights
         )
         recommendations.extend(matrix_recs)
         logger.info(f"Matrix factorization generated {len(matrix_recs)} recommendations")
@@ -84,220 +268,329 @@ def collaborative_filtering_full(user_id, user_bookings, all_users_bookings, pac
     if not unique_recommendations:
         logger.info("No CF recommendations found, using popularity fallback")
         unique_recommendations = popularity_based_recommendations(
-            package_user_matrix, user_package_ids, all_packages
+            None, user_package_ids, all_packages, interactions=interactions, popularity=popularity
         )
     
     logger.info(f"Final CF recommendations: {len(unique_recommendations)}")
     return unique_recommendations[:10]  # Limit to top 10
 
-def user_based_collaborative_filtering(user_id, user_package_ids, all_users_bookings, all_packages):
-    """User-based collaborative filtering"""
-    logger.info("Running user-based collaborative filtering")
-    
-    # Build user-package matrix
-    all_package_ids = [pkg['id'] for pkg in all_packages]
-    user_ids = list(all_users_bookings.keys())
+def user_based_collaborative_filtering(user_id, user_package_ids, all_users_bookings, all_packages,
+                                      interactions=None, similarity='jaccard'):
+    """
+    User-based collaborative filtering on the sparse user x package matrix
     
-    # Create binary matrix: users x packages
-    user_package_matrix = {}
+    The target user's similarity to every other user comes from one sparse
+    pass over the booked package columns, and candidate package scores from
+    one sparse matrix-vector product, so no per-user Python loop runs at
+    request time. On a weighted matrix the similarities are weighted
+    Jaccard / cosine over the users' confidence values.
     
-    for uid in user_ids:
-        user_vector = set()
-        bookings = all_users_bookings.get(uid, [])
-        
-        for booking in bookings:
-            if booking.get('package') and booking['package'].get('id'):
-                user_vector.add(booking['package']['id'])
-        
-        user_package_matrix[uid] = user_vector
+    Parameters:
+    - user_id: ID of the user to recommend packages for
+    - user_package_ids: Set of package IDs the user has booked
+    - all_users_bookings: Dict mapping user_id -> list of their bookings
+    - all_packages: List of all available packages
+    - interactions: Optional InteractionStore or CompactInteractions providing
+      the CSR matrix (replaces all_users_bookings)
+    - similarity: 'jaccard' (default) or 'cosine'
     
-    # Calculate user similarities using Jaccard similarity
-    user_similarities = {}
-    target_user_packages = user_package_matrix.get(user_id, set())
+    Returns:
+    - list of recommended package IDs
+    """
+    logger.info("Running user-based collaborative filtering")
     
-    if not target_user_packages:
+    if interactions is None:
+        interactions = CompactInteractions.from_bookings(all_users_bookings)
+    matrix = interactions.matrix
+    user_index = interactions.user_index
+    package_index = interactions.package_index
+    package_ids = interactions.package_ids
+    
+    scores = user_similarity_scores(
+        matrix, user_index.get(user_id), user_package_ids, package_index, similarity,
+        user_sizes=interactions.sizes()[0]
+    )
+    if scores is None:
         logger.info("Target user has no packages in matrix")
         return []
     
-    similar_users_found = 0
-    for other_user_id in user_ids:
-        if other_user_id == user_id:
-            continue
-            
-        other_user_packages = user_package_matrix.get(other_user_id, set())
-        
-        if not other_user_packages:
-            continue
-        
-        # Jaccard similarity
-        intersection = len(target_user_packages & other_user_packages)
-        union = len(target_user_packages | other_user_packages)
-        
-        if union > 0:
-            similarity = intersection / union
-            if similarity > 0.05:  # Lower threshold for sparse data
-                user_similarities[other_user_id] = similarity
-                similar_users_found += 1
+    top = top_k_indices(scores, 10)
+    recommendations = [package_ids[idx] for idx in top]
     
-    logger.info(f"Found {similar_users_found} similar users")
+    logger.info(f"User-based CF: Top recommendations with scores: "
+                f"{[(package_ids[idx], float(scores[idx])) for idx in top[:3]]}")
+    return recommendations
+
+def user_similarity_scores(matrix, target_row, user_package_ids, package_index, similarity='jaccard',
+                           min_similarity=0.05, user_sizes=None):
+    """
+    Score every package for one user from similar users' bookings
     
-    if not user_similarities:
-        return []
+    Parameters:
+    - matrix: Binary (or confidence-weighted) user x package CSR matrix
+    - target_row: Row of the target user in matrix (None if absent)
+    - user_package_ids: Set of package IDs the target user has booked
+    - package_index: Dict mapping package_id -> column
+    - similarity: 'jaccard' or 'cosine'
+    - min_similarity: Users at or below this similarity are ignored
+    - user_sizes: Optional precomputed row sums of matrix (jaccard only)
     
-    # Get recommendations from similar users
-    package_scores = defaultdict(float)
+    Returns:
+    - float64 array of package scores (0 for booked/unscored), or None
+      if the target user has no packages in the matrix
+    """
+    target_cols = [package_index[pid] for pid in user_package_ids if pid in package_index]
+    if not target_cols:
+        return None
+    
+    # The target's own confidence in each booked package (1.0 if not in its stored row)
+    target_weights = np.ones(matrix.shape[1])
+    if target_row is not None:
+        start, end = matrix.indptr[target_row], matrix.indptr[target_row + 1]
+        target_weights[matrix.indices[start:end]] = matrix.data[start:end]
+    target_cols = np.asarray(target_cols)
+    target = csr_matrix((target_weights[target_cols], target_cols, [0, len(target_cols)]),
+                        shape=(1, matrix.shape[1]))
+    
+    # Overlap with every user in one sparse pass over the booked columns
+    if similarity == 'cosine':
+        overlap = (matrix @ target.T).toarray().ravel()
+        target_size, user_sizes = _row_norms(target)[0], _row_norms(matrix)
+    else:
+        overlap = _min_overlap(matrix.tocsc(), target).toarray().ravel()
+        target_size = float(target.data.sum())
+        if user_sizes is None:
+            user_sizes = row_sizes(matrix)
+    sims = _similarities(overlap, target_size, user_sizes, similarity)
+    
+    sims[sims <= min_similarity] = 0.0
+    if target_row is not None:
+        sims[target_row] = 0.0
+    
+    logger.info(f"Found {int(np.count_nonzero(sims))} similar users")
+    
+    # Similarity-weighted package scores in a second sparse product
+    scores = matrix.T @ sims
+    scores[target_cols] = 0.0
+    return scores
+
+def _min_overlap(csc, targets):
+    """
+    Sum over packages of min(target weight, user weight), for every target row and user
+
+    The numerator of weighted Jaccard; for binary matrices the number of
+    shared packages. Gathers the stored users of each target package from
+    the CSC matrix in one vectorized pass.
+
+    Returns:
+    - targets x users CSR matrix
+    """
+    entries = targets.tocoo()
+    starts = csc.indptr[entries.col]
+    lengths = csc.indptr[entries.col + 1] - starts
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    positions = np.repeat(starts, lengths) + offsets
+    values = np.minimum(csc.data[positions], np.repeat(entries.data, lengths)).astype(np.float64)
+    overlap = csr_matrix((values, (np.repeat(entries.row, lengths), csc.indices[positions])),
+                         shape=(targets.shape[0], csc.shape[0]))
+    overlap.sum_duplicates()
+    return overlap
+
+def _row_norms(matrix):
+    """Per-row L2 norm of the matrix values"""
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    data = matrix.data.astype(np.float64)
+    return np.sqrt(np.bincount(rows, weights=data * data, minlength=matrix.shape[0]))
+
+def _similarities(overlap, target_sizes, user_sizes, similarity):
+    """
+    Weighted Jaccard (sum of min / sum of max) or cosine (dot / product of norms), in [0, 1]
+
+    For jaccard, overlap is the sum of min and the sizes are row sums, so
+    the sum of max is target + user - overlap; for cosine, overlap is the
+    dot product and the sizes are L2 norms.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if similarity == 'cosine':
+            sims = overlap / (target_sizes * user_sizes)
+        else:
+            sims = overlap / (target_sizes + user_sizes - overlap)
+    sims[~np.isfinite(sims)] = 0.0
+    return sims
+
+def top_k_indices(scores, k):
+    """
+    Indices of the k highest positive scores, best first
     
-    for other_user_id, similarity in user_similarities.items():
-        other_user_packages = user_package_matrix.get(other_user_id, set())
-        
-        for pkg_id in other_user_packages:
-            if pkg_id not in user_package_ids:  # Don't recommend already booked packages
-                package_scores[pkg_id] += similarity
+    Ties (to 1e-10) are broken by column order so results are stable
+    regardless of floating point summation order.
+    """
+    candidates = np.flatnonzero(scores > 0)
+    rounded = np.round(scores[candidates], 10)
     
-    # Sort by score and return top recommendations
-    sorted_packages = sorted(package_scores.items(), key=lambda x: x[1], reverse=True)
-    recommendations = [pkg_id for pkg_id, score in sorted_packages[:10]]
+    if len(candidates) > k:
+        # Keep everything tied with the k-th best so the cut is deterministic
+        kth = -np.partition(-rounded, k - 1)[k - 1]
+        keep = rounded >= kth
+        candidates, rounded = candidates[keep], rounded[keep]
     
-    logger.info(f"User-based CF: Top recommendations with scores: {sorted_packages[:3]}")
-    return recommendations
+    return candidates[np.lexsort((candidates, -rounded))][:k]
 
-def item_based_collaborative_filtering(user_id, user_package_ids, package_user_matrix, all_packages):
+def item_based_collaborative_filtering(user_id, user_package_ids, package_user_matrix, all_packages,
+                                      item_index=None, interactions=None, package_weights=None):
     """Item-based collaborative filtering using package-user relationships"""
     logger.info("Running item-based collaborative filtering")
     
     if not user_package_ids:
         return []
     
-    # Find packages similar to what the user has booked
-    similar_packages = defaultdict(float)
-    
-    for user_pkg_id in user_package_ids:
-        users_who_booked_this = set(package_user_matrix.get(user_pkg_id, []))
+    if interactions is None:
+        interactions = CompactInteractions.from_bookings(None, package_user_matrix)
+    package_ids = interactions.package_ids
+    booked_ids = [pid for pid in user_package_ids if pid in interactions.package_index]
+    booked_cols = [interactions.package_index[pid] for pid in booked_ids]
+    # Each booked package's neighbours count by the user's confidence in it
+    weights = np.asarray([(package_weights or {}).get(pid, 1.0) for pid in booked_ids], dtype=np.float64)
+    
+    # Merge precomputed neighbour lists when the index is built
+    if item_index is not None and item_index.sync(interactions):
+        scores = item_index.score(booked_cols, exclude_cols=booked_cols, weights=weights)[:len(package_ids)]
+        top = top_k_indices(scores, 10)
         
-        if len(users_who_booked_this) < 1:  # Need at least 1 user
-            continue
-        
-        # Find other packages booked by these users
-        for other_pkg_id, other_users in package_user_matrix.items():
-            if other_pkg_id == user_pkg_id or other_pkg_id in user_package_ids:
-                continue
-            
-            other_users_set = set(other_users)
-            
-            if len(other_users_set) < 1:
-                continue
-            
-            # Calculate Jaccard similarity between packages based on users
-            intersection = len(users_who_booked_this & other_users_set)
-            union = len(users_who_booked_this | other_users_set)
-            
-            if union > 0 and intersection > 0:
-                similarity = intersection / union
-                similar_packages[other_pkg_id] += similarity
+        logger.info(f"Item-based CF (neighbour index): Top recommendations with scores: "
+                    f"{[(package_ids[idx], float(scores[idx])) for idx in top[:3]]}")
+        return [package_ids[idx] for idx in top]
     
-    # Sort by similarity score
-    sorted_similar = sorted(similar_packages.items(), key=lambda x: x[1], reverse=True)
-    recommendations = [pkg_id for pkg_id, score in sorted_similar[:10]]
+    if not booked_cols:
+        return []
     
-    logger.info(f"Item-based CF: Top recommendations with scores: {sorted_similar[:3]}")
+    # Jaccard similarity of each booked package with every package, from co-booking counts
+    matrix = interactions.matrix
+    csc = matrix.tocsc()
+    _, sizes = interactions.sizes()
+    cooccurrence = (csc[:, booked_cols].T @ matrix).tocoo()
+    intersection = cooccurrence.data.astype(np.float64)
+    booked_sizes = sizes[np.asarray(booked_cols)[cooccurrence.row]]
+    similarity = intersection / (booked_sizes + sizes[cooccurrence.col] - intersection)
+    
+    # Sum over the booked packages
+    scores = np.bincount(cooccurrence.col, weights=similarity * weights[cooccurrence.row],
+                         minlength=matrix.shape[1])
+    scores[booked_cols] = 0.0
+    top = top_k_indices(scores, 10)
+    recommendations = [package_ids[idx] for idx in top]
+    
+    logger.info(f"Item-based CF: Top recommendations with scores: "
+                f"{[(package_ids[idx], float(scores[idx])) for idx in top[:3]]}")
     return recommendations
 
-def matrix_factorization_cf(user_id, user_package_ids, all_users_bookings, all_packages):
-    """Matrix factorization approach using SVD-like decomposition"""
+def matrix_factorization_cf(user_id, user_package_ids, all_users_bookings, all_packages, interactions=None,
+                            factor_model=None, package_weights=None):
+    """
+    Matrix factorization collaborative filtering on learned user/item factors
+    
+    Parameters:
+    - user_id: ID of the user to recommend packages for
+    - user_package_ids: Set of package IDs the user has booked
+    - all_users_bookings: Dict mapping user_id -> list of their bookings
+    - all_packages: List of all available packages
+    - interactions: Optional InteractionStore or CompactInteractions providing
+      the CSR matrix (replaces all_users_bookings)
+    - factor_model: Optional fitted FactorModel; one is fitted on the fly
+      when none is provided
+    - package_weights: Optional dict of booked package_id -> confidence used
+      to fold the user in (1.0 for packages not listed)
+    
+    Returns:
+    - list of recommended package IDs
+    """
     logger.info("Running matrix factorization collaborative filtering")
     
     try:
-        # Create user-item matrix
-        all_package_ids = [pkg['id'] for pkg in all_packages]
-        user_ids = list(all_users_bookings.keys())
-        
-        # Create mapping from IDs to indices
-        user_to_idx = {uid: idx for idx, uid in enumerate(user_ids)}
-        pkg_to_idx = {pid: idx for idx, pid in enumerate(all_package_ids)}
-        
-        # Build sparse matrix
-        rows, cols, data = [], [], []
-        
-        for uid, bookings in all_users_bookings.items():
-            if uid not in user_to_idx:
-                continue
-                
-            user_idx = user_to_idx[uid]
-            
-            for booking in bookings:
-                if booking.get('package') and booking['package'].get('id'):
-                    pkg_id = booking['package']['id']
-                    if pkg_id in pkg_to_idx:
-                        pkg_idx = pkg_to_idx[pkg_id]
-                        rows.append(user_idx)
-                        cols.append(pkg_idx)
-                        data.append(1.0)  # Binary rating (booked = 1)
-        
-        if not rows:
-            logger.info("No data for matrix factorization")
-            return []
-        
-        # Create sparse matrix
-        matrix = csr_matrix((data, (rows, cols)), shape=(len(user_ids), len(all_package_ids)))
-        
-        # Convert to dense for cosine similarity (if not too large)
-        if matrix.shape[0] < 500 and matrix.shape[1] < 500:
-            dense_matrix = matrix.toarray()
+        if factor_model is None:
+            if interactions is None:
+                interactions = CompactInteractions.from_bookings(
+                    all_users_bookings, package_ids=[pkg['id'] for pkg in all_packages]
+                )
+            matrix, package_ids = interactions.matrix, interactions.package_ids
             
-            # Find target user index
-            if user_id not in user_to_idx:
-                logger.info("Target user not in matrix")
+            if matrix.nnz == 0:
+                logger.info("No data for matrix factorization")
                 return []
-            
-            target_user_idx = user_to_idx[user_id]
-            target_user_vector = dense_matrix[target_user_idx].reshape(1, -1)
-            
-            # Calculate user similarities
-            similarities = cosine_similarity(target_user_vector, dense_matrix)[0]
-            
-            # Find most similar users (excluding self)
-            similar_user_indices = np.argsort(similarities)[::-1]
-            similar_user_indices = [idx for idx in similar_user_indices 
-                                  if idx != target_user_idx and similarities[idx] > 0.05][:10]
-            
-            # Get recommendations from similar users
-            target_user_bookings = set(np.where(dense_matrix[target_user_idx] > 0)[0])
-            recommendations = []
-            
-            for similar_user_idx in similar_user_indices:
-                similar_user_bookings = set(np.where(dense_matrix[similar_user_idx] > 0)[0])
-                
-                # Recommend packages this similar user booked but target user hasn't
-                for pkg_idx in similar_user_bookings:
-                    if pkg_idx not in target_user_bookings:
-                        pkg_id = all_package_ids[pkg_idx]
-                        if pkg_id not in recommendations:
-                            recommendations.append(pkg_id)
-            
-            logger.info(f"Matrix factorization found {len(similar_user_indices)} similar users")
-            return recommendations[:10]
+            factor_model = FactorModel().fit(matrix, package_ids)
         
-        else:
-            logger.info("Matrix too large for dense operations")
+        elif not factor_model.ready:
+            logger.info("Factor model is not fitted yet")
             return []
+        
+        # Fold the user's current bookings into the model and score all packages
+        scored = factor_model.recommend(user_package_ids, k=10, weights=package_weights)
+        logger.info(f"Matrix factorization: Top recommendations with scores: {scored[:3]}")
+        return [pkg_id for pkg_id, score in scored]
             
     except Exception as e:
         logger.error(f"Matrix factorization failed: {str(e)}")
         return []
 
-def popularity_based_recommendations(package_user_matrix, user_package_ids, all_packages):
-    """Fallback: popularity-based recommendations"""
+def booked_package_weights(interactions, user_id, user_package_ids):
+    """
+    Confidence of each of a user's booked packages from the interaction matrix
+
+    Returns:
+    - dict package_id -> matrix value (1.0 for binary matrices and for
+      packages not in the user's stored row)
+    """
+    weights = dict.fromkeys(user_package_ids, 1.0)
+    row = interactions.user_index.get(user_id)
+    if row is None:
+        return weights
+    matrix, package_ids = interactions.matrix, interactions.package_ids
+    start, end = matrix.indptr[row], matrix.indptr[row + 1]
+    for col, weight in zip(matrix.indices[start:end], matrix.data[start:end]):
+        if package_ids[col] in weights:
+            weights[package_ids[col]] = float(weight)
+    return weights
+
+def popular_package_ids(interactions):
+    """All package IDs by number of users who booked them, most popular first (ties in column order)"""
+    with interactions.lock:
+        matrix, package_ids = interactions.matrix, interactions.package_ids
+        popularity = np.bincount(matrix.indices, minlength=len(package_ids))
+    return [package_ids[col] for col in np.argsort(-popularity, kind='stable')]
+
+def fallback_package_ids(interactions, popularity=None, k=10, exclude=()):
+    """
+    Cold-start package IDs: trending packages first, then all-time popularity
+
+    Parameters:
+    - interactions: InteractionStore or CompactInteractions, or None
+    - popularity: Optional TrendingPopularity
+    - k: Number of package IDs wanted
+    - exclude: Package IDs to skip
+
+    Returns:
+    - list of at most k package IDs; the all-time order (a bincount and sort
+      over the matrix) is only computed if the trending ones run out
+    """
+    recommendations = []
+    if popularity is not None:
+        recommendations = popularity.top(min(k, popularity.capacity), exclude=exclude)
+    if len(recommendations) < k and interactions is not None:
+        seen = set(recommendations)
+        recommendations.extend(pkg_id for pkg_id in popular_package_ids(interactions)
+                               if pkg_id not in exclude and pkg_id not in seen)
+    return recommendations[:k]
+
+def popularity_based_recommendations(package_user_matrix, user_package_ids, all_packages, interactions=None,
+                                     popularity=None):
+    """Fallback: popularity-based recommendations (trending first when a TrendingPopularity is given)"""
     logger.info("Using popularity-based recommendations")
     
-    # Count how many users booked each package
-    package_popularity = {}
-    for pkg_id, users in package_user_matrix.items():
-        if pkg_id not in user_package_ids:  # Don't recommend already booked
-            package_popularity[pkg_id] = len(users)
+    if interactions is None:
+        interactions = CompactInteractions.from_bookings(None, package_user_matrix)
     
-    # Sort by popularity
-    sorted_by_popularity = sorted(package_popularity.items(), key=lambda x: x[1], reverse=True)
-    recommendations = [pkg_id for pkg_id, count in sorted_by_popularity[:10]]
+    # Most booked packages first, skipping already booked ones
+    recommendations = fallback_package_ids(interactions, popularity, k=10, exclude=user_package_ids)
     
     logger.info(f"Popularity-based recommendations: {len(recommendations)}")
-    return recommendations
\ No newline at end of file
+    return recommendations
@@ -0,0 +1,263 @@
+import json
+import logging
+import os
+import re
+import time
+from array import array
+from datetime import datetime, timezone
+import numpy as np
+from scipy.sparse import csr_matrix
+from model.interactions import EXCLUDED_STATUSES, CompactInteractions, pair_weights
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COLUMNAR_FORMAT = 1
+NO_DATE = np.iinfo(np.int64).min
+_SEPARATORS = re.compile(r'[\s,]*')
+
+def iter_bookings(path, chunk_size=1 << 16):
+    """
+    Yield the bookings of a JSON array dump one at a time
+
+    The file is read in chunks and each array element is decoded as soon
+    as it is complete, so memory stays bounded by one chunk plus one booking
+    instead of the whole file and every parsed dict.
+
+    Parameters:
+    - path: Dump shaped like enhanced_cf_data.json
+    - chunk_size: Characters read per chunk
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buffer = f.read(chunk_size).lstrip()
+        while not buffer:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            buffer = chunk.lstrip()
+        if buffer[:1] != '[':
+            raise ValueError(f"{path} is not a JSON array")
+        pos = 1
+        eof = False
+
+        while True:
+            pos = _SEPARATORS.match(buffer, pos).end()
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+
+            booking = None
+            if pos < len(buffer):
+                try:
+                    booking, end = decoder.raw_decode(buffer, pos)
+                    # A scalar cut at the chunk end may still go on in the next chunk
+                    if end < len(buffer) or eof:
+                        pos = end
+                    else:
+                        booking = None
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+
+            if booking is not None:
+                yield booking
+                continue
+
+            if eof:
+                raise ValueError(f"Unterminated JSON array in {path}")
+            # The next element spans the chunk boundary: keep its start and read on
+            chunk = f.read(chunk_size)
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            eof = not chunk
+
+def parse_timestamp(value):
+    """Booking date as epoch seconds (ISO dates/times or epoch milliseconds), NO_DATE if absent"""
+    if value is None or value == "":
+        return NO_DATE
+    try:
+        if isinstance(value, (int, float)) or str(value).isdigit():
+            value = float(value)
+            return int(value / 1000 if value > 1e11 else value)
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp())
+    except ValueError:
+        return NO_DATE
+
+class BookingColumns:
+    """
+    Bookings of a dump as columns over interned user and package IDs
+
+    One entry per booking in rows/cols (int32 user/package indices),
+    ratings (float32, NaN if missing), statuses (int8 codes into
+    status_names) and dates (int64 epoch seconds, NO_DATE if missing), plus
+    the package table in column order. Built on the fly from a booking
+    stream, or memory-mapped from a directory written by save().
+    """
+
+    def __init__(self, user_ids, package_ids, packages, rows, cols, ratings, statuses, status_names, dates,
+                 counts=None):
+        self.user_ids = user_ids
+        self.package_ids = package_ids
+        self.packages = packages
+        self.rows = rows
+        self.cols = cols
+        self.ratings = ratings
+        self.statuses = statuses
+        self.status_names = status_names
+        self.dates = dates
+        self._counts = counts
+
+    @classmethod
+    def from_bookings(cls, bookings):
+        """
+        Intern a stream of booking dicts without holding them
+
+        Parameters:
+        - bookings: Iterable of bookings with embedded user and package, e.g.
+          iter_bookings(path)
+
+        Returns:
+        - BookingColumns; packages keep the last seen version of each
+        """
+        user_index, package_index, status_index = {}, {}, {}
+        # Dumps repeat few distinct dates; parse each once
+        timestamps = {}
+        packages = []
+        rows, cols, statuses = array('i'), array('i'), array('b')
+        ratings, dates = array('f'), array('q')
+
+        for booking in bookings:
+            user = booking.get('user') or {}
+            package = booking.get('package') or {}
+            if not user.get('id') or not package.get('id'):
+                continue
+
+            rows.append(user_index.setdefault(user['id'], len(user_index)))
+            col = package_index.get(package['id'])
+            if col is None:
+                col = package_index[package['id']] = len(packages)
+                packages.append(package)
+            else:
+                packages[col] = package
+            cols.append(col)
+
+            rating = booking.get('rating')
+            ratings.append(float(rating) if rating is not None else np.nan)
+            statuses.append(status_index.setdefault(str(booking.get('status') or '').upper(), len(status_index)))
+            date = booking.get('date')
+            timestamp = timestamps.get(date) if isinstance(date, str) else None
+            if timestamp is None:
+                timestamp = parse_timestamp(date)
+                if isinstance(date, str):
+                    timestamps[date] = timestamp
+            dates.append(timestamp)
+
+        return cls(list(user_index), list(package_index), packages,
+                   np.frombuffer(rows, dtype=np.int32), np.frombuffer(cols, dtype=np.int32),
+                   np.frombuffer(ratings, dtype=np.float32), np.frombuffer(statuses, dtype=np.int8),
+                   list(status_index), np.frombuffer(dates, dtype=np.int64))
+
+    @classmethod
+    def from_file(cls, path):
+        """Stream a JSON dump, or memory-map a directory written by save()"""
+        start = time.perf_counter()
+        columns = cls.load(path) if os.path.isdir(path) else cls.from_bookings(iter_bookings(path))
+        logger.info(f"Loaded {len(columns)} bookings, {len(columns.user_ids)} users and "
+                    f"{len(columns.package_ids)} packages from {path} in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return columns
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def counts(self):
+        """User x package CSR matrix of booking counts"""
+        if self._counts is None:
+            counts = csr_matrix((np.ones(len(self.rows), dtype=np.float32), (self.rows, self.cols)),
+                                shape=(len(self.user_ids), len(self.package_ids)))
+            counts.sum_duplicates()
+            self._counts = counts
+        return self._counts
+
+    def active(self):
+        """Boolean mask of the bookings that count as interactions (not cancelled), as in InteractionStore"""
+        excluded = [code for code, name in enumerate(self.status_names) if name in EXCLUDED_STATUSES]
+        return ~np.isin(self.statuses, excluded)
+
+    def interactions(self, weighting=None):
+        """
+        CompactInteractions over the bookings, skipping cancelled ones
+
+        Parameters:
+        - weighting: Optional ConfidenceWeights; matrix values are then each
+          pair's strongest booking confidence instead of 1.0
+        """
+        active = self.active()
+        rows, cols = self.rows, self.cols
+        if active.all():
+            counts = self.counts
+        else:
+            rows, cols = rows[active], cols[active]
+            counts = csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                                shape=(len(self.user_ids), len(self.package_ids)))
+            counts.sum_duplicates()
+        matrix = None
+        if weighting is not None:
+            weights = pair_weights(counts, rows, cols, weighting.column_weights(self)[active])
+            matrix = csr_matrix((weights, counts.indices, counts.indptr), shape=counts.shape)
+        return CompactInteractions(counts, self.user_ids, self.package_ids, matrix=matrix)
+
+    def save(self, directory):
+        """
+        Write the columns as .npy files (plus the package table as JSON)
+
+        Every array can then be memory-mapped by load(), so opening a dump
+        costs milliseconds regardless of its size.
+        """
+        os.makedirs(directory, exist_ok=True)
+        counts = self.counts
+        columns = {
+            "rows": self.rows,
+            "cols": self.cols,
+            "ratings": self.ratings,
+            "statuses": self.statuses,
+            "dates": self.dates,
+            "user_ids": np.asarray(self.user_ids, dtype=str),
+            "package_ids": np.asarray(self.package_ids, dtype=str),
+            "counts_data": counts.data,
+            "counts_indices": counts.indices,
+            "counts_indptr": counts.indptr,
+        }
+        for name, column in columns.items():
+            np.save(os.path.join(directory, f"{name}.npy"), column)
+
+        with open(os.path.join(directory, "packages.json"), "w") as f:
+            json.dump(self.packages, f)
+        # Written last: a directory without meta.json is incomplete
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"format": COLUMNAR_FORMAT, "bookings": len(self), "status_names": self.status_names}, f)
+        logger.info(f"Saved {len(self)} bookings as columns to {directory}")
+
+    @classmethod
+    def load(cls, directory):
+        """Memory-map a directory written by save()"""
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("format") != COLUMNAR_FORMAT:
+            raise ValueError(f"Unsupported columnar dump format in {directory}")
+        with open(os.path.join(directory, "packages.json")) as f:
+            packages = json.load(f)
+
+        def column(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+
+        user_ids = column("user_ids").tolist()
+        package_ids = column("package_ids").tolist()
+        counts = csr_matrix((column("counts_data"), column("counts_indices"), column("counts_indptr")),
+                            shape=(len(user_ids), len(package_ids)), copy=False)
+        return cls(user_ids, package_ids, packages, column("rows"), column("cols"), column("ratings"),
+                   column("statuses"), meta["status_names"], column("dates"), counts=counts)
@@ -0,0 +1,343 @@
+import logging
+import time
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.utils.extmath import randomized_svd
+from model.ann import IVFIndex
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FactorModel:
+    """
+    Matrix factorization of the sparse user x package interaction matrix
+
+    Supports implicit-feedback ALS (Hu, Koren & Volinsky) and randomized
+    truncated SVD. Both work directly on the CSR matrix, so there is no dense
+    conversion and no size limit. User and item factors are plain float32
+    arrays that can be saved with save() and reloaded with load(); scoring a
+    user is a single dot product against the item factors, or an IVF
+    approximate search once the catalog has at least ann_min_items packages.
+    """
+
+    def __init__(self, factors=32, method='als', regularization=0.1, alpha=20.0, iterations=15,
+                 cg_steps=3, batch_nnz=500_000, seed=42, ann_min_items=2000, ann_nprobe=8):
+        self.factors = factors
+        self.method = method
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.cg_steps = cg_steps
+        self.batch_nnz = batch_nnz
+        self.seed = seed
+        self.ann_min_items = ann_min_items
+        self.ann_nprobe = ann_nprobe
+
+        self.ann_index = None
+        self.user_factors = None
+        self.item_factors = None
+        self.singular_values = None
+        self.user_ids = []
+        self.package_ids = []
+        self.package_index = {}
+        self.version = -1
+        self.stats = {"fit_ms": 0.0}
+
+    @property
+    def ready(self):
+        return self.item_factors is not None
+
+    def fit(self, matrix, package_ids, user_ids=None, version=0):
+        """
+        Learn user and item factors
+
+        Parameters:
+        - matrix: User x package CSR matrix (binary or confidence weights)
+        - package_ids: Package ID of each column
+        - user_ids: Optional user ID of each row
+        - version: Interaction store version the matrix was taken at
+        """
+        start = time.perf_counter()
+        matrix = matrix.tocsr().astype(np.float32)
+
+        if self.method == 'svd':
+            user_factors, item_factors, singular_values = self._fit_svd(matrix)
+        else:
+            user_factors, item_factors = self._fit_als(matrix)
+            singular_values = None
+
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.singular_values = singular_values
+        self.user_ids = list(user_ids or [])
+        self.package_ids = list(package_ids)
+        self.package_index = {pid: idx for idx, pid in enumerate(self.package_ids)}
+        self.version = version
+        self._build_ann()
+
+        self.stats["fit_ms"] = (time.perf_counter() - start) * 1000
+        logger.info(f"Fitted {self.method} factor model ({item_factors.shape[1]} factors) on "
+                    f"{matrix.shape[0]}x{matrix.shape[1]} matrix in {self.stats['fit_ms']:.1f} ms")
+        return self
+
+    def _build_ann(self):
+        """Index item factors for approximate search on large catalogs"""
+        if len(self.package_ids) >= self.ann_min_items:
+            self.ann_index = IVFIndex(nprobe=self.ann_nprobe, seed=self.seed).train(self.item_factors)
+        else:
+            self.ann_index = None
+
+    def add_items(self, package_ids, vectors):
+        """
+        Append factors for new packages without refitting
+
+        Parameters:
+        - package_ids: IDs of the new packages
+        - vectors: Their item factor vectors
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(package_ids), -1)
+        for package_id in package_ids:
+            self.package_index[package_id] = len(self.package_ids)
+            self.package_ids.append(package_id)
+        self.item_factors = np.vstack([self.item_factors, vectors])
+
+        if self.ann_index is not None:
+            self.ann_index.add(vectors)
+        elif len(self.package_ids) >= self.ann_min_items:
+            self._build_ann()
+
+    def _fit_svd(self, matrix):
+        components = max(1, min(self.factors, min(matrix.shape) - 1))
+        u, s, vt = randomized_svd(matrix, n_components=components, random_state=self.seed)
+        scale = np.sqrt(s)
+        return ((u * scale).astype(np.float32), (vt.T * scale).astype(np.float32),
+                s.astype(np.float32))
+
+    def _fit_als(self, matrix):
+        rng = np.random.default_rng(self.seed)
+        user_factors = (rng.standard_normal((matrix.shape[0], self.factors)) * 0.01).astype(np.float32)
+        item_factors = (rng.standard_normal((matrix.shape[1], self.factors)) * 0.01).astype(np.float32)
+        transposed = matrix.T.tocsr()
+
+        for _ in range(self.iterations):
+            user_factors = self._als_step(matrix, item_factors, user_factors)
+            item_factors = self._als_step(transposed, user_factors, item_factors)
+        return user_factors, item_factors
+
+    def _als_step(self, matrix, fixed, current):
+        """Update every row's factors against the fixed factors, in row chunks"""
+        gram = fixed.T @ fixed + self.regularization * np.eye(fixed.shape[1], dtype=np.float32)
+        solved = np.empty_like(current)
+
+        start = 0
+        while start < matrix.shape[0]:
+            # Bound each chunk by nnz so the per-interaction temporaries stay small
+            limit = matrix.indptr[start] + self.batch_nnz
+            end = max(start + 1, int(np.searchsorted(matrix.indptr, limit, side='right')) - 1)
+            end = min(end, matrix.shape[0])
+            solved[start:end] = self._solve_rows(matrix[start:end], fixed, gram, current[start:end])
+            start = end
+
+        return solved
+
+    def _solve_rows(self, chunk, fixed, gram, x):
+        """
+        Conjugate-gradient solve of A_u x_u = b_u for all rows of a chunk
+
+        A_u = G + sum_i alpha*r_ui y_i y_i^T and b_u = sum_i (1 + alpha*r_ui) y_i.
+        A_u is applied matrix-free, so a step costs O(nnz * factors) and no
+        factors x factors matrix is formed per row. Warm-started from the
+        previous iteration's factors, a few steps per sweep are enough.
+        """
+        confidence = self.alpha * chunk.data
+        row_of = np.repeat(np.arange(chunk.shape[0]), np.diff(chunk.indptr))
+        vectors = fixed[chunk.indices]
+
+        def apply(p):
+            dots = np.einsum('ij,ij->i', vectors, p[row_of])
+            weighted = csr_matrix((confidence * dots, chunk.indices, chunk.indptr), shape=chunk.shape)
+            return p @ gram + weighted @ fixed
+
+        rhs = csr_matrix((1.0 + confidence, chunk.indices, chunk.indptr), shape=chunk.shape) @ fixed
+        x = x.copy()
+        residual = rhs - apply(x)
+        direction = residual.copy()
+        residual_norm = np.einsum('ij,ij->i', residual, residual)
+
+        for _ in range(self.cg_steps):
+            applied = apply(direction)
+            curvature = np.einsum('ij,ij->i', direction, applied)
+            step = np.divide(residual_norm, curvature, out=np.zeros_like(residual_norm), where=curvature > 0)
+            x += step[:, None] * direction
+            residual -= step[:, None] * applied
+
+            new_norm = np.einsum('ij,ij->i', residual, residual)
+            beta = np.divide(new_norm, residual_norm, out=np.zeros_like(new_norm), where=residual_norm > 0)
+            direction = residual + beta[:, None] * direction
+            residual_norm = new_norm
+
+        return x
+
+    def fold_in(self, package_cols, weights=None):
+        """
+        User vector for a set of booked package columns
+
+        Folding in from the user's current bookings keeps request-time scores
+        fresh without refitting the model.
+        """
+        package_cols = np.asarray(package_cols, dtype=np.int32)
+        weights = np.ones(len(package_cols), dtype=np.float32) if weights is None else np.asarray(weights)
+        vectors = self.item_factors[package_cols]
+
+        if self.method == 'svd':
+            # u = x V S^-1/2 with item factors Q = V S^1/2, i.e. x Q / S
+            return (weights @ vectors) / self.singular_values
+
+        gram = self.item_factors.T @ self.item_factors
+        gram += self.regularization * np.eye(gram.shape[0], dtype=np.float32)
+        confidence = self.alpha * weights
+        lhs = gram + (vectors * confidence[:, None]).T @ vectors
+        rhs = (vectors * (1.0 + confidence)[:, None]).sum(axis=0)
+        return np.linalg.solve(lhs, rhs)
+
+    def score(self, user_vector):
+        """Scores of every package for a user vector (one dot product)"""
+        return self.item_factors @ user_vector
+
+    def recommend(self, user_package_ids, k=10, weights=None):
+        """
+        Top-k unbooked packages for a user's booked package IDs
+
+        Parameters:
+        - weights: Optional dict of package_id -> confidence to fold in with
+          (1.0 for packages not listed)
+
+        Returns:
+        - list of (package_id, score) tuples, best first
+        """
+        booked_ids = [pid for pid in user_package_ids if pid in self.package_index]
+        booked_cols = [self.package_index[pid] for pid in booked_ids]
+        if not booked_cols:
+            return []
+
+        user_vector = self.fold_in(booked_cols, None if weights is None else
+                                   np.asarray([weights.get(pid, 1.0) for pid in booked_ids], dtype=np.float32))
+        if self.ann_index is not None:
+            ids, scores = self.ann_index.search(user_vector, k, exclude=booked_cols)
+            return [(self.package_ids[idx], float(score)) for idx, score in zip(ids, scores)]
+
+        scores = self.score(user_vector).astype(np.float64)
+        scores[booked_cols] = -np.inf
+
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(self.package_ids[idx], float(scores[idx])) for idx in top]
+
+    def fold_in_batch(self, user_rows):
+        """
+        User vectors for many users at once
+
+        Parameters:
+        - user_rows: users x items CSR matrix of booking weights, in the
+          model's item column order
+
+        Returns:
+        - users x factors array
+        """
+        user_rows = user_rows.tocsr().astype(np.float32)
+        if self.method == 'svd':
+            return (user_rows @ self.item_factors) / self.singular_values
+
+        gram = self.item_factors.T @ self.item_factors
+        gram += self.regularization * np.eye(gram.shape[0], dtype=np.float32)
+
+        # Per-user A_u = G + sum_i alpha*w_ui y_i y_i^T, accumulated from the nnz entries
+        vectors = self.item_factors[user_rows.indices]
+        confidence = self.alpha * user_rows.data
+        outer = ((vectors * confidence[:, None])[:, :, None] * vectors[:, None, :]).reshape(len(vectors), -1)
+        per_row = csr_matrix((np.ones(len(vectors), dtype=np.float32), np.arange(len(vectors)),
+                              user_rows.indptr), shape=(user_rows.shape[0], len(vectors)))
+        lhs = (per_row @ outer).reshape((user_rows.shape[0],) + gram.shape) + gram
+
+        rhs = csr_matrix((1.0 + confidence, user_rows.indices, user_rows.indptr),
+                         shape=user_rows.shape) @ self.item_factors
+        return np.linalg.solve(lhs, rhs[:, :, None])[:, :, 0]
+
+    def recommend_batch(self, user_rows, k=10):
+        """
+        Top-k unbooked packages for many users from one matrix-matrix product
+
+        Parameters:
+        - user_rows: users x items CSR matrix of booked packages (binary or
+          confidence weights), in the model's item column order
+        - k: Number of recommendations per user
+
+        Returns:
+        - list with, per user, a list of (package_id, score) tuples, best first
+        """
+        user_rows = user_rows.tocsr()
+        booked = np.diff(user_rows.indptr) > 0
+        results = [[] for _ in range(user_rows.shape[0])]
+        if not booked.any():
+            return results
+
+        rows = np.flatnonzero(booked)
+        active = user_rows[rows]
+        user_vectors = self.fold_in_batch(active)
+
+        if self.ann_index is not None:
+            for row, vector, start, end in zip(rows, user_vectors, active.indptr[:-1], active.indptr[1:]):
+                ids, scores = self.ann_index.search(vector, k, exclude=active.indices[start:end])
+                results[row] = [(self.package_ids[idx], float(score)) for idx, score in zip(ids, scores)]
+            return results
+
+        scores = (user_vectors @ self.item_factors.T).astype(np.float64)
+        scores[np.repeat(np.arange(len(rows)), np.diff(active.indptr)), active.indices] = -np.inf
+
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        for row, ids, row_scores in zip(rows, top, top_scores):
+            results[row] = [(self.package_ids[idx], float(score))
+                            for idx, score in zip(ids, row_scores) if np.isfinite(score)]
+        return results
+
+    def save(self, path):
+        """Persist factor arrays and id maps to an .npz file"""
+        np.savez(
+            path,
+            user_factors=self.user_factors,
+            item_factors=self.item_factors,
+            singular_values=self.singular_values if self.singular_values is not None else np.zeros(0),
+            user_ids=np.asarray(self.user_ids, dtype=str),
+            package_ids=np.asarray(self.package_ids, dtype=str),
+            params=np.asarray([self.factors, self.regularization, self.alpha, self.version,
+                               self.ann_min_items, self.ann_nprobe], dtype=np.float64),
+            method=np.asarray(self.method),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load a model written by save()"""
+        with np.load(path) as saved:
+            factors, regularization, alpha, version, ann_min_items, ann_nprobe = saved['params']
+            model = cls(factors=int(factors), method=str(saved['method']),
+                        regularization=float(regularization), alpha=float(alpha),
+                        ann_min_items=int(ann_min_items), ann_nprobe=int(ann_nprobe))
+            model.user_factors = saved['user_factors']
+            model.item_factors = saved['item_factors']
+            model.singular_values = saved['singular_values'] if len(saved['singular_values']) else None
+            model.user_ids = saved['user_ids'].tolist()
+            model.package_ids = saved['package_ids'].tolist()
+            model.package_index = {pid: idx for idx, pid in enumerate(model.package_ids)}
+            model.version = int(version)
+        model._build_ann()
+        return model
@@ -0,0 +1,97 @@
+import logging
+from model.cf import collaborative_filtering_batch
+from model.cbf import content_based_filtering_batch
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def combine_recommendations(cf_recommendations, cbf_recommendations, user_booked_ids, popular_ids):
+    """
+    Merge CF and CBF results into one list without booked packages
+
+    Parameters:
+    - cf_recommendations: Package IDs from collaborative filtering
+    - cbf_recommendations: Package IDs from content-based filtering
+    - user_booked_ids: Set of package IDs the user has booked
+    - popular_ids: Package IDs by popularity, or a callable returning them,
+      used when nothing else is left
+
+    Returns:
+    - list of package IDs
+    """
+    combined_ids = dict.fromkeys(cf_recommendations + cbf_recommendations)
+    recommendations = [pkg_id for pkg_id in combined_ids if pkg_id not in user_booked_ids]
+
+    if not recommendations:
+        # Use packages with most bookings as fallback
+        for pkg_id in popular_ids() if callable(popular_ids) else popular_ids:
+            if pkg_id not in user_booked_ids:
+                recommendations.append(pkg_id)
+                if len(recommendations) >= 4:
+                    break
+        logger.info(f"Popularity fallback generated {len(recommendations)} recommendations")
+
+    return recommendations
+
+def users_booked_packages(interactions, user_ids, package_map):
+    """
+    Booked packages of many users from the interaction store
+
+    Parameters:
+    - interactions: InteractionStore
+    - user_ids: IDs of the users
+    - package_map: Dict mapping package_id -> catalog package
+
+    Returns:
+    - per user, their booked catalog packages with one entry per booking
+    """
+    with interactions.lock:
+        counts = interactions.counts
+        package_ids = interactions.package_ids
+        rows = [interactions.user_index.get(uid) for uid in user_ids]
+
+    users_packages = []
+    for row in rows:
+        user_packages = []
+        if row is not None:
+            start, end = counts.indptr[row], counts.indptr[row + 1]
+            for col, count in zip(counts.indices[start:end], counts.data[start:end]):
+                pkg = package_map.get(package_ids[col])
+                if pkg is not None:
+                    user_packages.extend([pkg] * int(count))
+        users_packages.append(user_packages)
+
+    return users_packages
+
+def hybrid_recommendations_batch(user_ids, users_packages, interactions, all_packages, popular_ids,
+                                 item_index=None, factor_model=None, text_index=None):
+    """
+    CF + CBF + popularity recommendations for many users over shared matrices
+
+    Parameters:
+    - user_ids: IDs of the users
+    - users_packages: Per user, their booked catalog packages
+    - interactions: InteractionStore
+    - all_packages: List of all available packages
+    - popular_ids: Package IDs by popularity
+    - item_index: Optional ItemNeighbourIndex
+    - factor_model: Optional FactorModel
+    - text_index: CatalogTextIndex used for content-based scoring
+
+    Yields:
+    - (user_id, recommended package IDs, CF count, CBF count), in input order
+    """
+    cf_results = collaborative_filtering_batch(
+        user_ids, interactions, all_packages=all_packages, item_index=item_index, factor_model=factor_model,
+        popular_ids=popular_ids
+    )
+    cbf_results = content_based_filtering_batch(users_packages, all_packages, text_index)
+
+    for (uid, cf_recommendations), cbf_recommendations, user_packages in zip(
+            cf_results, cbf_results, users_packages):
+        user_booked_ids = {pkg['id'] for pkg in user_packages}
+        recommendations = combine_recommendations(
+            cf_recommendations, cbf_recommendations, user_booked_ids, popular_ids
+        )
+        yield uid, recommendations, len(cf_recommendations), len(cbf_recommendations)
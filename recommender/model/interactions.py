@@ -0,0 +1,600 @@
+import logging
+import sys
+import threading
+import time
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Booking statuses that are not interactions (cancelled bookings stay in the booking history)
+EXCLUDED_STATUSES = {"CANCELLED", "CANCELED"}
+
+def is_active_booking(booking):
+    """Whether a booking or interaction dict counts as an interaction"""
+    return str(booking.get('status') or '').upper() not in EXCLUDED_STATUSES
+
+def row_sizes(matrix):
+    """Per-user sum of interaction values: booked set sizes, or total confidence when weighted"""
+    return np.bincount(np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr)), weights=matrix.data,
+                       minlength=matrix.shape[0])
+
+def column_sizes(matrix):
+    """Per-package sum of interaction values: users who booked it, or their total confidence"""
+    return np.bincount(matrix.indices, weights=matrix.data, minlength=matrix.shape[1])
+
+def pair_weights(counts, rows, cols, weights):
+    """
+    Strongest booking weight of each (user, package) pair
+
+    Parameters:
+    - counts: Canonical CSR count matrix built from the same rows and cols
+    - rows, cols: User row and package column of every booking
+    - weights: Confidence of every booking
+
+    Returns:
+    - float32 array with one weight per stored entry of counts, in its order
+    """
+    keys = np.asarray(rows, dtype=np.int64) * counts.shape[1] + np.asarray(cols, dtype=np.int64)
+    order = np.argsort(keys, kind='stable')
+    keys, weights = keys[order], np.asarray(weights, dtype=np.float32)[order]
+    if not len(keys):
+        return np.zeros(0, dtype=np.float32)
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    return np.maximum.reduceat(weights, starts)
+
+class InteractionStore:
+    """
+    Process-resident user x package interaction store
+
+    Keeps the user x package CSR matrix (booking counts), the user/package
+    index maps and per-package / per-user id sets in memory. Booking deltas
+    update the sets immediately and are queued for the CSR matrix, which is
+    compacted on the next read, so requests never re-fetch or re-derive
+    the interaction data.
+
+    With a weighting (ConfidenceWeights), the values of matrix are the
+    confidence of each pair's strongest booking instead of 1.0.
+    """
+
+    def __init__(self, weighting=None):
+        self.lock = threading.RLock()
+        self.weighting = weighting
+
+        # Index maps: row/column position <-> backend id
+        self.user_ids = []
+        self.user_index = {}
+        self.package_ids = []
+        self.package_index = {}
+
+        # package_id -> set(user_id), user_id -> set(package_id)
+        self.package_users = {}
+        self.user_packages = {}
+
+        self._counts = csr_matrix((0, 0), dtype=np.float32)
+        self._matrix = self._counts
+        self._pending = {}
+        # (row, col) -> new pair weight, applied with the pending counts
+        self._pending_weights = {}
+        self._sizes = None
+
+        # package column -> store version of its last change
+        self.package_changed_at = {}
+
+        self.version = 0
+        self.stats = {
+            "updates": 0,
+            "compactions": 0,
+            "last_compaction_ms": 0.0,
+        }
+
+    @classmethod
+    def from_interactions(cls, interactions, package_ids=(), weighting=None):
+        """
+        Build a store from a stream of booking interactions
+
+        Parameters:
+        - interactions: Iterable of dicts with 'userId' and 'packageId'
+          (plus 'status', 'date' and 'rating' used by a weighting);
+          cancelled bookings are skipped
+        - package_ids: Catalog package IDs to register even if never booked
+        - weighting: Optional ConfidenceWeights for the matrix values
+
+        Returns:
+        - InteractionStore
+        """
+        store = cls(weighting)
+        store.add_packages(package_ids)
+
+        rows, cols = [], []
+        weighed = []
+        for interaction in interactions:
+            uid = interaction.get('userId')
+            package_id = interaction.get('packageId')
+            if not uid or not package_id or not is_active_booking(interaction):
+                continue
+
+            rows.append(store._user_row(uid))
+            cols.append(store._package_col(package_id))
+            store.package_users[package_id].add(uid)
+            store.user_packages[uid].add(package_id)
+            if weighting is not None:
+                weighed.append(interaction)
+
+        # Duplicate (row, col) pairs are summed into booking counts
+        data = np.ones(len(rows), dtype=np.float32)
+        counts = csr_matrix(
+            (data, (np.asarray(rows, dtype=np.int32), np.asarray(cols, dtype=np.int32))),
+            shape=(len(store.user_ids), len(store.package_ids))
+        )
+        counts.sum_duplicates()
+        weights = None
+        if weighting is not None:
+            weights = pair_weights(counts, rows, cols, weighting.booking_weights(weighed))
+        store._set_counts(counts, weights)
+
+        logger.info(f"Loaded interaction store: {len(store.user_ids)} users, "
+                    f"{len(store.package_ids)} packages, {store._counts.nnz} interactions")
+        return store
+
+    def _user_row(self, user_id):
+        row = self.user_index.get(user_id)
+        if row is None:
+            row = len(self.user_ids)
+            self.user_index[user_id] = row
+            self.user_ids.append(user_id)
+            self.user_packages[user_id] = set()
+        return row
+
+    def _package_col(self, package_id):
+        col = self.package_index.get(package_id)
+        if col is None:
+            col = len(self.package_ids)
+            self.package_index[package_id] = col
+            self.package_ids.append(package_id)
+            self.package_users[package_id] = set()
+        return col
+
+    def _set_counts(self, counts, weights=None):
+        """Install a canonical count matrix; weights hold one value per stored entry (1.0 if None)"""
+        counts.sum_duplicates()
+        # Binary (or weighted) view shares the index arrays of the count matrix
+        self._counts = counts
+        self._matrix = csr_matrix(
+            (np.ones_like(counts.data) if weights is None else weights, counts.indices, counts.indptr),
+            shape=counts.shape
+        )
+
+    def _weight(self, row, col):
+        """Current weight of a pair (0 if never booked)"""
+        weight = self._pending_weights.get((row, col))
+        if weight is None and row < self._matrix.shape[0] and col < self._matrix.shape[1]:
+            weight = self._matrix[row, col]
+        return float(weight or 0.0)
+
+    def _count(self, row, col):
+        count = self._pending.get((row, col), 0.0)
+        if row < self._counts.shape[0] and col < self._counts.shape[1]:
+            count += self._counts[row, col]
+        return count
+
+    def add_packages(self, package_ids):
+        """Register catalog packages (new columns start with no interactions)"""
+        with self.lock:
+            for package_id in package_ids:
+                self._package_col(package_id)
+
+    def add_booking(self, user_id, package_id, weight=1.0):
+        """
+        Apply a 'booking added' delta in O(1)
+
+        Parameters:
+        - weight: Confidence of the booking when the store is weighted; the
+          pair keeps its strongest booking's weight
+        """
+        with self.lock:
+            row = self._user_row(user_id)
+            col = self._package_col(package_id)
+            self._pending[(row, col)] = self._pending.get((row, col), 0.0) + 1.0
+            if self.weighting is not None:
+                self._pending_weights[(row, col)] = max(self._weight(row, col), weight)
+            self.package_users[package_id].add(user_id)
+            self.user_packages[user_id].add(package_id)
+            self._touch([col])
+
+    def cancel_booking(self, user_id, package_id):
+        """Apply a 'booking cancelled' delta; the pair stays if other bookings remain"""
+        with self.lock:
+            row = self.user_index.get(user_id)
+            col = self.package_index.get(package_id)
+            if row is None or col is None:
+                return False
+
+            count = self._count(row, col)
+            if count <= 0:
+                return False
+
+            self._pending[(row, col)] = self._pending.get((row, col), 0.0) - 1.0
+            if count <= 1:
+                self.package_users[package_id].discard(user_id)
+                self.user_packages[user_id].discard(package_id)
+            self._touch([col])
+            return True
+
+    def sync_user(self, user_id, user_bookings):
+        """
+        Reconcile one user's row with their fresh booking history
+
+        Parameters:
+        - user_id: ID of the user
+        - user_bookings: List of booking objects with embedded packages;
+          cancelled bookings are not interactions
+
+        Returns:
+        - True if the stored row changed
+        """
+        history = {}
+        valid = [booking for booking in user_bookings
+                 if booking.get('package') and booking['package'].get('id') and is_active_booking(booking)]
+        for booking in valid:
+            package_id = booking['package']['id']
+            history[package_id] = history.get(package_id, 0) + 1
+
+        history_weights = {}
+        if self.weighting is not None:
+            for booking, weight in zip(valid, self.weighting.booking_weights(valid)):
+                package_id = booking['package']['id']
+                history_weights[package_id] = max(history_weights.get(package_id, 0.0), float(weight))
+
+        with self.lock:
+            row = self._user_row(user_id)
+            changed_cols = []
+
+            for package_id in self.user_packages[user_id] - history.keys():
+                col = self.package_index[package_id]
+                self._pending[(row, col)] = self._pending.get((row, col), 0.0) - self._count(row, col)
+                self.package_users[package_id].discard(user_id)
+                changed_cols.append(col)
+
+            for package_id, count in history.items():
+                col = self._package_col(package_id)
+                delta = count - self._count(row, col)
+                if delta:
+                    self._pending[(row, col)] = self._pending.get((row, col), 0.0) + delta
+                    changed_cols.append(col)
+                weight = history_weights.get(package_id)
+                if weight is not None and weight != self._weight(row, col):
+                    self._pending_weights[(row, col)] = weight
+                    if not delta:
+                        # A weight change alone still changes the matrix
+                        self._pending[(row, col)] = self._pending.get((row, col), 0.0)
+                        changed_cols.append(col)
+                self.package_users[package_id].add(user_id)
+
+            self.user_packages[user_id] = set(history)
+            if changed_cols:
+                self._touch(changed_cols)
+            return bool(changed_cols)
+
+    def _touch(self, package_cols):
+        self.version += 1
+        self.stats["updates"] += 1
+        for col in package_cols:
+            self.package_changed_at[col] = self.version
+
+    def changed_packages(self, since_version):
+        """Package columns whose interactions changed after since_version"""
+        with self.lock:
+            return [col for col, version in self.package_changed_at.items() if version > since_version]
+
+    def _compact(self):
+        start = time.perf_counter()
+        shape = (len(self.user_ids), len(self.package_ids))
+        counts = self._counts.tocoo()
+
+        rows = [counts.row]
+        cols = [counts.col]
+        data = [counts.data]
+        if self._pending:
+            keys = np.array(list(self._pending.keys()), dtype=np.int32)
+            rows.append(keys[:, 0])
+            cols.append(keys[:, 1])
+            data.append(np.fromiter(self._pending.values(), dtype=np.float32, count=len(self._pending)))
+
+        counts = csr_matrix(
+            (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+            shape=shape
+        )
+        counts.sum_duplicates()
+        counts.eliminate_zeros()
+        self._set_counts(counts, self._merged_weights(counts) if self.weighting is not None else None)
+        self._pending = {}
+        self._pending_weights = {}
+
+        self.stats["compactions"] += 1
+        self.stats["last_compaction_ms"] = (time.perf_counter() - start) * 1000
+
+    def _merged_weights(self, counts):
+        """Weights of the compacted pairs: pending weights override the stored ones"""
+        num_cols = counts.shape[1]
+        current = self._matrix.tocoo()
+        keys = [current.row.astype(np.int64) * num_cols + current.col]
+        values = [current.data.astype(np.float32)]
+        if self._pending_weights:
+            pending = np.array(list(self._pending_weights.keys()), dtype=np.int64)
+            keys.append(pending[:, 0] * num_cols + pending[:, 1])
+            values.append(np.fromiter(self._pending_weights.values(), dtype=np.float32,
+                                      count=len(self._pending_weights)))
+        keys, values = np.concatenate(keys), np.concatenate(values)
+
+        # Last occurrence wins: unique over the reversed arrays keeps pending values
+        unique_keys, first = np.unique(keys[::-1], return_index=True)
+        unique_values = values[::-1][first]
+
+        rows = np.repeat(np.arange(counts.shape[0], dtype=np.int64), np.diff(counts.indptr))
+        wanted = rows * num_cols + counts.indices
+        found = np.minimum(np.searchsorted(unique_keys, wanted), max(0, len(unique_keys) - 1))
+        matched = unique_keys[found] == wanted if len(unique_keys) else np.zeros(len(wanted), dtype=bool)
+        return np.where(matched, unique_values[found] if len(unique_keys) else 0.0, 1.0).astype(np.float32)
+
+    def _ensure_compact(self):
+        shape = (len(self.user_ids), len(self.package_ids))
+        if self._pending or self._counts.shape != shape:
+            self._compact()
+
+    @property
+    def matrix(self):
+        """Binary (or confidence-weighted) user x package CSR matrix, with pending deltas applied"""
+        with self.lock:
+            self._ensure_compact()
+            return self._matrix
+
+    @property
+    def counts(self):
+        """User x package CSR matrix of booking counts"""
+        with self.lock:
+            self._ensure_compact()
+            return self._counts
+
+    def sizes(self):
+        """
+        Per-user and per-package sums of the matrix values, cached until it changes
+
+        Booked set sizes for a binary matrix, summed confidence when weighted.
+        """
+        with self.lock:
+            matrix = self.matrix
+            if self._sizes is None or self._sizes[0] is not matrix:
+                self._sizes = (matrix, row_sizes(matrix), column_sizes(matrix))
+            return self._sizes[1], self._sizes[2]
+
+    @property
+    def num_users(self):
+        return len(self.user_ids)
+
+    @property
+    def num_packages(self):
+        return len(self.package_ids)
+
+    def view(self):
+        """
+        Read-only view of the store at its current version
+
+        Compaction builds new CSR objects instead of mutating them, so the
+        view only takes references under the lock; scoring on it then runs
+        without holding the store lock.
+        """
+        with self.lock:
+            return InteractionView(self)
+
+    def memory_usage(self):
+        """
+        Approximate memory held by the store, in bytes
+
+        Returns:
+        - dict with per-structure sizes and the interaction count
+        """
+        with self.lock:
+            counts = self._counts
+            matrix_bytes = (counts.data.nbytes + counts.indices.nbytes +
+                            counts.indptr.nbytes + self._matrix.data.nbytes)
+            set_bytes = sum(sys.getsizeof(users) for users in self.package_users.values())
+            set_bytes += sum(sys.getsizeof(packages) for packages in self.user_packages.values())
+            index_bytes = (sys.getsizeof(self.user_index) + sys.getsizeof(self.package_index) +
+                           sys.getsizeof(self.user_ids) + sys.getsizeof(self.package_ids))
+
+            return {
+                "nnz": int(counts.nnz) + len(self._pending),
+                "pending_deltas": len(self._pending),
+                "matrix_bytes": int(matrix_bytes),
+                "set_bytes": int(set_bytes),
+                "index_bytes": int(index_bytes),
+                "total_bytes": int(matrix_bytes + set_bytes + index_bytes),
+            }
+
+class CompactInteractions:
+    """
+    Read-only user x package interactions with IDs interned to int32 indices
+
+    Holds one ID list and ID -> index dict per axis and the booking counts
+    as a CSR matrix with int32 column indices, instead of per-user lists of
+    booking dicts with embedded package objects. It exposes the read
+    interface of InteractionStore (lock, matrix, counts, index maps), so
+    every CF function accepts either. matrix is binary unless built with
+    booking weights.
+    """
+
+    def __init__(self, counts, user_ids=(), package_ids=(), version=0, matrix=None):
+        self.lock = threading.RLock()
+        self.user_ids = list(user_ids)
+        self.user_index = {uid: row for row, uid in enumerate(self.user_ids)}
+        self.package_ids = list(package_ids)
+        self.package_index = {pid: col for col, pid in enumerate(self.package_ids)}
+        self.counts = counts
+        if matrix is None:
+            # Binary view shares the index arrays of the count matrix
+            matrix = csr_matrix((np.ones_like(counts.data), counts.indices, counts.indptr), shape=counts.shape)
+        self.matrix = matrix
+        self.version = version
+        self._sizes = None
+
+    @classmethod
+    def from_pairs(cls, pairs, user_ids=(), package_ids=(), weights=None):
+        """
+        Intern (user_id, package_id) pairs
+
+        Parameters:
+        - pairs: Iterable of (user_id, package_id); repeats are counted
+        - user_ids: Users to register even without interactions
+        - package_ids: Initial column order (e.g. the catalog)
+        - weights: Optional confidence of each pair's booking; matrix then
+          holds each pair's strongest weight instead of 1.0
+
+        Returns:
+        - CompactInteractions
+        """
+        user_index = {uid: row for row, uid in enumerate(dict.fromkeys(user_ids))}
+        package_index = {pid: col for col, pid in enumerate(dict.fromkeys(package_ids))}
+        rows, cols = [], []
+        for uid, package_id in pairs:
+            rows.append(user_index.setdefault(uid, len(user_index)))
+            cols.append(package_index.setdefault(package_id, len(package_index)))
+
+        counts = csr_matrix((np.ones(len(rows), dtype=np.float32),
+                             (np.asarray(rows, dtype=np.int32), np.asarray(cols, dtype=np.int32))),
+                            shape=(len(user_index), len(package_index)))
+        counts.sum_duplicates()
+        matrix = None
+        if weights is not None:
+            matrix = csr_matrix((pair_weights(counts, rows, cols, weights), counts.indices, counts.indptr),
+                                shape=counts.shape)
+        return cls(counts, user_index, package_index, matrix=matrix)
+
+    @classmethod
+    def from_interactions(cls, interactions, package_ids=(), weighting=None):
+        """
+        Intern a stream of interaction dicts with 'userId' and 'packageId'
+        (cancelled bookings are skipped, as in InteractionStore)
+
+        Parameters:
+        - weighting: Optional ConfidenceWeights applied to each interaction
+        """
+        interactions = [i for i in interactions
+                        if i.get('userId') and i.get('packageId') and is_active_booking(i)]
+        weights = weighting.booking_weights(interactions) if weighting is not None else None
+        return cls.from_pairs(((i['userId'], i['packageId']) for i in interactions), package_ids=package_ids,
+                              weights=weights)
+
+    @classmethod
+    def from_bookings(cls, all_users_bookings, package_user_matrix=None, package_ids=()):
+        """
+        Intern the legacy per-user booking lists and/or package -> users map
+
+        Parameters:
+        - all_users_bookings: Dict mapping user_id -> list of booking objects
+        - package_user_matrix: Optional dict mapping package_id -> user IDs
+        - package_ids: Initial column order (e.g. the catalog)
+        """
+        all_users_bookings = all_users_bookings or {}
+        package_user_matrix = package_user_matrix or {}
+        pairs = [(uid, booking['package']['id'])
+                 for uid, bookings in all_users_bookings.items()
+                 for booking in bookings
+                 if booking.get('package') and booking['package'].get('id')]
+        pairs.extend((uid, package_id) for package_id, user_ids in package_user_matrix.items()
+                     for uid in user_ids)
+        return cls.from_pairs(pairs, user_ids=all_users_bookings,
+                              package_ids=list(package_ids) + list(package_user_matrix))
+
+    def sizes(self):
+        """
+        Per-user and per-package sums of the matrix values, cached until it changes
+
+        Booked set sizes for a binary matrix, summed confidence when weighted.
+        """
+        with self.lock:
+            matrix = self.matrix
+            if self._sizes is None or self._sizes[0] is not matrix:
+                self._sizes = (matrix, row_sizes(matrix), column_sizes(matrix))
+            return self._sizes[1], self._sizes[2]
+
+    @property
+    def num_users(self):
+        return self.counts.shape[0]
+
+    @property
+    def num_packages(self):
+        return len(self.package_ids)
+
+    def changed_packages(self, since_version):
+        return []
+
+    def view(self):
+        """Read-only view; a CompactInteractions already is one"""
+        return self
+
+    def memory_usage(self):
+        """Approximate memory held by the container, in bytes"""
+        counts = self.counts
+        matrix_bytes = (counts.data.nbytes + counts.indices.nbytes + counts.indptr.nbytes +
+                        self.matrix.data.nbytes)
+        index_bytes = (sys.getsizeof(self.user_index) + sys.getsizeof(self.package_index) +
+                       sys.getsizeof(self.user_ids) + sys.getsizeof(self.package_ids))
+        return {
+            "nnz": int(counts.nnz),
+            "matrix_bytes": int(matrix_bytes),
+            "index_bytes": int(index_bytes),
+            "total_bytes": int(matrix_bytes + index_bytes),
+        }
+
+class _BoundedIndex:
+    """ID -> position lookups on an append-only index map, hiding positions past size"""
+
+    def __init__(self, index, size):
+        self._index = index
+        self._size = size
+
+    def get(self, key, default=None):
+        position = self._index.get(key)
+        return position if position is not None and position < self._size else default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        position = self.get(key)
+        if position is None:
+            raise KeyError(key)
+        return position
+
+    def __len__(self):
+        return self._size
+
+class InteractionView(CompactInteractions):
+    """
+    Read-only InteractionStore contents at one version (see InteractionStore.view)
+
+    Shares the store's CSR matrices and index maps instead of copying them.
+    Users and packages added to the store later sit past the view's matrix
+    shape and are hidden from its index maps.
+    """
+
+    def __init__(self, store):
+        self.lock = threading.RLock()
+        self._store = store
+        self.counts = store.counts
+        self.matrix = store.matrix
+        num_users, num_packages = self.counts.shape
+        self.user_ids = store.user_ids
+        self.user_index = _BoundedIndex(store.user_index, num_users)
+        self.package_ids = store.package_ids[:num_packages]
+        self.package_index = _BoundedIndex(store.package_index, num_packages)
+        self.version = store.version
+        user_sizes, package_sizes = store.sizes()
+        self._sizes = (self.matrix, user_sizes, package_sizes)
+
+    def changed_packages(self, since_version):
+        # May include later changes too; callers only recompute more rows
+        return self._store.changed_packages(since_version)
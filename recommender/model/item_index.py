@@ -0,0 +1,194 @@
+import logging
+import threading
+import time
+import numpy as np
+from model.interactions import column_sizes
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ItemNeighbourIndex:
+    """
+    Precomputed top-K item-item Jaccard neighbour table
+
+    For every package column, stores the ids of its K most similar packages
+    (by Jaccard overlap of the users who booked them) as an int32 array and
+    their scores as float32, padded with -1 / 0. Rows are rebuilt only for
+    packages whose bookings changed, so item-based CF at request time is a
+    merge of a few short neighbour lists.
+    """
+
+    def __init__(self, k=50, block_size=256):
+        self.k = k
+        self.block_size = block_size
+        self.neighbours = np.full((0, k), -1, dtype=np.int32)
+        self.scores = np.zeros((0, k), dtype=np.float32)
+        self.version = -1
+        self._lock = threading.Lock()
+        self.stats = {
+            "builds": 0,
+            "refreshed_rows": 0,
+            "last_build_ms": 0.0,
+            "last_refresh_ms": 0.0,
+        }
+
+    @property
+    def ready(self):
+        return self.version >= 0
+
+    def build(self, matrix, version=0):
+        """
+        Build the full neighbour table from a user x package CSR matrix
+
+        Parameters:
+        - matrix: Binary (or confidence-weighted) user x package CSR matrix
+        - version: Interaction store version the matrix was taken at
+        """
+        start = time.perf_counter()
+        num_packages = matrix.shape[1]
+        neighbours = np.full((num_packages, self.k), -1, dtype=np.int32)
+        scores = np.zeros((num_packages, self.k), dtype=np.float32)
+
+        csc = matrix.tocsc()
+        sizes = column_sizes(matrix)
+        for block_start in range(0, num_packages, self.block_size):
+            cols = np.arange(block_start, min(block_start + self.block_size, num_packages))
+            neighbours[cols], scores[cols] = self._compute_rows(csc, matrix, sizes, cols)
+
+        with self._lock:
+            self.neighbours, self.scores = neighbours, scores
+            self.version = version
+
+        self.stats["builds"] += 1
+        self.stats["last_build_ms"] = (time.perf_counter() - start) * 1000
+        logger.info(f"Built item neighbour index for {num_packages} packages "
+                    f"in {self.stats['last_build_ms']:.1f} ms")
+
+    def _compute_rows(self, csc, matrix, sizes, cols):
+        """Top-K Jaccard neighbours for the given package columns"""
+        # Co-booking counts (confidence products when weighted) of each requested package with every package
+        cooccurrence = (csc[:, cols].T @ matrix).tocsr()
+
+        neighbours = np.full((len(cols), self.k), -1, dtype=np.int32)
+        scores = np.zeros((len(cols), self.k), dtype=np.float32)
+
+        for i, col in enumerate(cols):
+            start, end = cooccurrence.indptr[i], cooccurrence.indptr[i + 1]
+            others = cooccurrence.indices[start:end]
+            intersection = cooccurrence.data[start:end]
+
+            keep = (others != col) & (intersection > 0)
+            others, intersection = others[keep], intersection[keep]
+            if not len(others):
+                continue
+
+            similarity = intersection / (sizes[col] + sizes[others] - intersection)
+            if len(others) > self.k:
+                top = np.argpartition(-similarity, self.k - 1)[:self.k]
+                others, similarity = others[top], similarity[top]
+
+            order = np.lexsort((others, -similarity))
+            neighbours[i, :len(order)] = others[order]
+            scores[i, :len(order)] = similarity[order]
+
+        return neighbours, scores
+
+    def refresh(self, matrix, package_cols, version):
+        """
+        Recompute the rows affected by booking changes on package_cols
+
+        A change to package p alters its Jaccard score with every package
+        co-booked with it, and with every package currently listing p.
+        Refreshes are serialized; one whose matrix is not newer than the
+        index (a concurrent refresh got there first) is dropped.
+        """
+        start = time.perf_counter()
+        num_packages = matrix.shape[1]
+
+        with self._lock:
+            neighbours, scores = self.neighbours, self.scores
+            if version <= self.version and len(neighbours) >= num_packages:
+                return
+            if len(neighbours) < num_packages:
+                # New catalog packages get empty rows until their first booking
+                pad = num_packages - len(neighbours)
+                neighbours = np.vstack([neighbours, np.full((pad, self.k), -1, dtype=np.int32)])
+                scores = np.vstack([scores, np.zeros((pad, self.k), dtype=np.float32)])
+
+            changed = np.unique(np.asarray(package_cols, dtype=np.int32))
+            csc = matrix.tocsc()
+            affected = set(changed.tolist())
+            if len(changed):
+                cobooked = (csc[:, changed].T @ matrix).indices
+                affected.update(cobooked.tolist())
+                affected.update(np.flatnonzero(np.isin(neighbours, changed).any(axis=1)).tolist())
+
+            if affected:
+                cols = np.fromiter(affected, dtype=np.int32, count=len(affected))
+                neighbours = neighbours.copy()
+                scores = scores.copy()
+                neighbours[cols], scores[cols] = self._compute_rows(csc, matrix, column_sizes(matrix), cols)
+
+            self.neighbours, self.scores = neighbours, scores
+            self.version = version
+
+        self.stats["refreshed_rows"] += len(affected)
+        self.stats["last_refresh_ms"] = (time.perf_counter() - start) * 1000
+
+    def sync(self, store):
+        """
+        Bring the index up to date with an InteractionStore
+
+        Returns:
+        - True if the index is ready to serve
+        """
+        if not self.ready:
+            return False
+
+        # Only the references are taken under the store lock; its compaction
+        # builds new CSR objects, so the refresh runs without holding it
+        with store.lock:
+            if store.version == self.version and len(self.neighbours) == store.num_packages:
+                return True
+            matrix, version = store.matrix, store.version
+            changed = store.changed_packages(self.version)
+        self.refresh(matrix, changed, version)
+        return True
+
+    def score(self, package_cols, exclude_cols=(), weights=None):
+        """
+        Merge the neighbour lists of the given packages
+
+        Parameters:
+        - package_cols: Columns of packages the user has booked
+        - exclude_cols: Columns that must not be scored (already booked)
+        - weights: Optional user confidence per package column; its
+          neighbour scores are scaled by it
+
+        Returns:
+        - float64 array of summed neighbour scores per package column
+        """
+        neighbours, scores = self.neighbours, self.scores
+        package_cols = np.asarray(list(package_cols), dtype=np.int32)
+        weights = np.ones(len(package_cols)) if weights is None else np.asarray(weights, dtype=np.float64)
+        keep = package_cols < len(neighbours)
+        rows, weights = package_cols[keep], weights[keep]
+
+        merged = np.zeros(len(neighbours), dtype=np.float64)
+        if len(rows):
+            ids = neighbours[rows].ravel()
+            valid = ids >= 0
+            row_scores = (scores[rows] * weights[:, None]).ravel()
+            merged = np.bincount(ids[valid], weights=row_scores[valid],
+                                 minlength=len(neighbours)).astype(np.float64)
+
+        merged[np.asarray(list(exclude_cols), dtype=np.int32)] = 0.0
+        return merged
+
+    def memory_usage(self):
+        return {
+            "packages": len(self.neighbours),
+            "k": self.k,
+            "bytes": int(self.neighbours.nbytes + self.scores.nbytes),
+        }
@@ -0,0 +1,266 @@
+import copy
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import numpy as np
+from scipy.sparse import csr_matrix
+from model.ann import IVFIndex
+from model.factorization import FactorModel
+from model.cf import popular_package_ids
+from model.hybrid import hybrid_recommendations_batch, users_booked_packages
+from model.interactions import CompactInteractions
+from model.item_index import ItemNeighbourIndex
+from model.text_index import CatalogSnapshot, CatalogTextIndex
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Per-worker models attached to the shared arrays (set by _init_worker)
+_worker = {}
+
+def _save_csr(directory, name, matrix):
+    for part in ('data', 'indices', 'indptr'):
+        np.save(os.path.join(directory, f"{name}_{part}.npy"), getattr(matrix, part))
+    return matrix.shape
+
+def _load(directory, name):
+    # Read-only mappings: pages are shared through the OS page cache, never copied per worker
+    return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+
+def _load_csr(directory, name, shape):
+    return csr_matrix((_load(directory, f"{name}_data"), _load(directory, f"{name}_indices"),
+                       _load(directory, f"{name}_indptr")), shape=shape, copy=False)
+
+class ShardedRecommender:
+    """
+    Process-pool execution of batch CF + CBF + popularity recommendations
+
+    Users are sharded into chunks across worker processes. The read-only
+    arrays (interaction CSR matrices, item neighbour table, factor model,
+    IVF lists, catalog TF-IDF matrix and scoring columns) are written once
+    as .npy files and memory-mapped by every worker, so they are shared
+    through the page cache instead of being pickled to each worker. Only
+    small metadata (ID lists, vectorizer vocabulary, catalog) is sent once
+    per worker, and per chunk just the user IDs and their matrix rows.
+
+    Results match hybrid_recommendations_batch() over the same models.
+    Use as a context manager, or call close() to remove the shared files.
+    """
+
+    def __init__(self, interactions, all_packages, item_index=None, factor_model=None, text_index=None,
+                 workers=None, chunk_size=2000, start_method=None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.chunk_size = chunk_size
+        self.all_packages = all_packages
+
+        with interactions.lock:
+            matrix, counts = interactions.matrix, interactions.counts
+            package_ids = list(interactions.package_ids)
+            self.user_index = dict(interactions.user_index)
+            self.popular_ids = popular_package_ids(interactions)
+            version = interactions.version
+
+        # Fit shared models once in the parent so workers never refit them
+        if item_index is None:
+            item_index = ItemNeighbourIndex()
+        if not item_index.sync(interactions):
+            item_index.build(matrix, version)
+        if factor_model is None and matrix.nnz:
+            factor_model = FactorModel().fit(matrix, package_ids, version=version)
+        if text_index is None:
+            text_index = CatalogTextIndex()
+        text_index.sync(all_packages)
+
+        self.interactions = interactions
+        self.item_index = item_index
+        self.factor_model = factor_model
+        self.text_index = text_index
+
+        self.directory = tempfile.mkdtemp(prefix='recommender-shared-')
+        self.shared_bytes = 0
+        meta = self._share(counts, matrix, package_ids, version)
+
+        self._pool = None
+        if self.workers > 1:
+            methods = multiprocessing.get_all_start_methods()
+            start_method = start_method or ('fork' if 'fork' in methods else None)
+            context = multiprocessing.get_context(start_method)
+            self._pool = context.Pool(self.workers, initializer=_init_worker,
+                                      initargs=(self.directory, meta, all_packages))
+        logger.info(f"Sharded recommender: {self.workers} worker(s), "
+                    f"{self.shared_bytes / 1e6:.1f} MB shared from {self.directory}")
+
+    def _share(self, counts, matrix, package_ids, version):
+        """Write the read-only arrays to the shared directory; returns the per-worker metadata"""
+        directory = self.directory
+        meta = {
+            "package_ids": package_ids,
+            "version": version,
+            "popular_ids": self.popular_ids,
+            "counts_shape": _save_csr(directory, "counts", counts),
+        }
+        np.save(os.path.join(directory, "matrix_data.npy"), matrix.data)
+
+        np.save(os.path.join(directory, "neighbours.npy"), self.item_index.neighbours)
+        np.save(os.path.join(directory, "neighbour_scores.npy"), self.item_index.scores)
+        meta["item_index"] = {"k": self.item_index.k, "version": self.item_index.version}
+
+        model = self.factor_model
+        if model is not None and model.ready:
+            np.save(os.path.join(directory, "item_factors.npy"), model.item_factors)
+            if model.singular_values is not None:
+                np.save(os.path.join(directory, "singular_values.npy"), model.singular_values)
+            meta["factor_model"] = {
+                "params": dict(factors=model.factors, method=model.method, regularization=model.regularization,
+                               alpha=model.alpha, ann_min_items=model.ann_min_items,
+                               ann_nprobe=model.ann_nprobe),
+                "package_ids": model.package_ids,
+                "version": model.version,
+                "svd": model.singular_values is not None,
+            }
+            ann = model.ann_index
+            if ann is not None:
+                lists = [ann._list_array(list_id) for list_id in range(ann.nlist)]
+                np.save(os.path.join(directory, "ann_vectors.npy"), ann.vectors[:ann.count])
+                np.save(os.path.join(directory, "ann_lists.npy"),
+                        np.concatenate(lists) if lists else np.zeros(0, dtype=np.int64))
+                meta["factor_model"]["ann"] = {
+                    "nprobe": ann.nprobe,
+                    "centroids": ann.centroids,
+                    "list_sizes": [len(ids) for ids in lists],
+                }
+
+        snapshot = self.text_index.snapshot
+        if snapshot is not None:
+            features = snapshot.features
+            # Vocabulary and IDF weights only; stop_words_ is not needed to transform
+            vectorizer = copy.copy(snapshot.vectorizer)
+            if hasattr(vectorizer, 'stop_words_'):
+                del vectorizer.stop_words_
+            np.save(os.path.join(directory, "price.npy"), features['price'])
+            np.save(os.path.join(directory, "available.npy"), features['available'])
+            meta["text_index"] = {
+                "vectorizer": vectorizer,
+                "package_ids": snapshot.package_ids,
+                "tfidf_shape": _save_csr(directory, "tfidf", snapshot.matrix),
+                "destinations_shape": _save_csr(directory, "destinations", features['destinations']),
+                "destination_vocabulary": features['destination_vocabulary'],
+            }
+
+        self.shared_bytes = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        return meta
+
+    def recommend(self, user_ids):
+        """
+        Recommendations for many users, sharded across the worker pool
+
+        Parameters:
+        - user_ids: IDs of the users
+
+        Yields:
+        - (user_id, recommended package IDs, CF count, CBF count), in input order
+        """
+        user_ids = list(user_ids)
+        if self._pool is None:
+            package_map = {pkg['id']: pkg for pkg in self.all_packages if pkg.get('id')}
+            users_packages = users_booked_packages(self.interactions, user_ids, package_map)
+            yield from hybrid_recommendations_batch(
+                user_ids, users_packages, self.interactions, self.all_packages, self.popular_ids,
+                item_index=self.item_index, factor_model=self.factor_model, text_index=self.text_index
+            )
+            return
+
+        chunks = []
+        for start in range(0, len(user_ids), self.chunk_size):
+            chunk = user_ids[start:start + self.chunk_size]
+            rows = [self.user_index.get(uid) for uid in chunk]
+            chunks.append((chunk, rows))
+
+        for results in self._pool.imap(_score_chunk, chunks):
+            yield from results
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _init_worker(directory, meta, all_packages):
+    """Attach read-only models to the shared arrays (once per worker process)"""
+    counts = _load_csr(directory, "counts", meta["counts_shape"])
+    matrix = csr_matrix((_load(directory, "matrix_data"), counts.indices, counts.indptr),
+                        shape=counts.shape, copy=False)
+    # Row IDs are not shipped; each chunk sets the user_index of its own users
+    interactions = CompactInteractions(counts, package_ids=meta["package_ids"], version=meta["version"],
+                                       matrix=matrix)
+
+    item_index = ItemNeighbourIndex(k=meta["item_index"]["k"])
+    item_index.neighbours = _load(directory, "neighbours")
+    item_index.scores = _load(directory, "neighbour_scores")
+    item_index.version = meta["item_index"]["version"]
+
+    factor_model = None
+    if "factor_model" in meta:
+        saved = meta["factor_model"]
+        factor_model = FactorModel(**saved["params"])
+        factor_model.item_factors = _load(directory, "item_factors")
+        factor_model.singular_values = _load(directory, "singular_values") if saved["svd"] else None
+        factor_model.package_ids = saved["package_ids"]
+        factor_model.package_index = {pid: idx for idx, pid in enumerate(saved["package_ids"])}
+        factor_model.version = saved["version"]
+        if "ann" in saved:
+            ann = IVFIndex(nlist=len(saved["ann"]["list_sizes"]), nprobe=saved["ann"]["nprobe"])
+            ann.centroids = saved["ann"]["centroids"]
+            ann.vectors = _load(directory, "ann_vectors")
+            ann.count = len(ann.vectors)
+            offsets = np.cumsum([0] + saved["ann"]["list_sizes"])
+            lists = _load(directory, "ann_lists")
+            ann._list_arrays = [lists[offsets[i]:offsets[i + 1]] for i in range(ann.nlist)]
+            ann._lists = [array.tolist() for array in ann._list_arrays]
+            factor_model.ann_index = ann
+
+    text_index = CatalogTextIndex()
+    if "text_index" in meta:
+        saved = meta["text_index"]
+        features = {
+            'price': _load(directory, "price"),
+            'available': _load(directory, "available"),
+            'destinations': _load_csr(directory, "destinations", saved["destinations_shape"]),
+            'destination_vocabulary': saved["destination_vocabulary"],
+        }
+        snapshot = CatalogSnapshot(saved["vectorizer"], _load_csr(directory, "tfidf", saved["tfidf_shape"]),
+                                   saved["package_ids"], features)
+        text_index.attach(snapshot, all_packages)
+
+    _worker.update({
+        "interactions": interactions,
+        "item_index": item_index,
+        "factor_model": factor_model,
+        "text_index": text_index,
+        "all_packages": all_packages,
+        "package_map": {pkg['id']: pkg for pkg in all_packages if pkg.get('id')},
+        "popular_ids": meta["popular_ids"],
+    })
+
+def _score_chunk(args):
+    """Recommendations for one chunk of users (runs in a worker)"""
+    user_ids, rows = args
+    interactions = _worker["interactions"]
+    interactions.user_index = {uid: row for uid, row in zip(user_ids, rows) if row is not None}
+
+    users_packages = users_booked_packages(interactions, user_ids, _worker["package_map"])
+    return list(hybrid_recommendations_batch(
+        user_ids, users_packages, interactions, _worker["all_packages"], _worker["popular_ids"],
+        item_index=_worker["item_index"], factor_model=_worker["factor_model"],
+        text_index=_worker["text_index"]
+    ))
@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import os
+import struct
+import threading
+import time
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b'RECSNAP1'
+# magic, top_n, num_users, num_packages, user id width, package id width, created_at
+HEADER = struct.Struct('<8sIQQIId')
+ALIGNMENT = 64
+
+def booking_fingerprint(package_ids):
+    """Stable 64-bit fingerprint of a user's set of booked package IDs"""
+    digest = hashlib.blake2b('\x1f'.join(sorted(package_ids)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def _layout(top_n, num_users, num_packages, user_width, package_width):
+    """Byte offset, dtype and shape of every section, in file order"""
+    sections = [
+        ('user_ids', np.dtype(f'S{user_width}'), (num_users,)),
+        ('fingerprints', np.dtype('<u8'), (num_users,)),
+        ('indices', np.dtype('<i4'), (num_users, top_n)),
+        ('scores', np.dtype('<f4'), (num_users, top_n)),
+        ('package_ids', np.dtype(f'S{package_width}'), (num_packages,)),
+    ]
+    layout = {}
+    offset = _aligned(HEADER.size)
+    for name, dtype, shape in sections:
+        layout[name] = (offset, dtype, shape)
+        offset = _aligned(offset + dtype.itemsize * int(np.prod(shape)))
+    return layout, offset
+
+def write_snapshot(path, user_ids, fingerprints, indices, scores, package_ids):
+    """
+    Write a memory-mappable top-N recommendation snapshot
+
+    Users are stored sorted by ID so lookups are a binary search over the
+    mapped ID column. The file is written next to path and renamed into
+    place, so readers never see a partial snapshot.
+
+    Parameters:
+    - path: Output file
+    - user_ids: User IDs, one per row
+    - fingerprints: booking_fingerprint() of each user's bookings
+    - indices: users x top_n int32 package indices (-1 padded)
+    - scores: users x top_n float32 scores
+    - package_ids: Package ID of each index
+    """
+    encoded_users = np.asarray([uid.encode() for uid in user_ids], dtype=bytes)
+    encoded_packages = np.asarray([pid.encode() for pid in package_ids], dtype=bytes)
+    if len(encoded_users) != len(set(encoded_users.tolist())):
+        raise ValueError("Duplicate user IDs in snapshot")
+
+    order = np.argsort(encoded_users, kind='stable')
+    indices = np.asarray(indices, dtype=np.int32)
+    top_n = indices.shape[1] if indices.ndim == 2 else 0
+    user_width = max(1, encoded_users.dtype.itemsize)
+    package_width = max(1, encoded_packages.dtype.itemsize)
+    layout, size = _layout(top_n, len(encoded_users), len(encoded_packages), user_width, package_width)
+
+    columns = {
+        'user_ids': encoded_users[order].astype(f'S{user_width}'),
+        'fingerprints': np.asarray(fingerprints, dtype=np.uint64)[order],
+        'indices': indices[order],
+        'scores': np.asarray(scores, dtype=np.float32)[order],
+        'package_ids': encoded_packages.astype(f'S{package_width}'),
+    }
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(SNAPSHOT_MAGIC, top_n, len(encoded_users), len(encoded_packages),
+                            user_width, package_width, time.time()))
+        for name, (offset, dtype, shape) in layout.items():
+            f.seek(offset)
+            f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+        f.truncate(size)
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote recommendation snapshot for {len(encoded_users)} users to {path}")
+
+class RecommendationSnapshot:
+    """
+    Read-only, memory-mapped view of a snapshot written by write_snapshot()
+
+    Sections are mapped with np.memmap, so opening is O(1) and a lookup
+    touches only the pages of one binary search and one row. The file is
+    reopened when it is replaced on disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._sections = None
+        self._lock = threading.Lock()
+        self.created_at = None
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "loads": 0}
+
+    @property
+    def ready(self):
+        return self._sections is not None
+
+    def refresh(self):
+        """(Re)open the file if it appeared or changed; returns True if a snapshot is open"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return self.ready
+
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    try:
+                        self._sections = self._open()
+                        self.stats["loads"] += 1
+                    except (OSError, ValueError) as e:
+                        logger.error(f"Could not open recommendation snapshot {self.path}: {str(e)}")
+                    self._mtime = mtime
+        return self.ready
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            magic, top_n, num_users, num_packages, user_width, package_width, created_at = \
+                HEADER.unpack(f.read(HEADER.size))
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("not a recommendation snapshot")
+
+        layout, _ = _layout(top_n, num_users, num_packages, user_width, package_width)
+        sections = {}
+        for name, (offset, dtype, shape) in layout.items():
+            if int(np.prod(shape)) == 0:
+                sections[name] = np.zeros(shape, dtype=dtype)
+            else:
+                sections[name] = np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=shape)
+        self.created_at = created_at
+        logger.info(f"Opened recommendation snapshot {self.path}: {num_users} users, top {top_n}")
+        return sections
+
+    def lookup(self, user_id, user_package_ids):
+        """
+        Precomputed recommendations of one user
+
+        Parameters:
+        - user_id: ID of the user
+        - user_package_ids: Set of package IDs the user has booked now
+
+        Returns:
+        - list of (package_id, score) tuples, or None if the user is not in
+          the snapshot or has booked/cancelled since it was written
+        """
+        sections = self._sections
+        if sections is None:
+            return None
+
+        user_ids = sections['user_ids']
+        key = user_id.encode()
+        row = int(np.searchsorted(user_ids, key))
+        if row >= len(user_ids) or user_ids[row] != key:
+            self.stats["misses"] += 1
+            return None
+
+        if int(sections['fingerprints'][row]) != booking_fingerprint(user_package_ids):
+            self.stats["stale"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        package_ids = sections['package_ids']
+        return [(package_ids[idx].decode(), float(score))
+                for idx, score in zip(sections['indices'][row].tolist(), sections['scores'][row].tolist())
+                if idx >= 0]
+
+    def memory_usage(self):
+        sections = self._sections
+        if sections is None:
+            return {"users": 0, "bytes": 0}
+        return {
+            "users": len(sections['user_ids']),
+            "bytes": int(sum(section.nbytes for section in sections.values())),
+        }
@@ -0,0 +1,240 @@
+import logging
+import threading
+import time
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+from sklearn.feature_extraction.text import TfidfVectorizer
+from model.cbf import package_text, package_features
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _package_signature(pkg):
+    return (pkg.get('title'), pkg.get('description'), pkg.get('destination'), pkg.get('duration'),
+            pkg.get('price'), pkg.get('availability'))
+
+class CatalogSnapshot:
+    """Immutable view of the indexed catalog: TF-IDF rows plus columnar scoring metadata"""
+
+    def __init__(self, vectorizer, matrix, package_ids, features):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.package_ids = package_ids
+        self.package_index = {pid: idx for idx, pid in enumerate(package_ids)}
+        self.features = features
+
+class CatalogTextIndex:
+    """
+    TF-IDF index over the package catalog, fitted once and shared by requests
+
+    The vectorizer is fitted on the whole catalog and the L2-normalized
+    package vectors are kept as one sparse matrix, next to the packages'
+    price, availability and destination tokens as columnar arrays. Scoring a
+    request is a transform of the user profile, one sparse dot product and
+    vectorized adjustments. Added or edited packages are transformed with the
+    existing vocabulary and swapped in; the vocabulary and IDF weights are
+    refitted once the edits since the last fit exceed refit_ratio of the
+    catalog, or on invalidate(). Rows stay in catalog order.
+    """
+
+    def __init__(self, refit_ratio=0.2, max_features=1000):
+        self.refit_ratio = refit_ratio
+        self.max_features = max_features
+
+        self.snapshot = None
+        self._signatures = {}
+        self._stale = 0
+        self._lock = threading.Lock()
+
+        self.version = 0
+        self.stats = {
+            "fits": 0,
+            "incremental_updates": 0,
+            "last_fit_ms": 0.0,
+            "last_update_ms": 0.0,
+        }
+
+    @property
+    def ready(self):
+        return self.snapshot is not None
+
+    def _vectorizer(self):
+        return TfidfVectorizer(
+            stop_words='english',
+            max_features=self.max_features,  # Reduced for better performance
+            ngram_range=(1, 2),  # Include both unigrams and bigrams
+            min_df=1,
+            max_df=0.95,  # Ignore terms that appear in >95% of documents
+            sublinear_tf=True  # Use sublinear tf scaling
+        )
+
+    def fit(self, packages):
+        """
+        Fit the vocabulary and IDF weights on the full catalog
+
+        Parameters:
+        - packages: List of catalog package dicts
+        """
+        start = time.perf_counter()
+        packages = [pkg for pkg in packages if pkg.get('id')]
+
+        vectorizer = self._vectorizer()
+        try:
+            matrix = vectorizer.fit_transform([package_text(pkg) for pkg in packages]).tocsr()
+        except ValueError as e:
+            # Too few documents or no terms left after pruning
+            logger.warning(f"Could not fit catalog text index: {str(e)}")
+            with self._lock:
+                self.snapshot = None
+                self._signatures = {}
+            return self
+
+        snapshot = CatalogSnapshot(vectorizer, matrix, [pkg['id'] for pkg in packages],
+                                   package_features(packages))
+        with self._lock:
+            self.snapshot = snapshot
+            self._signatures = {pkg['id']: _package_signature(pkg) for pkg in packages}
+            self._stale = 0
+            self.version += 1
+
+        self.stats["fits"] += 1
+        self.stats["last_fit_ms"] = (time.perf_counter() - start) * 1000
+        logger.info(f"Fitted catalog text index: {matrix.shape[0]} packages, "
+                    f"{matrix.shape[1]} terms in {self.stats['last_fit_ms']:.1f} ms")
+        return self
+
+    def sync(self, packages):
+        """
+        Bring the index up to date with the current catalog
+
+        Unchanged packages cost one tuple comparison; only added or edited
+        packages are transformed.
+
+        Parameters:
+        - packages: List of catalog package dicts
+
+        Returns:
+        - True if the index is ready to serve
+        """
+        signatures = self._signatures
+        changed = [pkg for pkg in packages
+                   if pkg.get('id') and signatures.get(pkg['id']) != _package_signature(pkg)]
+        current_ids = {pkg['id'] for pkg in packages if pkg.get('id')}
+        removed = [pid for pid in signatures if pid not in current_ids]
+
+        if self.snapshot is None or (not changed and not removed):
+            if self.snapshot is None and packages:
+                self.fit(packages)
+            return self.ready
+
+        if self._stale + len(changed) + len(removed) > self.refit_ratio * len(current_ids):
+            self.fit(packages)
+        else:
+            self._update(changed, removed)
+        return self.ready
+
+    def _update(self, changed, removed):
+        """Transform changed packages with the fitted vocabulary and swap their rows in place"""
+        start = time.perf_counter()
+        with self._lock:
+            snapshot = self.snapshot
+            old_ids = snapshot.package_ids
+            changed_at = {pkg['id']: i for i, pkg in enumerate(changed)}
+            removed = set(removed)
+
+            # Rows of [old rows; changed rows] in final order: edits stay in
+            # place, new packages are appended, removed ones dropped
+            order = [len(old_ids) + changed_at[pid] if pid in changed_at else idx
+                     for idx, pid in enumerate(old_ids) if pid not in removed]
+            added = [pkg for pkg in changed if pkg['id'] not in snapshot.package_index]
+            order.extend(len(old_ids) + changed_at[pkg['id']] for pkg in added)
+            order = np.asarray(order, dtype=np.int64)
+
+            vectorizer = snapshot.vectorizer
+            matrix = vstack([snapshot.matrix,
+                             vectorizer.transform([package_text(pkg) for pkg in changed])]).tocsr()[order]
+
+            old_features = snapshot.features
+            vocabulary = dict(old_features['destination_vocabulary'])
+            new_features = package_features(changed, vocabulary)
+            old_destinations = old_features['destinations']
+            old_destinations = csr_matrix(
+                (old_destinations.data, old_destinations.indices, old_destinations.indptr),
+                shape=(old_destinations.shape[0], len(vocabulary))
+            )
+            features = {
+                'price': np.concatenate([old_features['price'], new_features['price']])[order],
+                'available': np.concatenate([old_features['available'], new_features['available']])[order],
+                'destinations': vstack([old_destinations, new_features['destinations']]).tocsr()[order],
+                'destination_vocabulary': vocabulary,
+            }
+
+            package_ids = old_ids + [pkg['id'] for pkg in changed]
+            self.snapshot = CatalogSnapshot(vectorizer, matrix, [package_ids[idx] for idx in order], features)
+
+            signatures = dict(self._signatures)
+            for package_id in removed:
+                signatures.pop(package_id, None)
+            for pkg in changed:
+                signatures[pkg['id']] = _package_signature(pkg)
+            self._signatures = signatures
+            self._stale += len(changed) + len(removed)
+            self.version += 1
+
+        self.stats["incremental_updates"] += 1
+        self.stats["last_update_ms"] = (time.perf_counter() - start) * 1000
+        logger.info(f"Updated catalog text index: {len(changed)} changed, {len(removed)} removed")
+
+    def attach(self, snapshot, packages):
+        """
+        Serve a prebuilt snapshot, e.g. one mapped from shared files
+
+        Parameters:
+        - snapshot: CatalogSnapshot built for packages
+        - packages: List of catalog package dicts the snapshot was built from
+        """
+        with self._lock:
+            self.snapshot = snapshot
+            self._signatures = {pkg['id']: _package_signature(pkg) for pkg in packages if pkg.get('id')}
+            self._stale = 0
+            self.version += 1
+
+    def invalidate(self):
+        """Force a full refit on the next sync (catalog version bump)"""
+        with self._lock:
+            self._signatures = {}
+            self.snapshot = None
+            self.version += 1
+
+    def similarities(self, text):
+        """
+        Cosine similarity of a text to every indexed package
+
+        Returns:
+        - (similarities, snapshot): float64 array by row and the
+          CatalogSnapshot the rows refer to
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            return np.zeros(0), None
+
+        # Rows and the query are L2-normalized, so the dot product is the cosine
+        query = snapshot.vectorizer.transform([text])
+        return (snapshot.matrix @ query.T).toarray().ravel(), snapshot
+
+    def memory_usage(self):
+        snapshot = self.snapshot
+        if snapshot is None:
+            return {"packages": 0, "terms": 0, "bytes": 0}
+        matrix = snapshot.matrix
+        features = snapshot.features
+        destinations = features['destinations']
+        return {
+            "packages": matrix.shape[0],
+            "terms": matrix.shape[1],
+            "bytes": int(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes +
+                         features['price'].nbytes + features['available'].nbytes +
+                         destinations.data.nbytes + destinations.indices.nbytes +
+                         destinations.indptr.nbytes),
+        }
@@ -0,0 +1,393 @@
+import heapq
+import logging
+import threading
+import time
+from model.dump import NO_DATE, parse_timestamp
+from model.interactions import is_active_booking
+from model.themes import THEME_KEYWORDS
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Scores are rescaled once an event is this many half-lives past their reference time
+_REBASE_HALF_LIVES = 64.0
+# Scores left by cancellations below this are treated as zero
+_EPSILON = 1e-9
+
+def package_groups(package):
+    """
+    Trending groups of a catalog package
+
+    Parameters:
+    - package: Package dict with destination, title and description
+
+    Returns:
+    - list of group keys: 'destination:<name>' (lower-cased) and
+      'theme:<theme>' for every THEME_KEYWORDS theme it matches
+    """
+    groups = []
+    destination = str(package.get('destination') or '').strip().lower()
+    if destination:
+        groups.append(f"destination:{destination}")
+    title = str(package.get('title') or '').lower()
+    description = str(package.get('description') or '').lower()
+    groups.extend(f"theme:{theme}" for theme, keywords in THEME_KEYWORDS.items()
+                  if any(keyword in title or keyword in description for keyword in keywords))
+    return groups
+
+class _TopK:
+    """
+    The capacity highest-scoring keys of a counter table, kept in a min-heap
+
+    Heap entries are (score, -order, key): ties go to the key seen first.
+    An increased member score pushes a new entry and leaves the old one
+    stale (skipped when it reaches the top); a non-member enters by
+    replacing the minimum. A member whose score drops may be overtaken by a
+    key outside the heap, so the heap is rebuilt on the next read instead.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.heap = []
+        self.members = {}
+        self.dirty = False
+        self._ranked = None
+
+    def update(self, key, score, order, increased):
+        """Record a key's new score"""
+        if not increased:
+            if key in self.members:
+                self.dirty = True
+                self._ranked = None
+            return
+        if self.dirty:
+            return
+
+        entry = (score, -order, key)
+        if key in self.members or len(self.members) < self.capacity:
+            self.members[key] = entry
+            heapq.heappush(self.heap, entry)
+        else:
+            self._drop_stale()
+            if entry <= self.heap[0]:
+                return
+            _, _, evicted = heapq.heapreplace(self.heap, entry)
+            del self.members[evicted]
+            self.members[key] = entry
+        self._ranked = None
+
+        if len(self.heap) > 2 * self.capacity + 16:
+            # Too many stale entries: keep only the live ones
+            self.heap = list(self.members.values())
+            heapq.heapify(self.heap)
+
+    def _drop_stale(self):
+        while self.heap and self.members.get(self.heap[0][2]) != self.heap[0]:
+            heapq.heappop(self.heap)
+
+    def rebuild(self, entries):
+        """Refill from (score, -order, key) entries of every key with a positive score"""
+        self.heap = heapq.nlargest(self.capacity, entries)
+        self.members = {entry[2]: entry for entry in self.heap}
+        heapq.heapify(self.heap)
+        self.dirty = False
+        self._ranked = None
+
+    def ranked(self, entries):
+        """
+        Member keys, highest score first
+
+        Parameters:
+        - entries: Callable returning every (score, -order, key) entry, used
+          to rebuild after a member's score dropped
+        """
+        if self.dirty:
+            self.rebuild(entries())
+        if self._ranked is None:
+            self._ranked = [entry[2] for entry in sorted(self.members.values(), reverse=True)]
+        return self._ranked
+
+    @property
+    def full(self):
+        return len(self.members) >= self.capacity
+
+class TrendingPopularity:
+    """
+    Streaming, exponentially time-decayed package popularity
+
+    Every booking adds weight * 0.5 ** (age / half_life) to its package and
+    to the package's destination and theme groups, so a booking made
+    half_life_days ago counts half as much as one made now. Instead of
+    decaying all counters as time passes, a booking's weight is scaled up
+    by 2 ** ((booked_at - reference) / half_life): relative order never
+    changes with time alone, updates are O(1) (plus O(log K) heap work)
+    and counters are rescaled only every _REBASE_HALF_LIVES half-lives.
+
+    Top-K heaps over all packages, over each group's packages and over the
+    groups themselves make the cold-start fallback a read of an already
+    ranked list. half_life_days=None gives all-time booking counts.
+    """
+
+    def __init__(self, half_life_days=7.0, capacity=50):
+        self.lock = threading.RLock()
+        self.half_life_seconds = half_life_days * 86400.0 if half_life_days else None
+        self.capacity = capacity
+
+        # Epoch seconds the stored scores are scaled to
+        self.reference_time = None
+        # package_id -> score at reference_time scale, and first-seen order for ties
+        self._scores = {}
+        self._order = {}
+        self._top = _TopK(capacity)
+
+        # package_id -> group keys, and the package fields they were derived from
+        self._package_groups = {}
+        self._signatures = {}
+        # group -> set(package_id), total score, first-seen order and top-K packages
+        self._group_members = {}
+        self._group_scores = {}
+        self._group_order = {}
+        self._group_top = {}
+        self._group_rank = _TopK(capacity)
+
+        self.stats = {
+            "bookings": 0,
+            "cancellations": 0,
+            # Cancellations without a booking date, left uncounted
+            "skipped_cancellations": 0,
+            "rebases": 0,
+        }
+
+    def _now(self, timestamp):
+        """Event time in epoch seconds; missing dates count as now"""
+        if timestamp is None or timestamp == NO_DATE:
+            return time.time()
+        if not isinstance(timestamp, (int, float)):
+            timestamp = parse_timestamp(timestamp)
+            return time.time() if timestamp == NO_DATE else timestamp
+        return timestamp
+
+    def _scale(self, timestamp):
+        """Multiplier of a booking made at timestamp, relative to reference_time"""
+        if self.half_life_seconds is None:
+            return 1.0
+        if self.reference_time is None:
+            self.reference_time = timestamp
+        exponent = (timestamp - self.reference_time) / self.half_life_seconds
+        if exponent > _REBASE_HALF_LIVES:
+            self._rebase(timestamp)
+            exponent = 0.0
+        return 2.0 ** exponent
+
+    def _rebase(self, timestamp):
+        """Rescale every counter to a later reference time (keeps floats bounded)"""
+        factor = 2.0 ** ((self.reference_time - timestamp) / self.half_life_seconds)
+        self.reference_time = timestamp
+        self._scores = {pid: score * factor for pid, score in self._scores.items()}
+        self._group_scores = {group: score * factor for group, score in self._group_scores.items()}
+        self._top.rebuild(self._package_entries(self._scores))
+        for group, top in self._group_top.items():
+            top.rebuild(self._package_entries(self._group_members[group]))
+        self._group_rank.rebuild(self._group_entries())
+        self.stats["rebases"] += 1
+
+    def _package_entries(self, package_ids):
+        return ((self._scores[pid], -self._order[pid], pid) for pid in package_ids if self._scores.get(pid, 0.0) > 0.0)
+
+    def _group_entries(self, kind=None):
+        prefix = f"{kind}:" if kind else ""
+        return ((score, -self._group_order[group], group) for group, score in self._group_scores.items()
+                if score > 0.0 and group.startswith(prefix))
+
+    def _apply(self, package_id, delta):
+        """Add delta (negative for cancellations) to a package and its groups"""
+        order = self._order.setdefault(package_id, len(self._order))
+        old = self._scores.get(package_id, 0.0)
+        score = old + delta
+        if score <= _EPSILON * old:
+            score = 0.0
+        delta = score - old
+        increased = delta > 0
+        self._scores[package_id] = score
+        self._top.update(package_id, score, order, increased)
+
+        for group in self._package_groups.get(package_id, ()):
+            self._group_top[group].update(package_id, score, order, increased)
+            self._add_to_group(group, delta)
+
+    def _add_to_group(self, group, delta):
+        old = self._group_scores.get(group, 0.0)
+        total = old + delta
+        if total <= _EPSILON * old:
+            total = 0.0
+        self._group_scores[group] = total
+        self._group_rank.update(group, total, self._group_order[group], delta > 0)
+
+    def add_booking(self, package_id, timestamp=None, weight=1.0):
+        """
+        Count a booking in O(1)
+
+        Parameters:
+        - package_id: Booked package
+        - timestamp: Booking time (epoch seconds or an ISO/epoch-ms date);
+          now if missing
+        - weight: Contribution of the booking before decay
+        """
+        with self.lock:
+            self._apply(package_id, weight * self._scale(self._now(timestamp)))
+            self.stats["bookings"] += 1
+
+    def cancel_booking(self, package_id, timestamp, weight=1.0):
+        """
+        Take back a booking counted by add_booking
+
+        Parameters:
+        - timestamp: Time of the cancelled booking, so the same decayed
+          amount is removed. Without a parseable one the cancellation is
+          skipped: a present-time weight could wipe out the score of a
+          booking that decayed long ago.
+
+        Returns:
+        - True if the booking was taken back
+        """
+        if timestamp is not None and not isinstance(timestamp, (int, float)):
+            timestamp = parse_timestamp(timestamp)
+        with self.lock:
+            if timestamp is None or timestamp == NO_DATE:
+                self.stats["skipped_cancellations"] += 1
+                return False
+            if not self._scores.get(package_id):
+                return False
+            self._apply(package_id, -weight * self._scale(timestamp))
+            self.stats["cancellations"] += 1
+            return True
+
+    def add_interactions(self, interactions):
+        """
+        Count a stream of booking interactions, skipping cancelled ones
+
+        Parameters:
+        - interactions: Iterable of dicts with 'packageId', 'status' and 'date'
+
+        Returns:
+        - Number of bookings counted
+        """
+        counted = 0
+        with self.lock:
+            for interaction in interactions:
+                package_id = interaction.get('packageId')
+                if not package_id or not is_active_booking(interaction):
+                    continue
+                self.add_booking(package_id, interaction.get('date'))
+                counted += 1
+        logger.info(f"Counted {counted} bookings into trending popularity")
+        return counted
+
+    def set_packages(self, packages):
+        """
+        Assign catalog packages to their destination and theme groups
+
+        Only packages that are new or whose destination, title or
+        description changed are regrouped; their current scores move from
+        the old groups to the new ones.
+
+        Parameters:
+        - packages: List of package dicts
+        """
+        with self.lock:
+            for package in packages:
+                package_id = package.get('id')
+                if not package_id:
+                    continue
+                signature = (package.get('destination'), package.get('title'), package.get('description'))
+                if self._signatures.get(package_id) == signature:
+                    continue
+                self._signatures[package_id] = signature
+                self._regroup(package_id, package_groups(package))
+
+    def _regroup(self, package_id, groups):
+        order = self._order.setdefault(package_id, len(self._order))
+        score = self._scores.get(package_id, 0.0)
+        old_groups = set(self._package_groups.get(package_id, ()))
+        self._package_groups[package_id] = tuple(groups)
+
+        for group in old_groups.difference(groups):
+            self._group_members[group].discard(package_id)
+            self._group_top[group].update(package_id, 0.0, order, False)
+            self._add_to_group(group, -score)
+
+        for group in set(groups).difference(old_groups):
+            if group not in self._group_members:
+                self._group_members[group] = set()
+                self._group_order[group] = len(self._group_order)
+                self._group_top[group] = _TopK(self.capacity)
+            self._group_members[group].add(package_id)
+            if score > 0.0:
+                self._group_top[group].update(package_id, score, order, True)
+                self._add_to_group(group, score)
+
+    def top(self, k=10, group=None, exclude=()):
+        """
+        Trending package IDs, most popular first
+
+        Parameters:
+        - k: Maximum number of package IDs
+        - group: Optional group key ('destination:goa', 'theme:beach') to
+          rank only that group's packages
+        - exclude: Package IDs to skip (e.g. the user's bookings)
+
+        Returns:
+        - list of at most k package IDs with a positive score
+        """
+        with self.lock:
+            if group is None:
+                top, package_ids = self._top, self._scores
+            elif group in self._group_top:
+                top, package_ids = self._group_top[group], self._group_members[group]
+            else:
+                return []
+
+            ranked = top.ranked(lambda: self._package_entries(package_ids))
+            result = [pid for pid in ranked if pid not in exclude][:k]
+            if len(result) < k and top.full:
+                # Exclusions used up the heap: rank the remaining packages directly
+                entries = (entry for entry in self._package_entries(package_ids) if entry[2] not in exclude)
+                result = [entry[2] for entry in heapq.nlargest(k, entries)]
+            return result
+
+    def top_groups(self, k=10, kind=None):
+        """
+        Trending groups, most popular first
+
+        Parameters:
+        - kind: Optional 'destination' or 'theme' to rank one kind only
+
+        Returns:
+        - list of at most k group keys
+        """
+        with self.lock:
+            ranked = self._group_rank.ranked(self._group_entries)
+            prefix = f"{kind}:" if kind else ""
+            result = [group for group in ranked if group.startswith(prefix)][:k]
+            if len(result) < k and self._group_rank.full:
+                result = [entry[2] for entry in heapq.nlargest(k, self._group_entries(kind))]
+            return result
+
+    def score(self, key, now=None):
+        """Decayed score of a package ID or group key at time now (default: current time)"""
+        with self.lock:
+            score = self._group_scores.get(key) if key in self._group_scores else self._scores.get(key, 0.0)
+            if self.half_life_seconds is None or self.reference_time is None:
+                return score
+            now = time.time() if now is None else now
+            return score * 2.0 ** ((self.reference_time - now) / self.half_life_seconds)
+
+    def memory_usage(self):
+        with self.lock:
+            return {
+                "packages": len(self._scores),
+                "groups": len(self._group_scores),
+                "heap_entries": len(self._top.heap) + len(self._group_rank.heap)
+                                + sum(len(top.heap) for top in self._group_top.values()),
+            }
@@ -0,0 +1,221 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Marks a stage without a fallback: its failure or timeout fails the whole run
+REQUIRED = object()
+
+class StageTimeout(Exception):
+    """A required stage did not finish within its timeout, or was shed"""
+
+class Stage:
+    """
+    One step of a request pipeline
+
+    Parameters:
+    - name: Unique stage name; its result is passed to dependents under this name
+    - func: Callable taking the results of deps as keyword arguments
+    - deps: Names of the stages whose results func needs
+    - timeout: Seconds the stage may run once started (None for no limit)
+    - fallback: Result used when the stage fails or times out, or REQUIRED
+    """
+
+    def __init__(self, name, func, deps=(), timeout=None, fallback=REQUIRED):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.fallback = fallback
+
+    @property
+    def required(self):
+        return self.fallback is REQUIRED
+
+class _StageRun:
+    """One submitted stage: when a worker started it and whether the caller gave up on it"""
+
+    def __init__(self, stage, submitted, max_queue_seconds=None):
+        self.stage = stage
+        self.submitted = submitted
+        self.max_queue_seconds = max_queue_seconds
+        self.started = None
+        self.finished = False
+        self.abandoned = False
+
+    def deadline(self):
+        """End of the queue-wait limit while queued, of the stage timeout once started"""
+        if self.started is None:
+            return None if self.max_queue_seconds is None else self.submitted + self.max_queue_seconds
+        if self.stage.timeout is None:
+            return None
+        return self.started + self.stage.timeout
+
+class PipelineExecutor:
+    """
+    Runs a DAG of stages on a shared thread pool
+
+    Every stage starts as soon as the stages it depends on have finished,
+    so independent fetches and scoring stages overlap. A stage's timeout
+    counts from when a worker starts it; waiting in the pool's queue is
+    bounded separately by max_queue_seconds, from submission. A stage that
+    raises or runs past its timeout resolves to its fallback and its
+    dependents carry on; the worker thread is left to finish in the
+    background, as Python threads cannot be interrupted. Failures of
+    required stages are raised to the caller.
+
+    Stages are shed (resolve to their fallback without running, or raise
+    StageTimeout if required) in two cases. Abandoned (timed out but still
+    running) stages are counted per stage name, and once max_abandoned of
+    one name are still running, new runs of that stage are not submitted,
+    so a slow backend cannot fill the pool. And a stage still queued after
+    max_queue_seconds, because every worker is busy, is cancelled, so a
+    saturated pool fails requests instead of hanging them.
+    """
+
+    # How often queued stages are checked for having started
+    POLL_SECONDS = 0.01
+
+    def __init__(self, max_workers=16, max_abandoned=None, max_queue_seconds=2.0):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline")
+        self.max_abandoned = max_abandoned if max_abandoned is not None else max(1, max_workers // 4)
+        self.max_queue_seconds = max_queue_seconds
+        self._abandoned = {}
+        self._lock = threading.Lock()
+
+    def abandoned(self):
+        """Stage name -> runs that timed out and are still holding a worker"""
+        with self._lock:
+            return {name: count for name, count in self._abandoned.items() if count}
+
+    def _execute(self, run, kwargs):
+        run.started = time.monotonic()
+        try:
+            return run.stage.func(**kwargs)
+        finally:
+            with self._lock:
+                run.finished = True
+                if run.abandoned:
+                    self._abandoned[run.stage.name] -= 1
+
+    def _abandon(self, run):
+        with self._lock:
+            if not run.finished:
+                run.abandoned = True
+                self._abandoned[run.stage.name] = self._abandoned.get(run.stage.name, 0) + 1
+
+    def _shed(self, stage):
+        with self._lock:
+            return self._abandoned.get(stage.name, 0) >= self.max_abandoned
+
+    def run(self, stages):
+        """
+        Execute the stages
+
+        Parameters:
+        - stages: List of Stage objects forming a DAG
+
+        Returns:
+        - (results, report): dict of stage name -> result, and dict of stage
+          name -> {"status": "ok" | "error" | "timeout" | "shed", "ms": run
+          time, "queued_ms": time waiting for a worker}
+        """
+        pending = {stage.name: stage for stage in stages}
+        for stage in stages:
+            missing = [dep for dep in stage.deps if dep not in pending]
+            if missing:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages {missing}")
+
+        results, report = {}, {}
+        running = {}
+
+        try:
+            while pending or running:
+                progressed = False
+                for name, stage in list(pending.items()):
+                    if all(dep in results for dep in stage.deps):
+                        del pending[name]
+                        progressed = True
+                        if self._shed(stage):
+                            if stage.required:
+                                raise StageTimeout(f"Stage {stage.name} shed: earlier runs are still running")
+                            logger.warning(f"Stage {stage.name} shed: earlier runs are still running, using fallback")
+                            results[stage.name] = stage.fallback
+                            report[stage.name] = {"status": "shed", "ms": 0.0, "queued_ms": 0.0}
+                            continue
+                        run = _StageRun(stage, time.monotonic(), self.max_queue_seconds)
+                        future = self._executor.submit(self._execute, run, {dep: results[dep] for dep in stage.deps})
+                        running[future] = run
+
+                if not running:
+                    if pending and not progressed:
+                        raise ValueError(f"Stages {list(pending)} have cyclic dependencies")
+                    continue
+
+                deadlines = [run.deadline() for run in running.values() if run.deadline() is not None]
+                timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                if any(run.started is None and run.stage.timeout is not None for run in running.values()):
+                    # A queued stage's clock starts with its worker; look again shortly
+                    timeout = self.POLL_SECONDS if timeout is None else min(timeout, self.POLL_SECONDS)
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                now = time.monotonic()
+                for future in done:
+                    run = running.pop(future)
+                    stage = run.stage
+                    started = run.started if run.started is not None else now
+                    timing = {"ms": round((now - started) * 1000, 1),
+                              "queued_ms": round((started - run.submitted) * 1000, 1)}
+                    try:
+                        results[stage.name] = future.result()
+                        report[stage.name] = {"status": "ok", **timing}
+                    except Exception as e:
+                        if stage.required:
+                            raise
+                        logger.warning(f"Stage {stage.name} failed, using fallback: {str(e)}", exc_info=True)
+                        results[stage.name] = stage.fallback
+                        report[stage.name] = {"status": "error", **timing}
+
+                for future, run in list(running.items()):
+                    deadline = run.deadline()
+                    if deadline is None or now < deadline or future.done():
+                        continue
+                    stage = run.stage
+                    if run.started is None and future.cancel():
+                        # Never got a worker within max_queue_seconds
+                        del running[future]
+                        if stage.required:
+                            raise StageTimeout(f"Stage {stage.name} shed: no worker within "
+                                               f"{self.max_queue_seconds} s")
+                        logger.warning(f"Stage {stage.name} shed: no worker within {self.max_queue_seconds} s, "
+                                       f"using fallback")
+                        results[stage.name] = stage.fallback
+                        report[stage.name] = {"status": "shed", "ms": 0.0,
+                                              "queued_ms": round((now - run.submitted) * 1000, 1)}
+                        continue
+                    if run.started is None:
+                        # A worker picked it up just now; its timeout starts from there
+                        continue
+                    del running[future]
+                    self._abandon(run)
+                    if stage.required:
+                        raise StageTimeout(f"Stage {stage.name} timed out after {stage.timeout} s")
+                    logger.warning(f"Stage {stage.name} timed out after {stage.timeout} s, using fallback")
+                    results[stage.name] = stage.fallback
+                    report[stage.name] = {"status": "timeout", "ms": round((now - run.started) * 1000, 1),
+                                          "queued_ms": round((run.started - run.submitted) * 1000, 1)}
+        except BaseException:
+            # Nobody waits for the stages still queued or running once the run fails
+            for future, run in running.items():
+                if not future.cancel():
+                    self._abandon(run)
+            raise
+
+        return results, report
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,102 @@
+"""
+Offline recommendation snapshot job
+
+Streams booking interactions from a dump shaped like enhanced_cf_data.json
+(or maps a columnar copy written by convert_dump.py), fits the item index,
+factor model and catalog text index once, runs CF + CBF + popularity for
+every user across a pool of worker processes that map the fitted arrays
+from shared files, and writes a memory-mappable top-N snapshot that app.py
+serves from. With --weighted, interactions carry rating/status/recency
+confidence instead of 1.0.
+
+Usage: python precompute.py [--input enhanced_cf_data.json | model/bookings] [--output model/recommendations.snap]
+                            [--top-n 10] [--workers 4] [--chunk-size 2000] [--weighted]
+"""
+import argparse
+import logging
+import os
+import time
+import numpy as np
+from model.factorization import FactorModel
+from model.dump import BookingColumns
+from model.item_index import ItemNeighbourIndex
+from model.parallel import ShardedRecommender
+from model.snapshot import booking_fingerprint, write_snapshot
+from model.text_index import CatalogTextIndex
+from model.weighting import ConfidenceWeights
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INPUT = os.path.join(BASE_DIR, "enhanced_cf_data.json")
+DEFAULT_OUTPUT = os.getenv("RECOMMENDER_SNAPSHOT_PATH", os.path.join(BASE_DIR, "model", "recommendations.snap"))
+
+def build_state(columns, weighting=None):
+    """Fit every shared model once in the parent process"""
+    interactions = columns.interactions(weighting)
+    matrix, version = interactions.matrix, interactions.version
+    package_ids, user_ids = interactions.package_ids, interactions.user_ids
+
+    item_index = ItemNeighbourIndex()
+    item_index.build(matrix, version)
+    factor_model = FactorModel().fit(matrix, package_ids, user_ids, version=version)
+    all_packages = list(columns.packages)
+    text_index = CatalogTextIndex().fit(all_packages)
+
+    return {
+        "interactions": interactions,
+        "item_index": item_index,
+        "factor_model": factor_model,
+        "text_index": text_index,
+        "all_packages": all_packages,
+        "package_column": {pid: col for col, pid in enumerate(package_ids)},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--input', default=DEFAULT_INPUT)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    parser.add_argument('--weighted', action='store_true',
+                        help="Weight interactions by rating, status and recency")
+    parser.add_argument('--half-life-days', type=float, default=180.0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    # Offline dumps age from their newest booking, not from today
+    weighting = ConfidenceWeights(half_life_days=args.half_life_days) if args.weighted else None
+    state = build_state(BookingColumns.from_file(args.input), weighting)
+    interactions = state["interactions"]
+    user_ids = interactions.user_ids
+    matrix, package_ids = interactions.matrix, interactions.package_ids
+    logger.info(f"Fitted models in {time.perf_counter() - start:.1f} s")
+
+    indices = np.full((len(user_ids), args.top_n), -1, dtype=np.int32)
+    scores = np.zeros((len(user_ids), args.top_n), dtype=np.float32)
+    fingerprints = np.zeros(len(user_ids), dtype=np.uint64)
+    # Rank score: the online combination is an ordered merge, not a fused score
+    rank_scores = 1.0 / np.arange(1, args.top_n + 1)
+
+    workers = max(1, min(args.workers, -(-len(user_ids) // args.chunk_size)))
+    with ShardedRecommender(interactions, state["all_packages"], item_index=state["item_index"],
+                            factor_model=state["factor_model"], text_index=state["text_index"],
+                            workers=workers, chunk_size=args.chunk_size) as recommender:
+        for i, (uid, recommendations, _, _) in enumerate(recommender.recommend(user_ids)):
+            columns = [state["package_column"][pid] for pid in recommendations[:args.top_n]]
+            indices[i, :len(columns)] = columns
+            scores[i, :len(columns)] = rank_scores[:len(columns)]
+            row = interactions.user_index[uid]
+            fingerprints[i] = booking_fingerprint(
+                {package_ids[col] for col in matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]}
+            )
+
+    write_snapshot(args.output, user_ids, fingerprints, indices, scores, package_ids)
+    print(f"Wrote snapshot for {len(user_ids)} users with {workers} worker(s) "
+          f"in {time.perf_counter() - start:.1f} s to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class RecommendationCache:
+    """
+    Bounded LRU/TTL cache of final recommendation responses, one entry per user
+
+    An entry is served only while it is younger than ttl_seconds, was built
+    against the current catalog version and the user's current booking
+    history (a fingerprint of it), and was stored for the same auth token,
+    so a cached response never skips the backend's auth check for a new
+    token. A booking or cancellation changes the fingerprint, so the next
+    request misses even if no event dropped the entry.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def _token_digest(auth_token):
+        return hashlib.sha256((auth_token or "").encode()).hexdigest()
+
+    def get(self, user_id, catalog_version, bookings_fingerprint, auth_token):
+        """
+        Look up a user's cached response
+
+        Parameters:
+        - user_id: ID of the user
+        - catalog_version: Current catalog version
+        - bookings_fingerprint: Fingerprint of the user's current booking history
+        - auth_token: Caller's auth token
+
+        Returns:
+        - the cached response, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+
+            expires_at, version, fingerprint, token_digest, response = entry
+            if expires_at <= time.monotonic():
+                del self._entries[user_id]
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            if (version != catalog_version or fingerprint != bookings_fingerprint
+                    or token_digest != self._token_digest(auth_token)):
+                self.stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(user_id)
+            self.stats["hits"] += 1
+            return response
+
+    def put(self, user_id, catalog_version, bookings_fingerprint, auth_token, response):
+        """Store a user's response, evicting the least recently used entries"""
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl_seconds, catalog_version, bookings_fingerprint,
+                                      self._token_digest(auth_token), response)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate_user(self, user_id):
+        """Drop a user's entry after their bookings changed"""
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self.stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)